@@ -35,6 +35,13 @@ class WebSocketExample(object):
             api.query(topology, "CREATE SOURCE node_stats TYPE node_statuses")  # sync
             client.send("SELECT RSTREAM * FROM node_stats [RANGE 1 TUPLES];", callback, 3)
             time.sleep(5)
+
+            # ``submit`` assigns request IDs automatically and returns a Future.
+            print("-------------------------------")
+            print("Submit: {0}".format(client.submit("eval 7*6;").result()))
+            stream = client.submit("SELECT RSTREAM [LIMIT 3] * FROM node_stats [RANGE 1 TUPLES];").result()
+            for r in stream:
+                print("Stream: {0}".format(r))
         finally:
             api.delete_topology(topology)
             time.sleep(3)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+try:
+    import numpy
+    _NUMPY_AVAILABLE = True
+except ImportError:
+    _NUMPY_AVAILABLE = False
+
+
+# Kinds of columns, from narrowest to widest.
+_BOOL = 'bool'
+_INT = 'int64'
+_FLOAT = 'float64'
+_OBJECT = 'object'
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+# For Python 3 compatibility
+try:
+    _INT_TYPES = (int, long)
+except NameError:
+    _INT_TYPES = (int,)
+
+
+def _kind_of(v):
+    if isinstance(v, bool):
+        return _BOOL
+    if isinstance(v, _INT_TYPES):
+        return _INT if _INT64_MIN <= v <= _INT64_MAX else _OBJECT
+    if isinstance(v, float):
+        return _FLOAT
+    return _OBJECT
+
+def _widen(a, b):
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if set([a, b]) == set([_INT, _FLOAT]):
+        return _FLOAT
+    return _OBJECT
+
+
+class _ColumnarConverter(object):
+    def __init__(self):
+        """
+        Converts batches of tuples into dicts of NumPy arrays, one per
+        top-level field.
+
+        The schema (field names and their types) is inferred from the tuples
+        and kept across batches: fields once seen are always present, and the
+        type of a field is only ever widened (bool < int64 < float64 < object).
+        Missing values are NaN in float64 columns; int64 columns with missing
+        values are promoted to float64, and bool columns to object.
+        """
+        if not _NUMPY_AVAILABLE:
+            raise RuntimeError('numpy module is unavailable')
+        self.schema = collections.OrderedDict()
+
+    def convert(self, batch):
+        schema = self.schema
+        columns = collections.OrderedDict((k, []) for k in schema)
+        for (i, d) in enumerate(batch):
+            for k in d:
+                if k not in columns:
+                    # New field; earlier tuples in this batch lack it.
+                    columns[k] = [None] * i
+                    schema[k] = None
+            for (k, values) in columns.items():
+                values.append(d.get(k))
+
+        result = collections.OrderedDict()
+        for (k, values) in columns.items():
+            kind = schema[k]
+            missing = False
+            for v in values:
+                if v is None:
+                    missing = True
+                else:
+                    kind = _widen(kind, _kind_of(v))
+            if missing:
+                kind = {_INT: _FLOAT, _BOOL: _OBJECT}.get(kind, kind)
+            schema[k] = kind
+            result[k] = self._array(values, kind or _OBJECT)
+        return result
+
+    def _array(self, values, kind):
+        if kind == _OBJECT:
+            # Assign element-wise so that list values do not become dimensions.
+            arr = numpy.empty(len(values), dtype=object)
+            arr[:] = values
+            return arr
+        if kind == _FLOAT:
+            # None is converted to NaN.
+            return numpy.array(values, dtype=numpy.float64)
+        if kind == _INT:
+            return numpy.fromiter(values, dtype=numpy.int64, count=len(values))
+        return numpy.array(values, dtype=numpy.bool_)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import socket
+import threading
+import time
+import weakref
+
+try:
+    # Python 3
+    from http.client import HTTPConnection, HTTPException
+except ImportError:
+    # Python 2
+    from httplib import HTTPConnection, HTTPException
+
+
+class _ConnectionPool(object):
+    # Methods that can safely be resent when a kept-alive connection turned
+    # out to be closed by the server.
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'DELETE'])
+
+    def __init__(self, host, port, maxsize=10, idle_timeout=30.0, per_thread=False, timeout=None):
+        """
+        Pool of HTTP/1.1 keep-alive connections to a single server.
+
+        Up to ``maxsize`` idle connections are kept; connections left unused
+        for more than ``idle_timeout`` seconds are discarded instead of being
+        reused.  When ``per_thread`` is True, each thread has its own set of
+        idle connections; otherwise idle connections are shared among threads.
+        A connection is never used by more than one thread at a time.
+        ``timeout`` is the socket timeout in seconds (``None`` to block).
+        """
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.per_thread = per_thread
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._shared = collections.deque()
+        self._local = threading.local()
+        self._thread_idle = []  # weak references to per-thread idle deques
+
+    def _idle(self):
+        if not self.per_thread:
+            return self._shared
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = collections.deque()
+            with self._lock:
+                self._thread_idle = [r for r in self._thread_idle if r() is not None]
+                self._thread_idle.append(weakref.ref(idle))
+        return idle
+
+    def _new_conn(self):
+        if self.timeout is None:
+            return HTTPConnection(self.host, self.port)
+        return HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _default_timeout(self):
+        return self.timeout if self.timeout is not None else socket.getdefaulttimeout()
+
+    def _get(self):
+        """
+        Returns a tuple of a connection and whether it is a reused one.
+        """
+        idle = self._idle()
+        now = time.time()
+        with self._lock:
+            # Newest connections are on the right; anything expired on the
+            # left is older than any connection after it.
+            while idle and self.idle_timeout is not None and self.idle_timeout < now - idle[0][1]:
+                idle.popleft()[0].close()
+            if idle:
+                return (idle.pop()[0], True)
+        return (self._new_conn(), False)
+
+    def _put(self, conn):
+        if conn.sock is not None:
+            # Undo the timeout given to the last request.
+            conn.sock.settimeout(self._default_timeout())
+        idle = self._idle()
+        with self._lock:
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def open(self, method, url, body=None, headers=None, connect_timeout=None, timeout=None):
+        """
+        Sends a request and returns a tuple of the connection and the response.
+        The connection is checked out from the pool; it must be handed back
+        by ``release``, or closed, after use.
+
+        ``connect_timeout`` is the timeout to establish a new connection and
+        ``timeout`` the socket timeout for this request, in seconds; the
+        timeout of the pool is used for each if None.
+        """
+        if headers is None:
+            headers = {}
+        while True:
+            (conn, reused) = self._get()
+            try:
+                if conn.sock is None:
+                    default_timeout = conn.timeout
+                    if connect_timeout is not None:
+                        conn.timeout = connect_timeout
+                    try:
+                        conn.connect()
+                    finally:
+                        # Later connections (e.g., reconnections by the
+                        # connection itself) use the timeout of the pool.
+                        conn.timeout = default_timeout
+                if timeout is not None:
+                    conn.sock.settimeout(timeout)
+                elif connect_timeout is not None:
+                    conn.sock.settimeout(self._default_timeout())
+                conn.request(method, url, body, headers)
+                return (conn, conn.getresponse())
+            except (socket.error, HTTPException):
+                conn.close()
+                # The server may have closed the idle connection; retry with
+                # a fresh one unless the request may have been processed.
+                if reused and method in self.IDEMPOTENT_METHODS:
+                    continue
+                raise
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Sends a request and returns a tuple of the response and its body.
+        """
+        (conn, resp) = self.open(method, url, body, headers)
+        try:
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        self.release(conn, resp)
+        return (resp, data)
+
+    def release(self, conn, resp):
+        """
+        Returns the connection to the pool.  The response must have been read
+        until the end.
+        """
+        if resp.will_close or not resp.isclosed():
+            conn.close()
+        else:
+            self._put(conn)
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        with self._lock:
+            for idle in [self._shared] + [r() for r in self._thread_idle]:
+                while idle:
+                    idle.popleft()[0].close()
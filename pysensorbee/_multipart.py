@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Python 3.2 or later; a view that cannot be released keeps the buffer
+# from being resized.
+_RELEASABLE = hasattr(memoryview, 'release')
+
+
+class _MultipartParser(object):
+    # Allowance for delimiters and headers on top of the part size limit.
+    HEADER_ALLOWANCE = 65536
+
+    def __init__(self, boundary, max_part_size=None):
+        """
+        Incremental parser of a ``multipart/mixed`` stream.
+
+        Data is given by ``feed``, and parsed parts are taken out by ``next``
+        as ``memoryview`` of the internal buffer (or as ``bytes`` on Python
+        versions without ``memoryview.release``).  A view is only valid until
+        the next call of ``feed`` or ``next``.  Every part must have a
+        ``Content-Length`` header; parts larger than ``max_part_size`` bytes
+        are rejected.
+        """
+        self._delim = '--{0}'.format(boundary).encode()
+        self._max_part_size = max_part_size
+        self._buf = bytearray()
+        self._pos = 0
+        self._view = None
+        self.done = False
+
+        # Number of bytes known to be needed to take the next part out.
+        self.wanted = 1
+
+    def _release(self):
+        view = self._view
+        if view is not None:
+            self._view = None
+            # The buffer cannot be resized while the view is alive.
+            view.release()
+
+    def feed(self, data):
+        self._release()
+        buf = self._buf
+        del buf[:self._pos]
+        self._pos = 0
+        buf += data
+        limit = self._max_part_size
+        if limit is not None and limit + self.HEADER_ALLOWANCE < len(buf):
+            raise RuntimeError('multipart part exceeds the size limit ({0} bytes)'.format(limit))
+
+    def _content_length(self, header):
+        length = None
+        for line in header.split(b'\n'):
+            (name, _, value) = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                length = int(value.strip())
+        if length is None:
+            raise RuntimeError('multipart part without Content-Length')
+        if self._max_part_size is not None and self._max_part_size < length:
+            raise RuntimeError('multipart part exceeds the size limit ({0} bytes): {1} bytes'.format(
+                self._max_part_size, length))
+        return length
+
+    def next(self):
+        """
+        Returns the body of the next part, or None if more data is needed or
+        the close delimiter has been reached (``done`` is set in this case).
+        """
+        self._release()
+        self.wanted = 1
+        if self.done:
+            return None
+        buf = self._buf
+        delim = self._delim
+
+        # Find the delimiter line.
+        i = buf.find(delim, self._pos)
+        if i < 0:
+            # Keep the tail which may be a prefix of the delimiter.
+            self._pos = max(self._pos, len(buf) - len(delim))
+            return None
+        self._pos = i
+        eol = buf.find(b'\n', i + len(delim))
+        if eol < 0:
+            return None
+        if buf[i + len(delim):i + len(delim) + 2] == b'--':
+            self.done = True
+            return None
+
+        # Find the end of the header block.
+        ends = [k for k in (buf.find(b'\n\r\n', eol), buf.find(b'\n\n', eol)) if 0 <= k]
+        if not ends:
+            return None
+        k = min(ends)
+        length = self._content_length(bytes(buf[eol + 1:k]))
+        start = buf.index(b'\n', k + 1) + 1
+
+        # Take the body out.
+        if len(buf) < start + length:
+            self.wanted = start + length - len(buf)
+            return None
+        self._pos = start + length
+        if not _RELEASABLE:
+            return bytes(buf[start:start + length])
+        self._view = memoryview(buf)[start:start + length]
+        return self._view
+
+
+class _MultipartReader(object):
+    def __init__(self, f, boundary, max_part_size=None, bufsize=65536):
+        """
+        Reads a ``multipart/mixed`` stream from a file-like object.
+        Iterating over the reader yields the body of each part (see
+        ``_MultipartParser``).
+        """
+        self._f = f
+        self._parser = _MultipartParser(boundary, max_part_size)
+        self._bufsize = bufsize
+
+        # ``read1`` returns as soon as some data is available.  On Python
+        # versions without ``read1``, ``read(n)`` may block until ``n`` bytes
+        # arrive, which stalls the stream; read only the bytes the parser
+        # knows to be needed instead (the rest of the body being read, or
+        # one byte of delimiters and headers).
+        read1 = getattr(f, 'read1', None)
+        if read1 is None:
+            parser = self._parser
+            self._read = lambda n: f.read(min(n, parser.wanted))
+        else:
+            self._read = read1
+
+    def __iter__(self):
+        parser = self._parser
+        while True:
+            part = parser.next()
+            if part is not None:
+                yield part
+                continue
+            if parser.done:
+                return
+            data = self._read(self._bufsize)
+            if not data:
+                return
+            parser.feed(data)
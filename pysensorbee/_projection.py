@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import codecs
+import re
+
+
+# A literal is searched much faster than a character class.
+_QUOTE = re.compile(br'"')
+# Characters that matter when skipping a container.
+_STRUCT = re.compile(br'["\[\]{}]')
+# Whitespace and separators.
+_SPACE = re.compile(br'[\s]*')
+_COLON = re.compile(br'\s*:\s*')
+_COMMA = re.compile(br'\s*(,?)\s*')
+# A number, true, false or null.
+_SCALAR = re.compile(br'[^,:\]}\s]+')
+
+try:
+    _SPACE.match(memoryview(b''))
+    _MATCH_MEMORYVIEW = True
+except TypeError:
+    # Python 2
+    _MATCH_MEMORYVIEW = False
+
+# The longest encoding of a character in a JSON string (a surrogate pair
+# of ``\uXXXX``).
+_MAX_CHAR_BYTES = 12
+
+
+class _Projector(object):
+    def __init__(self, codec, keys=None, max_string_length=None):
+        """
+        Decodes a JSON object only partially: only ``keys`` at the top level
+        are decoded (all if None), and strings longer than
+        ``max_string_length`` characters (no limit if None) are replaced
+        with stubs of their first characters without decoding the rest.
+        Other values are skipped by scanning, and values without long
+        strings are decoded by ``codec`` at once.
+        """
+        self._loads = codec.loads
+        self.keys = None if keys is None else frozenset(keys)
+        self.max_string_length = max_string_length
+
+    def stub(self, prefix):
+        return '{0}... (omit)'.format(prefix)
+
+    def project(self, data):
+        if not _MATCH_MEMORYVIEW and isinstance(data, memoryview):
+            data = data.tobytes()
+        pos = _SPACE.match(data, 0).end()
+        if data[pos:pos + 1] != b'{':
+            # Not an object; no key to project.
+            return self._value(data, pos)[0]
+        result = {}
+        pos = _SPACE.match(data, pos + 1).end()
+        if data[pos:pos + 1] == b'}':
+            return result
+        while True:
+            if data[pos:pos + 1] != b'"':
+                raise ValueError('invalid JSON object key at {0}'.format(pos))
+            end = _string_end(data, pos)
+            key = self._loads(data[pos:end])
+            pos = _COLON.match(data, end).end()
+            if self.keys is None or key in self.keys:
+                (result[key], pos) = self._value(data, pos)
+            else:
+                pos = self._skip(data, pos)[0]
+            m = _COMMA.match(data, pos)
+            pos = m.end()
+            if not m.group(1):
+                break
+        if data[pos:pos + 1] != b'}':
+            raise ValueError('invalid JSON object at {0}'.format(pos))
+        return result
+
+    def _value(self, data, pos):
+        # Returns the value at pos and the position after it.
+        (end, long_string) = self._skip(data, pos)
+        if not long_string:
+            return (self._loads(data[pos:end]), end)
+        c = data[pos:pos + 1]
+        if c == b'"':
+            return (self._string(data, pos, end), end)
+        if c == b'[':
+            result = []
+            pos = _SPACE.match(data, pos + 1).end()
+            while data[pos:pos + 1] != b']':
+                (v, pos) = self._value(data, pos)
+                result.append(v)
+                pos = _COMMA.match(data, pos).end()
+            return (result, end)
+        # Object; keys are not summarized.
+        result = {}
+        pos = _SPACE.match(data, pos + 1).end()
+        while data[pos:pos + 1] != b'}':
+            key_end = _string_end(data, pos)
+            key = self._loads(data[pos:key_end])
+            pos = _COLON.match(data, key_end).end()
+            (result[key], pos) = self._value(data, pos)
+            pos = _COMMA.match(data, pos).end()
+        return (result, end)
+
+    def _string(self, data, pos, end):
+        limit = self.max_string_length
+        if end - pos - 2 <= limit * _MAX_CHAR_BYTES:
+            s = self._loads(data[pos:end])
+            return s if len(s) <= limit else self.stub(s[:limit])
+        # Decode only the beginning; drop a character or an escape sequence
+        # possibly cut in the middle.
+        raw = bytes(data[pos + 1:pos + 1 + limit * _MAX_CHAR_BYTES])
+        raw = codecs.utf_8_decode(raw, 'ignore')[0].encode('utf-8')
+        s = ''
+        for i in range(_MAX_CHAR_BYTES):
+            try:
+                s = self._loads(b'"' + raw[:len(raw) - i] + b'"')
+                break
+            except ValueError:
+                pass
+        return self.stub(s[:limit])
+
+    def _skip(self, data, pos):
+        # Returns the position after the value at pos, and whether it
+        # contains a string longer than the limit.
+        limit = self.max_string_length
+        c = data[pos:pos + 1]
+        if c == b'"':
+            end = _string_end(data, pos)
+            return (end, limit is not None and limit < end - pos - 2)
+        if c not in (b'[', b'{'):
+            m = _SCALAR.match(data, pos)
+            if m is None:
+                raise ValueError('invalid JSON value at {0}'.format(pos))
+            return (m.end(), False)
+        (depth, long_string) = (0, False)
+        while True:
+            m = _STRUCT.search(data, pos)
+            if m is None:
+                raise ValueError('unterminated JSON value')
+            c = data[m.start():m.start() + 1]
+            if c == b'"':
+                (pos, is_long) = self._skip(data, m.start())
+                long_string = long_string or is_long
+                continue
+            pos = m.end()
+            depth += 1 if c in (b'[', b'{') else -1
+            if depth == 0:
+                return (pos, long_string)
+
+
+def _string_end(data, pos):
+    # Returns the position after the string starting at pos.
+    i = pos + 1
+    while True:
+        m = _QUOTE.search(data, i)
+        if m is None:
+            raise ValueError('unterminated JSON string at {0}'.format(pos))
+        i = m.start()
+        # The quote is escaped if preceded by an odd number of backslashes.
+        j = i
+        while data[j - 1:j] == b'\\':
+            j -= 1
+        if (i - j) % 2 == 0:
+            return i + 1
+        i += 1
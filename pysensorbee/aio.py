@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+
+"""
+asyncio API client for SensorBee (Python 3.5 or later).
+
+``pip install aiohttp`` to use this module.
+"""
+
+import asyncio
+
+try:
+    import aiohttp
+    _AIOHTTP_AVAILABLE = True
+except ImportError:
+    _AIOHTTP_AVAILABLE = False
+
+from .api import SensorBeeAPI, SensorBeeAPIError, WebSocketStream, DEFAULT_MAX_PART_SIZE
+from .codec import get_codec
+from ._multipart import _MultipartParser
+
+
+class AsyncSensorBeeAPI(object):
+    ERRORS = SensorBeeAPI.ERRORS
+
+    def __init__(self, host='127.0.0.1', port=15601, pool_size=100, idle_timeout=30.0, session=None, codec=None):
+        """
+        SensorBee API client for asyncio.
+
+        All methods of ``SensorBeeAPI`` are available as coroutines.  HTTP
+        requests, ``SELECT`` streams and WebSocket sessions share a single
+        connection pool of up to ``pool_size`` connections; idle connections
+        are closed after ``idle_timeout`` seconds.
+
+        To share one pool among clients for multiple servers, pass an
+        ``aiohttp.ClientSession`` as ``session``.  The session is not closed by
+        ``close`` in this case.
+
+        ``codec`` is the JSON codec (see ``pysensorbee.codec.get_codec``).
+        """
+        if not _AIOHTTP_AVAILABLE:
+            raise RuntimeError('aiohttp module is unavailable')
+        self.host = host
+        self.port = port
+        self._codec = get_codec(codec)
+        self._own_session = session is None
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._session_ = session
+
+    @property
+    def _session(self):
+        # The session is created on first use as it must be created inside
+        # the event loop.
+        if self._session_ is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=self._idle_timeout)
+            self._session_ = aiohttp.ClientSession(connector=connector)
+        return self._session_
+
+    async def close(self):
+        """
+        Closes the connection pool.
+        """
+        if self._own_session and self._session_ is not None:
+            await self._session_.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _url(self, path, scheme='http'):
+        return '{0}://{1}:{2}/api/v1/{3}'.format(scheme, self.host, self.port, path)
+
+    async def _check_status(self, resp):
+        if 200 <= resp.status < 300:
+            return
+        if resp.status in self.ERRORS:
+            body = await resp.read()
+            raise SensorBeeAPIError(self.ERRORS[resp.status], self._codec.loads(body)['error'])
+        resp.raise_for_status()
+
+    async def _req(self, path, data=None, method=None):
+        if method is None:
+            method = 'GET' if data is None else 'POST'
+        headers = {} if data is None else {'Content-Type': 'application/json'}
+        async with self._session.request(method, self._url(path), data=data, headers=headers) as resp:
+            await self._check_status(resp)
+            return self._codec.loads(await resp.read())
+
+    async def runtime_status(self):
+        """
+        Returns the runtime status of the SensorBee process.
+        """
+        return await self._req('runtime_status')
+
+    async def topologies(self):
+        """
+        Returns the list of topologies.
+        """
+        return await self._req('topologies')
+
+    async def topology(self, t):
+        """
+        Returns the status of the specified topology.
+        """
+        return await self._req('topologies/{0}'.format(t))
+
+    async def create_topology(self, t):
+        """
+        Creates a new topology using the specified name.
+        """
+        return await self._req('topologies', self._codec.dumps({'name': t}))
+
+    async def delete_topology(self, t):
+        """
+        Deletes the specified topology.
+        """
+        return await self._req('topologies/{0}'.format(t), None, 'DELETE')
+
+    async def sources(self, t):
+        """
+        Returns the list of sources in the topology.
+        """
+        return await self._req('topologies/{0}/sources'.format(t))
+
+    async def source(self, t, s):
+        """
+        Returns the status of the specified source.
+        """
+        return await self._req('topologies/{0}/sources/{1}'.format(t, s))
+
+    async def streams(self, t):
+        """
+        Returns the list of streams in the topology.
+        """
+        return await self._req('topologies/{0}/streams'.format(t))
+
+    async def stream(self, t, s):
+        """
+        Returns the status of the specified stream.
+        """
+        return await self._req('topologies/{0}/streams/{1}'.format(t, s))
+
+    async def sinks(self, t):
+        """
+        Returns the list of sinks in the topology.
+        """
+        return await self._req('topologies/{0}/sinks'.format(t))
+
+    async def sink(self, t, s):
+        """
+        Returns the status of the specified sink.
+        """
+        return await self._req('topologies/{0}/sinks/{1}'.format(t, s))
+
+    async def query(self, t, q, max_part_size=DEFAULT_MAX_PART_SIZE):
+        """
+        Runs synchronous query on the topology.
+        For ``SELECT`` queries, an ``AsyncResultSet`` instance is returned;
+        you can iterate over it with ``async for`` to retrieve tuples.
+        For other kind of queries, a dict instance that contains the result of
+        the query is returned.
+        """
+        data = self._codec.dumps({'queries': q})
+        resp = await self._session.post(self._url('topologies/{0}/queries'.format(t)), data=data,
+                                        headers={'Content-Type': 'application/json'})
+        close = True
+        try:
+            await self._check_status(resp)
+            mimetype = resp.content_type
+            if mimetype == 'application/json':
+                return self._codec.loads(await resp.read())
+            elif mimetype == 'multipart/mixed':
+                boundary = resp.headers.get('Content-Type', '').partition('boundary=')[2].strip('"')
+                rs = AsyncResultSet(resp, boundary, max_part_size, self._codec)
+                close = False
+                return rs
+            else:
+                raise RuntimeError('unexpected MIME type: {0}'.format(mimetype))
+        finally:
+            if close:
+                resp.release()
+
+    async def wsquery(self, t, maxsize=1024, overflow='block'):
+        """
+        Opens a WebSocket API session (``AsyncWebSocketClient``) for the
+        topology.
+        """
+        if overflow not in WebSocketStream.OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy: {0}'.format(overflow))
+        ws = await self._session.ws_connect(self._url('topologies/{0}/wsqueries'.format(t), 'ws'))
+        return AsyncWebSocketClient(ws, maxsize, self._codec, overflow)
+
+class AsyncResultSet(object):
+    def __init__(self, _resp, _boundary, max_part_size=DEFAULT_MAX_PART_SIZE, codec=None):
+        """
+        Asynchronous iterable result of a ``SELECT`` query.
+        The connection is released when the stream ends or ``close`` is called.
+        """
+        self._resp = _resp
+        self._codec = get_codec(codec)
+        self._parser = _MultipartParser(_boundary, max_part_size)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        parser = self._parser
+        while True:
+            part = parser.next()
+            if part is not None:
+                return self._codec.loads(part)
+            data = b''
+            if not parser.done:
+                data = await self._resp.content.readany()
+            if not data:
+                self.close()
+                raise StopAsyncIteration
+            parser.feed(data)
+
+    def close(self):
+        """
+        Closes the stream.
+        """
+        self._resp.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+class AsyncWebSocketClient(object):
+    # Message types that end a request.
+    _STREAM_END = ('eos', 'error')
+    _STREAM_TYPES = ('sos', 'ping', 'eos')
+
+    def __init__(self, ws, maxsize=1024, codec=None, overflow='block'):
+        """
+        SensorBee WebSocket API session for asyncio.
+
+        Request IDs are assigned automatically.  ``send`` returns an
+        ``AsyncWebSocketStream`` which yields ``(type, payload)`` of messages
+        for the request.  Each request buffers up to ``maxsize`` messages;
+        ``overflow`` is the policy when the buffer is full (see
+        ``AsyncWebSocketStream``).
+        """
+        self._ws = ws
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._codec = get_codec(codec)
+        self._rid = 0
+        self._streams = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        try:
+            async for msg in self._ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                d = self._codec.loads(msg.data)
+                stream = self._streams.get(d['rid'])
+                if stream is None:
+                    continue
+                if stream._closed:
+                    # Cancelled or failed.
+                    del self._streams[d['rid']]
+                    continue
+                (msgtype, payload) = (d['type'], d['payload'])
+                if stream._is_stream is None:
+                    stream._is_stream = msgtype in self._STREAM_TYPES
+                done = not stream._is_stream or msgtype in self._STREAM_END
+                await stream._put((msgtype, payload))
+                if done or stream._closed:
+                    self._streams.pop(d['rid'], None)
+                    stream._close()
+        finally:
+            for stream in list(self._streams.values()):
+                stream._close()
+            self._streams.clear()
+
+    async def send(self, queries, maxsize=None, overflow=None):
+        """
+        Sends the queries and returns an ``AsyncWebSocketStream``.
+        ``maxsize`` and ``overflow`` override those of the session for this
+        request.
+        """
+        if self._ws.closed:
+            raise RuntimeError('not connected')
+        if overflow is not None and overflow not in WebSocketStream.OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy: {0}'.format(overflow))
+        self._rid += 1
+        stream = AsyncWebSocketStream(
+            self._rid, self._maxsize if maxsize is None else maxsize, overflow or self._overflow)
+        self._streams[stream.rid] = stream
+        data = self._codec.dumps({'rid': stream.rid, 'payload': {'queries': queries}})
+        await self._ws.send_str(data.decode('utf-8'))
+        return stream
+
+    async def close(self):
+        """
+        Shuts the session down.
+        """
+        await self._ws.close()
+        await self._reader
+
+    def is_open(self):
+        """
+        Returns if the session is open.
+        """
+        return not self._ws.closed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+class AsyncWebSocketStream(object):
+    def __init__(self, rid, maxsize=1024, overflow='block'):
+        """
+        Messages for a request sent through ``AsyncWebSocketClient``.
+        Iterate over it with ``async for`` to retrieve ``(type, payload)``.
+        Iteration ends after the result of a one-shot query, or after the
+        ``eos`` or ``error`` message of a ``SELECT`` stream.
+
+        Up to ``maxsize`` messages are buffered.  ``overflow`` is the policy
+        when the buffer is full: ``block`` pauses receiving from the
+        connection (which stalls all requests of the session),
+        ``drop_oldest`` discards the oldest message (counted in
+        ``dropped``), and ``error`` ends the stream with a ``RuntimeError``.
+        """
+        self.rid = rid
+        self.dropped = 0
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._is_stream = None
+        self._closed = False
+        self._cancelled = False
+        self._failed = None
+        # One more slot for the end marker.
+        self._queue = asyncio.Queue(maxsize + 1)
+
+    async def _put(self, item):
+        if self._closed:
+            return
+        if self._overflow == 'block':
+            await self._queue.put(item)
+            return
+        while self._maxsize <= self._queue.qsize():
+            if self._overflow == 'error':
+                self._failed = RuntimeError('stream buffer overflowed (rid: {0})'.format(self.rid))
+                self._close()
+                return
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def _close(self):
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass  # the consumer is not waiting; it will notice ``_closed``
+
+    def cancel(self):
+        """
+        Stops receiving messages for the request: buffered messages are
+        discarded, later ones are ignored and the iteration ends.  This does
+        not stop the query on the server.
+        """
+        self._cancelled = True
+        # Draining also wakes the session if it is blocked on this stream.
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._failed is not None:
+            raise self._failed
+        if self._cancelled or (self._closed and self._queue.empty()):
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if self._failed is not None:
+            raise self._failed
+        if item is None or self._cancelled:
+            raise StopAsyncIteration
+        return item
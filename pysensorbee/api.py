@@ -2,20 +2,30 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import contextlib
+import collections
+import functools
+import io
 import json
-import email.parser
+import multiprocessing
+import socket
 import threading
 import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from .codec import get_codec
+from ._columnar import _ColumnarConverter
+from ._http import _ConnectionPool
+from ._multipart import _MultipartReader
+from ._projection import _Projector
 
 try:
     # Python 3
-    from urllib.request import urlopen, Request
+    import queue
     from urllib.error import HTTPError
 except ImportError:
     # Python 2
-    from urllib2 import urlopen, Request
+    import Queue as queue
     from urllib2 import HTTPError
 
 try:
@@ -24,6 +34,12 @@ try:
 except ImportError:
     _WEBSOCKET_AVAILABLE = False
 
+# Default upper limit of the size of an encoded tuple in bytes.
+DEFAULT_MAX_PART_SIZE = 64 * 1024 * 1024
+
+# Python 3.3 or later
+_monotonic = getattr(time, 'monotonic', time.time)
+
 
 class SensorBeeAPI(object):
     ERRORS = {
@@ -32,30 +48,117 @@ class SensorBeeAPI(object):
         500: 'Execution Failure',
     }
 
-    def __init__(self, host='127.0.0.1', port=15601):
+    def __init__(self, host='127.0.0.1', port=15601, pool_size=10, idle_timeout=30.0, pool_per_thread=False,
+                 timeout=None, codec=None, metrics=None):
         """
         SensorBee API client.
+
+        Requests are sent over HTTP/1.1 keep-alive connections.  Up to
+        ``pool_size`` idle connections are kept for reuse, and connections
+        idle for more than ``idle_timeout`` seconds are discarded.  When
+        ``pool_per_thread`` is True, each thread keeps its own connections;
+        otherwise connections are shared among threads.  In either case the
+        instance can be used from multiple threads at once.
+
+        ``timeout`` is the socket timeout of each request in seconds
+        (``None`` to wait forever).  Note that it also applies to the interval
+        between tuples of ``SELECT`` streams.
+
+        ``codec`` is the JSON codec used to encode requests and decode
+        responses, result tuples and WebSocket messages (see
+        ``pysensorbee.codec.get_codec``); the fastest one available is used by
+        default.
+
+        ``metrics`` is a ``pysensorbee.metrics.MetricsRegistry`` to record
+        metrics of requests, ``ResultSet`` and ``WebSocketClient`` instances
+        created by this instance, or None not to record them.
         """
         self.host = host
         self.port = port
+        self.timeout = timeout
+        self.metrics = metrics
+        self.codec = get_codec(codec)
+        self._pool = _ConnectionPool(host, port, pool_size, idle_timeout, pool_per_thread, timeout)
+
+    def close(self):
+        """
+        Closes idle connections kept for reuse.
+        """
+        self._pool.close()
+
+    def _path(self, path):
+        return '/api/v1/{0}'.format(path)
 
     def _url(self, path, scheme='http'):
-        return '{0}://{1}:{2}/api/v1/{3}'.format(scheme, self.host, self.port, path)
+        return '{0}://{1}:{2}{3}'.format(scheme, self.host, self.port, self._path(path))
 
     def _req(self, path, data=None, method=None):
         if method is None:
             method = 'GET' if data is None else 'POST'
-        req = Request(self._url(path), data=data)
-        req.get_method = lambda: method
-        return json.loads(self._urlopen(req).read().decode('utf-8'))
+        started = time.time()
+        try:
+            (resp, body) = self._pool.request(method, self._path(path), data, self._headers(data))
+        except Exception as e:
+            self._record(method, path, started, data, None, 0, e)
+            raise
+        self._record(method, path, started, data, resp, len(body))
+        self._check_status(path, resp, body)
+        return self.codec.loads(body)
 
-    def _urlopen(self, *args, **kwargs):
+    def _urlopen(self, path, data=None, method=None, connect_timeout=None, read_timeout=None):
+        """
+        Sends a request and returns a tuple of the connection and the response
+        whose body is not read yet.  The connection must be released to the
+        pool, or closed, by the caller.  See ``query`` for timeouts.
+        """
+        if method is None:
+            method = 'GET' if data is None else 'POST'
+        started = time.time()
         try:
-            return urlopen(*args, **kwargs)
-        except HTTPError as e:
-            if e.code in self.ERRORS:
-                raise SensorBeeAPIError(self.ERRORS[e.code], json.loads(e.read().decode('utf-8'))['error'])
+            (conn, resp) = self._pool.open(method, self._path(path), data, self._headers(data),
+                                           connect_timeout, read_timeout)
+        except Exception as e:
+            self._record(method, path, started, data, None, 0, e)
+            raise
+        if 200 <= resp.status < 300:
+            self._record(method, path, started, data, resp, 0)
+            return (conn, resp)
+        try:
+            body = resp.read()
+        except Exception:
+            conn.close()
             raise
+        self._record(method, path, started, data, resp, len(body))
+        self._pool.release(conn, resp)
+        self._check_status(path, resp, body)
+
+    def _record(self, method, path, started, data, resp, received, exc=None):
+        metrics = self.metrics
+        if metrics is None:
+            return
+        status = None if resp is None else resp.status
+        if exc is not None:
+            error = type(exc).__name__
+        elif 200 <= status < 300:
+            error = None
+        elif status in self.ERRORS:
+            error = 'SensorBeeAPIError'
+        else:
+            error = 'HTTPError'
+        metrics.record_request(method, path, status, time.time() - started,
+                               0 if data is None else len(data), received, error)
+
+    def _headers(self, data):
+        if data is None:
+            return {}
+        return {'Content-Type': 'application/json'}
+
+    def _check_status(self, path, resp, body):
+        if 200 <= resp.status < 300:
+            return
+        if resp.status in self.ERRORS:
+            raise SensorBeeAPIError(self.ERRORS[resp.status], self.codec.loads(body)['error'])
+        raise HTTPError(self._url(path), resp.status, resp.reason, resp.msg, io.BytesIO(body))
 
     def runtime_status(self):
         """
@@ -79,7 +182,7 @@ class SensorBeeAPI(object):
         """
         Creates a new topology using the specified name.
         """
-        return self._req('topologies', json.dumps({'name': t}).encode())
+        return self._req('topologies', self.codec.dumps({'name': t}))
 
     def delete_topology(self, t):
         """
@@ -123,45 +226,69 @@ class SensorBeeAPI(object):
         """
         return self._req('topologies/{0}/sinks/{1}'.format(t, s))
 
-    def query(self, t, q):
+    def query(self, t, q, max_part_size=DEFAULT_MAX_PART_SIZE, connect_timeout=None, read_timeout=None,
+              idle_timeout=None):
         """
         Runs synchronous query on the topology.
         For ``SELECT`` queries, a ``ResultSet`` instance is returned; you can
-        iterate over it to retrieve tuples.
+        iterate over it to retrieve tuples.  ``max_part_size`` limits the size
+        of each tuple in bytes (see ``ResultSet``).  Close the result set (or
+        use it as a context manager) when you stop reading before the end of
+        the stream, so that the server stops the query at once.
         For other kind of queries, a dict instance that contains the result of
         the query is returned.
+
+        Timeouts in seconds override ``timeout`` of this instance for this
+        call: ``connect_timeout`` to establish a new connection,
+        ``read_timeout`` to wait for the response, and ``idle_timeout`` to
+        wait for each tuple of a ``SELECT`` stream (``read_timeout`` if
+        None).  A ``socket.timeout`` is raised on timeout; a stream timed
+        out is closed.
         """
-        close = True
-        f = self._urlopen(self._url('topologies/{0}/queries'.format(t)), json.dumps({'queries': q}).encode())
+        (conn, f) = self._urlopen('topologies/{0}/queries'.format(t), self.codec.dumps({'queries': q}),
+                                  connect_timeout=connect_timeout, read_timeout=read_timeout)
         try:
-            msg = _MessageWrapper(f.info())
+            msg = _MessageWrapper(f.msg)
             mimetype = msg.get_content_type()
             if mimetype == 'application/json':
-                return json.loads(f.read().decode('utf-8'))
+                result = self.codec.loads(f.read())
+                self._pool.release(conn, f)
+                conn = None
+                return result
             elif mimetype == 'multipart/mixed':
-                rs = ResultSet(f, msg.get_param('boundary'))
-                close = False
+                # The stream is not read until the end in general, so the
+                # connection cannot be reused; the ResultSet owns it instead.
+                if idle_timeout is not None and conn.sock is not None:
+                    conn.sock.settimeout(idle_timeout)
+                rs = ResultSet(f, msg.get_param('boundary'), conn, max_part_size, self.codec, self.metrics)
+                conn = None
                 return rs
             else:
                 raise RuntimeError('unexpected MIME type: {0}'.format(mimetype))
         finally:
-            if close:
+            if conn is not None:
+                conn.close()
                 f.close()
 
-    def wsquery(self, t):
+    def wsquery(self, t, dispatcher=None, **kwargs):
         """
         Returns a WebSocket API client (``WebSocketClient``) for the topology.
+        ``dispatcher`` and other keyword arguments (e.g., ``reconnect``) are
+        passed to the client.  The client uses the JSON codec of this instance
+        unless ``codec`` is given.
         """
         if not _WEBSOCKET_AVAILABLE:
             raise RuntimeError('websocket module is unavailable')
-        return WebSocketClient(self._url('topologies/{0}/wsqueries'.format(t), 'ws'))
+        kwargs.setdefault('codec', self.codec)
+        kwargs.setdefault('metrics', self.metrics)
+        return WebSocketClient(self._url('topologies/{0}/wsqueries'.format(t), 'ws'), dispatcher, **kwargs)
 
 class SensorBeeAPIError(Exception):
     def __init__(self, kind, err):
-        self.error_message = err['message']
-        self.error_code = err['code']
-        self.request_id = err['request_id']
-        self.meta = err['meta']
+        self.error_message = err.get('message')
+        self.error_code = err.get('code')
+        self.request_id = err.get('request_id')
+        self.meta = err.get('meta')
 
         msg = '{0}: {1} ({2}) [Request ID: {3}]\n{4}'.format(
                 kind, self.error_message, self.error_code, self.request_id,
@@ -169,7 +296,8 @@ class SensorBeeAPIError(Exception):
         super(SensorBeeAPIError, self).__init__(msg)
 
 class WebSocketClient(object):
-    def __init__(self, uri):
+    def __init__(self, uri, dispatcher=None, reconnect=False, reconnect_delay=0.1, reconnect_max_delay=30.0,
+                 codec=None, metrics=None, reconnect_max_attempts=None):
         """
         SensorBee WebSocket API client.
         By using WebSocket API, you can run asynchronous query on the topology.
@@ -178,12 +306,60 @@ class WebSocketClient(object):
         application thread.  It can be started by ``start`` method.  If you want
         to manage the thread or other low-level things by yourself, you can use
         ``run`` and ``setup`` methods instead.
+
+        Queries can be sent by ``submit``, which assigns request IDs
+        automatically and returns a ``Future``, or by ``send`` with a callback
+        function and a request ID of your own.  Both methods can be called
+        from multiple threads at once.
+
+        Callbacks given to ``send`` are run on the client application thread
+        by default.  To keep slow callbacks from stalling the connection, pass
+        a ``CallbackDispatcher`` as ``dispatcher`` to run them on its thread
+        pool instead.
+
+        When ``reconnect`` is True, the thread started by ``start`` reconnects
+        when the connection is lost, waiting ``reconnect_delay`` seconds before
+        the first attempt and doubling the delay up to ``reconnect_max_delay``
+        seconds on every failure.  After reconnecting, ``SELECT`` queries
+        still running are sent again with the same request IDs; their
+        callbacks receive a ``reconnect`` message (with the number of
+        reconnections and the downtime in seconds) followed by a new ``sos``
+        message.  Requests whose kind was not known yet receive an ``error``
+        message when the connection is lost.  The client gives up after
+        ``reconnect_max_attempts`` failed attempts in a row (if specified),
+        and fails the streams of ``submit`` as when reconnection is disabled.
+        See ``get_reconnect_stats`` for statistics.
+
+        ``codec`` is the JSON codec for messages (see
+        ``pysensorbee.codec.get_codec``).  ``metrics`` is a
+        ``pysensorbee.metrics.MetricsRegistry`` to record received tuples and
+        backlogs of streams in.
         """
         self._uri = uri
+        self._codec = get_codec(codec)
+        self._dispatcher = dispatcher
+        self._metrics = metrics
+        self._last_arrival = None
+        if metrics is not None and dispatcher is not None:
+            metrics.add_gauge('dispatcher', dispatcher.stats)
         self._app = None
         self._open = False
         self._error = None
         self._callback = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._next_rid = 1
+        self._reconnect = reconnect
+        self._reconnect_delay = reconnect_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        self._reconnect_max_attempts = reconnect_max_attempts
+        self._closing = False
+        self._connected = False
+        self._down_since = None
+        self._reconnects = 0
+        self._downtime = 0.0
+        self._last_downtime = 0.0
+        self._setup_kwargs = {}
         self.setup()
 
     def __del__(self):
@@ -191,19 +367,49 @@ class WebSocketClient(object):
         if app is not None:
             app.close()
 
-    def start(self, async=False):
+    def start(self, async_=False, timeout=None, **kwargs):
         """
-        Starts the client application thread.  When ``async`` is set to False,
-        this method waits for the connection to be established.
+        Starts the client application thread.  When ``async_`` is set to False,
+        this method waits for the connection to be established, up to
+        ``timeout`` seconds if specified.
+        ``async`` is also accepted as an alias of ``async_`` for compatibility.
         """
-        t = threading.Thread(target=self.run)
+        # ``async`` is a reserved word since Python 3.7.
+        async_ = kwargs.pop('async', async_)
+        if kwargs:
+            raise TypeError('unexpected keyword arguments: {0}'.format(', '.join(kwargs)))
+        t = threading.Thread(target=self._run_with_reconnect)
         t.daemon = True
         t.start()
-        if not async:
-            while not self._open:
+        if not async_:
+            self._ready.wait(timeout)
+            if not self._open:
                 if self._error is not None:
                     raise self._error
-                time.sleep(0.01)  # 10 msec
+                raise RuntimeError('failed to connect')
+
+    def _run_with_reconnect(self):
+        attempt = 0
+        while True:
+            self.run()
+            # ``on_close`` may not be called depending on how the connection
+            # was lost.
+            self._on_close(None)
+            # Only reconnect after the first connection has been established.
+            if not self._reconnect or self._closing or not self._connected:
+                return
+            if self._down_since is None:
+                self._down_since = time.time()
+            if self._open_since_setup:
+                attempt = 0
+            if self._reconnect_max_attempts is not None and self._reconnect_max_attempts <= attempt:
+                self._abort_submissions(RuntimeError('connection lost'))
+                return
+            time.sleep(min(self._reconnect_max_delay, self._reconnect_delay * (2 ** attempt)))
+            attempt += 1
+            if self._closing:
+                return
+            self.setup(**self._setup_kwargs)
 
     def send(self, queries, callback, rid):
         """
@@ -213,17 +419,57 @@ class WebSocketClient(object):
         """
         if not self._open:
             raise RuntimeError('not connected')
-        if rid in self._callback:
-            raise RuntimeError('the request ID {0} is currently used by another request'.format(rid))
-        data = json.dumps({'rid': int(rid), 'payload': {'queries': queries}}).encode()
-        self._callback[rid] = [callback, None]
-        self._app.send(data)
+        data = self._codec.dumps({'rid': int(rid), 'payload': {'queries': queries}})
+        with self._lock:
+            if rid in self._callback:
+                raise RuntimeError('the request ID {0} is currently used by another request'.format(rid))
+            self._callback[rid] = [callback, None, queries]
+        self._send(rid, data)
+
+    def submit(self, queries, maxsize=1024, overflow='block'):
+        """
+        Sends the queries with a new request ID and returns a ``Future``.
+
+        For ``SELECT`` queries, the result of the future is a
+        ``WebSocketStream``, which you can iterate over to retrieve tuples.
+        ``maxsize`` and ``overflow`` configure the buffer of the stream (see
+        ``WebSocketStream``).  For other kind of queries, the result is a dict
+        instance that contains the result of the query.  If the query fails,
+        the future raises ``SensorBeeAPIError``.
+        """
+        if overflow not in WebSocketStream.OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy: {0}'.format(overflow))
+        handler = _Submission(maxsize, overflow)
+        with self._lock:
+            # Checked under the lock so that a request is either rejected
+            # here or aborted by ``_on_close``.
+            if not self._open:
+                raise RuntimeError('not connected')
+            while self._next_rid in self._callback:
+                self._next_rid += 1
+            rid = self._next_rid
+            self._next_rid += 1
+            self._callback[rid] = [handler, None, queries]
+        handler.future.rid = rid
+        self._send(rid, self._codec.dumps({'rid': rid, 'payload': {'queries': queries}}))
+        return handler.future
+
+    def _send(self, rid, data):
+        try:
+            self._app.send(data)
+        except Exception:
+            with self._lock:
+                self._callback.pop(rid, None)
+            raise
 
     def close(self, **kwargs):
         """
         Shuts the connection down.
         """
+        self._closing = True
         self._app.close(**kwargs)
+        # ``on_close`` may not be called when closed from this side.
+        self._on_close(None)
 
     def is_open(self):
         """
@@ -237,11 +483,28 @@ class WebSocketClient(object):
         """
         return self._error
 
+    def get_reconnect_stats(self):
+        """
+        Returns a dict with the number of reconnections (``reconnects``), the
+        total and the last downtime in seconds (``downtime`` and
+        ``last_downtime``), and the current downtime (``down_for``, 0 while
+        connected).
+        """
+        down_since = self._down_since
+        return {
+            'reconnects': self._reconnects,
+            'downtime': self._downtime,
+            'last_downtime': self._last_downtime,
+            'down_for': 0.0 if down_since is None else time.time() - down_since,
+        }
+
     def setup(self, **kwargs):
         """
         ``setup`` is a low-level interface for users who need to configure
         WebSocketApp details.
         """
+        self._setup_kwargs = kwargs
+        self._open_since_setup = False
         self._app = websocket.WebSocketApp(
             self._uri,
             on_open=self._on_open,
@@ -260,36 +523,234 @@ class WebSocketClient(object):
 
     def _on_open(self, ws):
         self._open = True
+        self._open_since_setup = True
+        reconnected = self._connected
+        self._connected = True
+        self._ready.set()
+        if reconnected:
+            self._resubscribe()
+
+    def _resubscribe(self):
+        if self._down_since is not None:
+            self._last_downtime = time.time() - self._down_since
+            self._downtime += self._last_downtime
+            self._down_since = None
+        self._reconnects += 1
+        info = {'reconnects': self._reconnects, 'downtime': self._last_downtime}
+
+        with self._lock:
+            streams = [(rid, entry[0], entry[2]) for (rid, entry) in self._callback.items() if entry[1]]
+
+        for (rid, cb, queries) in streams:
+            self._deliver(cb, rid, 'reconnect', info)
+            data = self._codec.dumps({'rid': int(rid), 'payload': {'queries': queries}})
+            try:
+                self._app.send(data)
+            except Exception as e:
+                # The connection is lost again; try on the next reconnection.
+                self._error = e
 
     def _on_message(self, ws, data):
-        msg = json.loads(data)
+        metrics = self._metrics
+        if metrics is None:
+            msg = self._codec.loads(data)
+        else:
+            arrival = time.time()
+            msg = self._codec.loads(data)
+            if msg['type'] == 'result':
+                gap = None if self._last_arrival is None else arrival - self._last_arrival
+                self._last_arrival = arrival
+                metrics.record_tuple('websocket', len(data), time.time() - arrival, gap)
         (rid, msgtype, payload) = (msg['rid'], msg['type'], msg['payload'])
-        (cb, is_stream) = self._callback[rid]
+        with self._lock:
+            entry = self._callback[rid]
+            (cb, is_stream) = entry[0:2]
 
-        # On the initial message, automatically detect whether the query was
-        # a SELECT stream or oneshot request.
-        if is_stream is None:
-            self._callback[rid][1] = is_stream = (msgtype in ['sos', 'ping', 'eos'])
+            # On the initial message, automatically detect whether the query
+            # was a SELECT stream or oneshot request.
+            if is_stream is None:
+                entry[1] = is_stream = (msgtype in ['sos', 'ping', 'eos'])
 
-        # We cannot remove a callback function for a SELECT stream until
-        # 'eos' or 'error' message is observed.
-        remove_callback = not is_stream or (msgtype in ['eos', 'error'])
+            # We cannot remove a callback function for a SELECT stream until
+            # 'eos' or 'error' message is observed.  It is removed before
+            # invoking the callback so that the request ID can be reused in it.
+            if not is_stream or (msgtype in ['eos', 'error']):
+                del self._callback[rid]
 
+        self._deliver(cb, rid, msgtype, payload)
+
+    def _deliver(self, cb, rid, msgtype, payload):
+        if self._dispatcher is None or isinstance(cb, _Submission):
+            self._invoke(cb, rid, msgtype, payload)
+            if self._metrics is not None and isinstance(cb, _Submission) and cb._stream is not None:
+                done = msgtype in ('eos', 'error')
+                self._metrics.record_backlog(rid, None if done else cb._stream._queue.qsize())
+            return
+        overflow_payload = {'message': 'callback backlog overflowed', 'code': None, 'request_id': rid, 'meta': {}}
+        # Request IDs are only unique within a client; the dispatcher may be
+        # shared among clients.
+        self._dispatcher.dispatch(
+            (id(self), rid), functools.partial(self._invoke, cb, rid, msgtype, payload),
+            droppable=(msgtype in ['result', 'ping']),
+            on_overflow=functools.partial(self._invoke, cb, rid, 'error', overflow_payload))
+
+    def _invoke(self, cb, rid, msgtype, payload):
         try:
             # Invoke callback.
             cb(self, rid, msgtype, payload)
         except Exception as e:
             traceback.print_exc()
             self._error = e
-        finally:
-            if remove_callback:
-                del self._callback[rid]
 
     def _on_error(self, ws, err):
         self._error = err
+        self._ready.set()
 
-    def _on_close(self, ws):
+    def _on_close(self, ws, *args):
+        was_open = self._open
         self._open = False
+        self._ready.set()
+        if self._reconnect and not self._closing:
+            # Streams are kept for resubscription; other requests cannot be
+            # resumed as they may or may not have been run.
+            if was_open and self._down_since is None:
+                self._down_since = time.time()
+            with self._lock:
+                unknown = [(rid, entry[0]) for (rid, entry) in self._callback.items() if entry[1] is None]
+                for (rid, _) in unknown:
+                    del self._callback[rid]
+            error = {'message': 'connection lost', 'code': None, 'request_id': None, 'meta': {}}
+            for (rid, cb) in unknown:
+                self._deliver(cb, rid, 'error', error)
+            return
+        self._abort_submissions(RuntimeError('connection closed'))
+
+    def _abort_submissions(self, error):
+        # Requests submitted by ``submit`` never complete otherwise.
+        with self._lock:
+            pending = [(rid, entry[0]) for (rid, entry) in self._callback.items() if isinstance(entry[0], _Submission)]
+            for (rid, _) in pending:
+                del self._callback[rid]
+        for (_, cb) in pending:
+            cb.abort(error)
+
+class WebSocketStream(object):
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'error')
+
+    def __init__(self, rid, maxsize=1024, overflow='block'):
+        """
+        Tuples of a ``SELECT`` query sent by ``WebSocketClient.submit``.
+        Iterate over it to retrieve tuples; iteration ends when the stream
+        ends, and raises ``SensorBeeAPIError`` if the stream fails.
+
+        Up to ``maxsize`` tuples are buffered.  ``overflow`` is the policy
+        when the buffer is full: ``block`` blocks the client thread (which
+        stalls all requests on the connection), ``drop_oldest`` discards the
+        oldest tuple (counted in ``dropped``), and ``error`` aborts the stream
+        with a ``RuntimeError``.
+
+        When the client reconnects, the query is resumed and ``reconnects``
+        is incremented; tuples emitted during the downtime are lost.
+        """
+        self.rid = rid
+        self.dropped = 0
+        self.reconnects = 0
+        self._queue = queue.Queue(maxsize)
+        self._overflow = overflow
+        self._failed = None
+        self._aborted = None
+
+    def _put(self, item):
+        if self._failed is not None:
+            return
+        if self._overflow == 'block':
+            self._queue.put(item)
+            return
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                if self._overflow == 'error':
+                    self._failed = RuntimeError('stream buffer overflowed (rid: {0})'.format(self.rid))
+                    return
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def _abort(self, error):
+        # Called when the connection is lost; this must not block.
+        try:
+            self._queue.put_nowait(('error', error))
+        except queue.Full:
+            # The consumer notices after draining (see ``__next__``).
+            self._aborted = error
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._failed is not None:
+            raise self._failed
+        while True:
+            try:
+                # Wake up periodically in case the stream is aborted while
+                # waiting.
+                (msgtype, payload) = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._aborted is not None:
+                    self._failed = self._aborted
+                    raise self._aborted
+        if msgtype == 'result':
+            return payload
+        if msgtype == 'error':
+            self._failed = payload
+            raise payload
+        self._failed = StopIteration()
+        raise StopIteration
+
+    # For Python 2 compatibility
+    next = __next__
+
+class _Submission(object):
+    def __init__(self, maxsize, overflow):
+        """
+        Callback of requests sent by ``WebSocketClient.submit``.
+        """
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._stream = None
+
+    def __call__(self, client, rid, msgtype, payload):
+        stream = self._stream
+        if msgtype == 'reconnect':
+            if stream is not None:
+                stream.reconnects += 1
+        elif msgtype == 'error':
+            error = SensorBeeAPIError('Request Failure', payload)
+            if stream is None:
+                self.future.set_exception(error)
+            else:
+                stream._put((msgtype, error))
+        elif stream is None:
+            if msgtype == 'sos':
+                self._stream = WebSocketStream(rid, self._maxsize, self._overflow)
+                self.future.set_result(self._stream)
+            else:
+                self.future.set_result(payload)
+        elif msgtype in ('result', 'eos'):
+            stream._put((msgtype, payload))
+
+    def abort(self, error):
+        if self._stream is None:
+            self.future.set_exception(error)
+        else:
+            self._stream._abort(error)
 
 class _MessageWrapper(object):
     def __init__(self, msg):
@@ -309,31 +770,399 @@ class _MessageWrapper(object):
         return self.msg.get_param(*args, **kwargs)
 
 class ResultSet(object):
-    def __init__(self, _f, _boundary):
+    def __init__(self, _f, _boundary, _conn=None, max_part_size=DEFAULT_MAX_PART_SIZE, codec=None, metrics=None):
+        """
+        Iterable result of a ``SELECT`` query.  ``max_part_size`` is the upper
+        limit of the size of an encoded tuple in bytes (``None`` for no limit);
+        a ``RuntimeError`` is raised when a larger tuple is received.
+        ``codec`` is the JSON codec to decode tuples.  Received tuples are
+        recorded in ``metrics`` (a ``MetricsRegistry``) if given.
+        """
+        self._codec = get_codec(codec)
+        self._metrics = metrics
         self._f = _f
         self._boundary = _boundary
+        self._conn = _conn
+        self._max_part_size = max_part_size
+        self._closed = False
 
     def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """
+        Stops reading the stream and closes the connection at once, so that
+        the server stops the query; an iteration in progress, possibly in
+        another thread, ends.  This is done when an iteration ends, including
+        when a loop over the result set is left early.  Closing twice is
+        harmless.
+        """
+        self._closed = True
+        self._abort()
         f = self._f
         if f:
             f.close()
+        conn = self._conn
+        if conn:
+            conn.close()
 
-    def _rbufsize(self, f, size):
-        f.fp._rbufsize = size
+    def _abort(self):
+        # Shuts down the socket so that a thread blocked reading from the
+        # response returns immediately; the connection cannot be reused.
+        conn = self._conn
+        sock = conn.sock if conn is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except EnvironmentError:
+                pass
 
     def __iter__(self):
-        with contextlib.closing(self._f) as f:
-            parser = email.parser.FeedParser()
+        return self._iter(self._codec.loads)
+
+    def raw(self):
+        """
+        Iterates over tuples as encoded JSON (``bytes``) without decoding.
+        """
+        return self._iter(bytes)
+
+    def project(self, keys=None, max_string_length=None):
+        """
+        Iterates over tuples decoded partially: only the top-level fields in
+        ``keys`` are decoded (all if None), and strings longer than
+        ``max_string_length`` characters are replaced with stubs (the first
+        characters followed by ``... (omit)``) while parsing, without
+        decoding the rest.  Fields not requested and long strings cost only
+        a scan of their bytes, which is useful for streams of large blobs.
+        """
+        return self._iter(_Projector(self._codec, keys, max_string_length).project)
+
+    def _iter(self, loads):
+        metrics = self._metrics
+        f = self._f
+        try:
+            if metrics is None:
+                for part in _MultipartReader(f, self._boundary, self._max_part_size):
+                    yield loads(part)
+                return
+            last = time.time()
+            for part in _MultipartReader(f, self._boundary, self._max_part_size):
+                arrival = time.time()
+                d = loads(part)
+                metrics.record_tuple('resultset', len(part), time.time() - arrival, arrival - last)
+                last = arrival
+                yield d
+        except Exception:
+            if not self._closed:
+                raise
+            # Closed by another thread while reading.
+        finally:
+            self.close()
+
+    def prefetch(self, maxsize=1024, overflow='block', tuples=None):
+        """
+        Returns a ``PrefetchReader`` that reads and decodes tuples in a
+        background thread ahead of the consumer, so that the connection is
+        drained while the consumer is busy.  ``tuples`` is the iterator to
+        read (``iter(self)`` by default; e.g., ``self.project(...)``).  See
+        ``PrefetchReader`` for ``maxsize`` and ``overflow``.
+        """
+        return PrefetchReader(self, iter(self) if tuples is None else tuples, maxsize, overflow)
+
+    def parallel_map(self, func, workers=None, ordered=True, chunksize=64, timeout=None, max_pending=None,
+                     executor=None):
+        """
+        Applies ``func`` to each tuple in ``workers`` processes (the number
+        of CPUs if None) and yields the results.
+
+        Tuples are sent to the processes undecoded in chunks of up to
+        ``chunksize`` tuples, and decoded there by the codec of this result
+        set; ``func`` must be picklable (e.g., a module-level function).
+        When ``timeout`` is specified, a chunk is sent once ``timeout``
+        seconds have passed since its first tuple arrived (see
+        ``iter_batches``).  Results are yielded in the order of the tuples
+        if ``ordered`` is True, otherwise as soon as their chunks finish.
+        Up to ``max_pending`` chunks (twice the number of workers by
+        default) are processed or waiting at a time; reading tuples pauses
+        while the limit is reached, so memory use stays bounded.  An
+        exception raised by ``func`` is raised when its result would be
+        yielded.
+
+        A ``ProcessPoolExecutor`` is created for each call unless
+        ``executor`` is given.
+        """
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive: {0}'.format(chunksize))
+        if max_pending is None:
+            max_pending = 2 * (workers or multiprocessing.cpu_count())
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(workers)
+        if timeout is None:
+            chunks = self._batches(chunksize, self.raw())
+        else:
+            chunks = self._batches_with_timeout(chunksize, timeout, self.raw())
+        codec = self._codec.name
+        pending = collections.deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_map_chunk, func, codec, chunk))
+                for results in self._completed(pending, ordered, len(pending) >= max_pending):
+                    for r in results:
+                        yield r
+            while pending:
+                for results in self._completed(pending, ordered, True):
+                    for r in results:
+                        yield r
+        finally:
+            for f in pending:
+                f.cancel()
+            self.close()
+            if own_executor:
+                executor.shutdown()
+
+    def _completed(self, pending, ordered, block):
+        # Removes completed futures from pending and returns their results;
+        # waits for at least one if block is True.
+        if ordered:
+            if block:
+                wait([pending[0]])
+            results = []
+            while pending and pending[0].done():
+                results.append(pending.popleft().result())
+            return results
+        if block:
+            wait(pending, return_when=FIRST_COMPLETED)
+        done = [f for f in pending if f.done()]
+        for f in done:
+            pending.remove(f)
+        return [f.result() for f in done]
+
+    def iter_batches(self, size, timeout=None, columnar=False):
+        """
+        Iterates over tuples in batches of up to ``size`` tuples.
+
+        When ``timeout`` is specified, a batch is yielded once ``timeout``
+        seconds have passed since its first tuple arrived, even if it has
+        fewer than ``size`` tuples; tuples are read by a background thread
+        in this case.
+
+        When ``columnar`` is True, each batch is a dict that maps top-level
+        field names to NumPy arrays instead of a list of tuples.  Numeric and
+        boolean fields become typed arrays and other fields become object
+        arrays.  The schema is inferred from the tuples and kept across
+        batches.  This requires the ``numpy`` module.
+        """
+        if size < 1:
+            raise ValueError('batch size must be positive: {0}'.format(size))
+        convert = _ColumnarConverter().convert if columnar else list
+        batches = self._batches(size) if timeout is None else self._batches_with_timeout(size, timeout)
+        for batch in batches:
+            yield convert(batch)
+
+    def _batches(self, size, tuples=None):
+        batch = []
+        for d in (self if tuples is None else tuples):
+            batch.append(d)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _batches_with_timeout(self, size, timeout, tuples=None):
+        q = queue.Queue(size)
+        stopped = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read():
+            try:
+                for d in (self if tuples is None else tuples):
+                    if not put((d, None)):
+                        return
+                item = (end, None)
+            except Exception as e:
+                item = (end, e)
+            put(item)
+
+        t = threading.Thread(target=read)
+        t.daemon = True
+        t.start()
+        try:
+            batch = []
+            deadline = None
             while True:
-                self._rbufsize(f, 1)
-                line = f.readline()
-                if not line: break
-                if line.rstrip() == '--{0}'.format(self._boundary).encode():
-                    line = f.readline()
-                    while line.rstrip():
-                        parser.feed(line.decode('utf-8'))
-                        line = f.readline()
-                    length = int(parser.close()['Content-Length'])
-                    self._rbufsize(f, length)
-                    yield json.loads(f.read(length).decode('utf-8'))
-                    parser = email.parser.FeedParser()
+                try:
+                    if deadline is None:
+                        (d, err) = q.get()
+                    else:
+                        (d, err) = q.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    yield batch
+                    (batch, deadline) = ([], None)
+                    continue
+                if d is end:
+                    if batch:
+                        yield batch
+                    if err is not None:
+                        raise err
+                    return
+                if deadline is None:
+                    deadline = time.time() + timeout
+                batch.append(d)
+                if len(batch) == size:
+                    yield batch
+                    (batch, deadline) = ([], None)
+        finally:
+            stopped.set()
+            # The reader may be blocked reading the stream.
+            self.close()
+
+
+def _map_chunk(func, codec, chunk):
+    loads = get_codec(codec).loads
+    return [func(loads(data)) for data in chunk]
+
+
+class PrefetchReader(object):
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'error')
+
+    def __init__(self, rs, tuples, maxsize=1024, overflow='block'):
+        """
+        Iterable of tuples of a ``ResultSet`` read by a background thread.
+        Use ``ResultSet.prefetch`` to create one.
+
+        Up to ``maxsize`` tuples are buffered.  ``overflow`` is the policy
+        when the buffer is full: ``block`` stops reading until the consumer
+        catches up (the reader is "stalled"; the server may drop tuples
+        meanwhile), ``drop_oldest`` discards the oldest tuple (counted in
+        ``dropped``), and ``error`` aborts the iteration with a
+        ``RuntimeError``.  ``stats`` reports the buffer and stall status.
+
+        Call ``close`` (or use it as a context manager) to stop reading
+        before the end of the stream.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy: {0}'.format(overflow))
+        if maxsize < 1:
+            raise ValueError('maxsize must be positive: {0}'.format(maxsize))
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._rs = rs
+        self._overflow = overflow
+        self._buf = collections.deque()
+        self._cond = threading.Condition()
+        self._max_depth = 0
+        self._stalls = 0
+        self._stall_time = 0.0
+        self._stalled_since = None
+        self._done = False
+        self._stopped = False
+        self._error = None
+        self._thread = threading.Thread(target=self._read, args=(tuples,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _read(self, tuples):
+        cond = self._cond
+        buf = self._buf
+        error = None
+        try:
+            for d in tuples:
+                with cond:
+                    if len(buf) == self.maxsize and self._overflow == 'block' and not self._stopped:
+                        self._stalls += 1
+                        self._stalled_since = _monotonic()
+                        while len(buf) == self.maxsize and not self._stopped:
+                            cond.wait()
+                        self._stall_time += _monotonic() - self._stalled_since
+                        self._stalled_since = None
+                    if self._stopped:
+                        return
+                    if len(buf) == self.maxsize:
+                        if self._overflow == 'error':
+                            raise RuntimeError('prefetch buffer overflowed ({0} tuples)'.format(self.maxsize))
+                        buf.popleft()
+                        self.dropped += 1
+                    buf.append(d)
+                    self._max_depth = max(self._max_depth, len(buf))
+                    cond.notify()
+        except Exception as e:
+            error = e
+        finally:
+            with cond:
+                if not self._stopped:
+                    self._error = error
+                self._done = True
+                cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._cond:
+            while not self._buf and not self._done:
+                self._cond.wait()
+            if self._buf:
+                d = self._buf.popleft()
+                self._cond.notify()
+                return d
+            if self._error is not None:
+                (error, self._error) = (self._error, None)
+                raise error
+            raise StopIteration
+
+    # For Python 2 compatibility
+    next = __next__
+
+    def stats(self):
+        """
+        Returns a dict of ``depth`` (tuples buffered), ``max_depth``,
+        ``dropped``, ``stalls`` (times the reader was blocked by the full
+        buffer), ``stall_time`` (seconds blocked in total) and ``stalled``
+        (seconds blocked so far if blocked now, otherwise 0).
+        """
+        with self._cond:
+            stalled = 0.0 if self._stalled_since is None else _monotonic() - self._stalled_since
+            return {
+                'depth': len(self._buf),
+                'max_depth': self._max_depth,
+                'dropped': self.dropped,
+                'stalls': self._stalls,
+                'stall_time': self._stall_time + stalled,
+                'stalled': stalled,
+            }
+
+    def close(self):
+        """
+        Stops reading and discards buffered tuples.  The connection is
+        closed as it cannot be reused in the middle of the stream.
+        """
+        with self._cond:
+            if not self._done:
+                self._stopped = True
+            self._buf.clear()
+            self._cond.notify_all()
+        self._rs.close()
+        self._thread.join()
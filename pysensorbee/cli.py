@@ -2,21 +2,33 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
 import sys
 import json
 import optparse
+import time
 
 from .api import SensorBeeAPI
+from .metrics import MetricsRegistry, format_summary
 from .tools.spider import Spider
 from .tools.dot import DotView
 from .tools.top import TopView
+from .tools.rate import RateCalculator
+from .tools.writer import TupleWriter
 from .tools.peeker import Peeker
+from .tools.exporter import PrometheusExporter
+from .tools.fleet import FleetSpider, FleetView
+from .tools.history import HistoryStore, SPARKS, ASCII_SPARKS
+from .tools.aggregate import WindowAggregator, parse_window
 from ._version import __version__
 
 
 # For Python 3 compatibility
 unicode = type('')
 
+# Python 3.3 or later
+_monotonic = getattr(time, 'monotonic', time.time)
+
 class _OptionParser(optparse.OptionParser, object):
     def __init__(self, *args, **kwargs):
         self._error = False
@@ -29,6 +41,64 @@ class _OptionParser(optparse.OptionParser, object):
 def print_out(out, msg):
     out.write(msg)
 
+def can_encode(out, text):
+    """
+    Returns if ``text`` can be written to ``out`` without an encoding error.
+    Streams without an encoding take any text on Python 3, and only ASCII
+    on Python 2.
+    """
+    encoding = getattr(out, 'encoding', None) or ('ascii' if bytes is str else 'utf-8')
+    try:
+        text.encode(encoding)
+        return True
+    except (UnicodeError, LookupError):
+        return False
+
+def parse_endpoint(s, default_port=15601):
+    """
+    Parses ``host[:port]`` into a tuple of host and port, or returns None if
+    it is invalid.  IPv6 addresses must be enclosed in brackets.
+    """
+    (host, port) = (s, default_port)
+    if s.startswith('['):
+        (host, _, rest) = s[1:].partition(']')
+        if rest:
+            if not rest.startswith(':'):
+                return None
+            port = rest[1:]
+    elif ':' in s:
+        (host, _, port) = s.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        return None
+    if not host or port < 1 or 65535 < port:
+        return None
+    return (host, port)
+
+def read_endpoints(path):
+    """
+    Reads ``host[:port]`` endpoints from a file, one per line.  Blank lines
+    and lines starting with ``#`` are ignored.  Raises ValueError if an
+    endpoint is invalid.
+    """
+    endpoints = []
+    with open(path) as f:
+        for (i, line) in enumerate(f):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            endpoint = parse_endpoint(line)
+            if endpoint is None:
+                raise ValueError('{0}:{1}: invalid endpoint: {2}'.format(path, i + 1, line))
+            endpoints.append(endpoint)
+    return endpoints
+
+def print_stats(out, metrics):
+    print_out(out, '\n')
+    print_out(out, format_summary(metrics.snapshot()))
+    print_out(out, '\n')
+
 class SbStatCommand(object):
     def __init__(self, out=sys.stdout, err=sys.stderr):
         self._out = out
@@ -55,6 +125,26 @@ class SbStatCommand(object):
             print_out(err, 'Error: port number out of range: {0}\n'.format(params.port))
             self.print_usage()
             return 1
+        if params.timeout is not None and params.timeout <= 0:
+            print_out(err, 'Error: timeout must be positive: {0}\n'.format(params.timeout))
+            self.print_usage()
+            return 1
+        if params.workers < 1:
+            print_out(err, 'Error: number of workers must be positive: {0}\n'.format(params.workers))
+            self.print_usage()
+            return 1
+        if params.watch is not None and params.watch <= 0:
+            print_out(err, 'Error: watch interval must be positive: {0}\n'.format(params.watch))
+            self.print_usage()
+            return 1
+        if params.history is not None and params.watch is None:
+            print_out(err, 'Error: --history can only be used with --watch\n')
+            self.print_usage()
+            return 1
+        if params.watch is not None and (params.json or params.dot):
+            print_out(err, 'Error: --watch cannot be used with --json or --dot\n')
+            self.print_usage()
+            return 1
         if params.json and params.topology:
             print_out(err, 'Error: --json and --topology cannot be used at once\n')
             self.print_usage()
@@ -63,13 +153,74 @@ class SbStatCommand(object):
             print_out(err, 'Error: --json and --dot cannot be used at once\n')
             self.print_usage()
             return 1
+        if params.host_timeout is not None and params.host_timeout <= 0:
+            print_out(err, 'Error: host timeout must be positive: {0}\n'.format(params.host_timeout))
+            self.print_usage()
+            return 1
+        endpoints = []
+        for e in params.endpoint or []:
+            endpoint = parse_endpoint(e)
+            if endpoint is None:
+                print_out(err, 'Error: invalid endpoint: {0}\n'.format(e))
+                self.print_usage()
+                return 1
+            endpoints.append(endpoint)
+        if params.endpoints_file is not None:
+            try:
+                endpoints += read_endpoints(params.endpoints_file)
+            except (EnvironmentError, ValueError) as e:
+                print_out(err, 'Error: {0}\n'.format(e))
+                return 1
+        endpoints = [e for (i, e) in enumerate(endpoints) if e not in endpoints[:i]]
+        if endpoints and (params.topology or params.dot or params.watch is not None):
+            print_out(err, 'Error: --topology, --dot and --watch cannot be used with multiple endpoints\n')
+            self.print_usage()
+            return 1
 
-        api = SensorBeeAPI(params.host, params.port)
+        metrics = MetricsRegistry() if params.stats else None
+        try:
+            if endpoints:
+                # Requests to servers timed out must end eventually, as
+                # the interpreter waits for them on exit.
+                timeout = params.host_timeout if params.timeout is None else params.timeout
+                apis = [SensorBeeAPI(host, port, timeout=timeout, metrics=metrics) for (host, port) in endpoints]
+                return self._run_fleet(params, apis)
+            api = SensorBeeAPI(params.host, params.port, timeout=params.timeout, metrics=metrics)
+            return self._run(params, api)
+        finally:
+            if metrics is not None:
+                print_stats(err, metrics)
+
+    def _run_fleet(self, params, apis):
+        spider = FleetSpider(apis, params.workers, params.host_timeout)
+        status = spider.get()
+        if params.json:
+            # Raw JSON mode; failed hosts have the error message.
+            result = dict(status)
+            for (host, e) in spider.failures.items():
+                result[host] = {'error': '{0}'.format(getattr(e, 'error_message', None) or e)}
+            json.dump(result, self._out, indent=4)
+        else:
+            print_out(self._out, FleetView(spider).render_status(status, spider.failures, spider.durations))
+        print_out(self._out, '\n')
+        for (host, errors) in sorted(spider.errors.items()):
+            for (t, kind, name, e) in errors:
+                e = getattr(e, 'error_message', e)
+                if name is None:
+                    print_out(self._err, 'Warning: {0}: failed to list {1} of topology {2}: {3}\n'.format(host, kind, t, e))
+                else:
+                    print_out(self._err, 'Warning: {0}: failed to get status of {1} in topology {2}: {3}\n'.format(host, name, t, e))
+        return 0 if status else 1
+
+    def _run(self, params, api):
+        err = self._err
+        spider = Spider(api, params.workers)
 
         if params.json:
             # Raw JSON mode
-            json.dump(Spider(api).get(), self._out, indent=4)
+            json.dump(spider.get(), self._out, indent=4)
             print_out(self._out, '\n')
+            self._print_errors(spider)
             return 0
 
         # Determine which topology to use.
@@ -91,17 +242,67 @@ class SbStatCommand(object):
                 print_out(err, 'Topologies: {0}\n'.format(', '.join(sorted(topos))))
                 return 1
 
-        if params.dot:
+        if params.watch is not None:
+            # Watch mode
+            self._watch(api, spider, params.topology, params.watch, params.count, params.history)
+        elif params.dot:
             # DOT mode
-            print_out(self._out, DotView(api).render(params.topology))
+            print_out(self._out, DotView(api, spider).render(params.topology))
             print_out(self._out, '\n')
         else:
             # Top mode (default)
-            print_out(self._out, TopView(api).render(params.topology))
+            print_out(self._out, TopView(api, spider).render(params.topology))
             print_out(self._out, '\n')
+            self._print_errors(spider)
 
         return 0
 
+    def _watch(self, api, spider, t, interval, count, history_path=None):
+        view = TopView(api, spider, sparks=SPARKS if can_encode(self._out, SPARKS) else ASCII_SPARKS)
+        calc = RateCalculator()
+        history = HistoryStore(history_path)
+        clear = getattr(self._out, 'isatty', lambda: False)()
+        n = 0
+        next_time = _monotonic()
+        try:
+            while True:
+                now = _monotonic()
+                rs = spider.get_runtime_status()
+                ts = spider.get_topology_status(t)
+                rates = calc.update(now, rs, ts)
+                history.record(time.time(), t, ts)
+                if clear:
+                    # Move the cursor to the top-left and clear the screen.
+                    print_out(self._out, '\x1b[H\x1b[J')
+                print_out(self._out, view.render_status(t, rs, ts, rates, history))
+                print_out(self._out, '\n\n')
+                self._out.flush()
+                self._print_errors(spider)
+
+                n += 1
+                if count != 0 and count <= n:
+                    break
+
+                # Schedule the next update based on the start time so that
+                # the interval does not drift; skip updates already missed.
+                next_time += interval
+                now = _monotonic()
+                if next_time < now:
+                    next_time += ((now - next_time) // interval + 1) * interval
+                time.sleep(next_time - now)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            history.close()
+
+    def _print_errors(self, spider):
+        for (t, kind, name, e) in spider.errors:
+            e = getattr(e, 'error_message', e)
+            if name is None:
+                print_out(self._err, 'Warning: failed to list {0} of topology {1}: {2}\n'.format(kind, t, e))
+            else:
+                print_out(self._err, 'Warning: failed to get status of {0} in topology {1}: {2}\n'.format(name, t, e))
+
     def _create_parser(self):
         version = '%prog {0}'.format(__version__)
         usage = 'Usage: %prog [options]'
@@ -110,12 +311,30 @@ class SbStatCommand(object):
                           help='host name or IP address of the server (default: %default)')
         parser.add_option('-P', '--port', type='int', default=15601,
                           help='port number of the server (default: %default)')
+        parser.add_option('-e', '--endpoint', type='string', default=None, action='append', metavar='HOST[:PORT]',
+                          help='server to monitor in fleet mode; can be specified multiple times')
+        parser.add_option('--endpoints-file', type='string', default=None, metavar='FILE',
+                          help='file listing servers to monitor in fleet mode, one HOST[:PORT] per line')
         parser.add_option('-t', '--topology', type='string', default=None,
                           help='topology name')
+        parser.add_option('--timeout', type='float', default=None,
+                          help='timeout of each request in seconds')
+        parser.add_option('--host-timeout', type='float', default=None,
+                          help='timeout of crawling each server in fleet mode in seconds; also the default of --timeout')
+        parser.add_option('--workers', type='int', default=8,
+                          help='number of concurrent requests (default: %default)')
+        parser.add_option('-w', '--watch', type='float', default=None, metavar='INTERVAL',
+                          help='update the status with rates every INTERVAL seconds')
+        parser.add_option('--history', type='string', default=None, metavar='DIR',
+                          help='keep the history of the status in DIR in watch mode')
+        parser.add_option('-c', '--count', type='int', default=0,
+                          help='number of updates in watch mode, 0 for infinite (default: %default)')
         parser.add_option('--json', default=False, action='store_true',
                           help='dump results as JSON')
         parser.add_option('--dot', default=False, action='store_true',
                           help='dump results as DOT')
+        parser.add_option('--stats', default=False, action='store_true',
+                          help='print request and stream statistics to stderr on exit')
         parser.add_option('--help', default=False, action='store_true',
                           help='print the usage and exit')
         return parser
@@ -129,6 +348,9 @@ class SbStatCommand(object):
         print_out(err, '\n')
 
 class SbPeekCommand(object):
+    # Strings longer than this are omitted by --omit-long-strings.
+    MAX_STRING_LENGTH = 40
+
     def __init__(self, out=sys.stdout, err=sys.stderr):
         self._out = out
         self._err = err
@@ -158,13 +380,48 @@ class SbPeekCommand(object):
             print_out(err, 'Error: stream name must be specified\n')
             self.print_usage()
             return 1
-        if 1 < len(streams):
-            print_out(err, 'Error: only one stream name can be specified\n')
+        if params.duration < 0:
+            print_out(err, 'Error: duration must not be negative: {0}\n'.format(params.duration))
+            self.print_usage()
+            return 1
+        if params.output is None and (params.format != 'jsonl' or params.compress != 'none'):
+            print_out(err, 'Error: --format and --compress can only be used with --output\n')
+            self.print_usage()
+            return 1
+        if params.format not in TupleWriter.FORMATS:
+            print_out(err, 'Error: unknown format: {0}\n'.format(params.format))
             self.print_usage()
             return 1
+        if params.compress not in TupleWriter.COMPRESSIONS:
+            print_out(err, 'Error: unknown compression: {0}\n'.format(params.compress))
+            self.print_usage()
+            return 1
+        if params.agg is None and (params.window is not None or params.slide is not None or
+                                   params.group_by is not None):
+            print_out(err, 'Error: --window, --slide and --group-by can only be used with --agg\n')
+            self.print_usage()
+            return 1
+        if params.agg is not None:
+            if params.window is None:
+                params.window = '10s'
+            try:
+                self._aggregator(params)
+            except ValueError as e:
+                print_out(err, 'Error: {0}\n'.format(e))
+                self.print_usage()
+                return 1
 
-        api = SensorBeeAPI(params.host, params.port)
-        stream = streams[0]
+        metrics = MetricsRegistry() if params.stats else None
+        api = SensorBeeAPI(params.host, params.port, metrics=metrics)
+        try:
+            return self._run(params, api, streams)
+        finally:
+            if metrics is not None:
+                print_stats(err, metrics)
+
+    def _run(self, params, api, streams):
+        err = self._err
+        peeker = Peeker(api)
 
         # Determine which topology to use.
         topos = [t['name'] for t in api.topologies()['topologies']]
@@ -185,32 +442,106 @@ class SbPeekCommand(object):
                 print_out(err, 'Topologies: {0}\n'.format(', '.join(sorted(topos))))
                 return 1
 
+        # Expand glob patterns.
+        patterns = streams
+        try:
+            streams = peeker.expand(params.topology, patterns)
+        except ValueError as e:
+            print_out(err, 'Error: {0}\n'.format(e))
+            return 1
+
+        # Tuples are tagged with the stream name and the arrival time unless
+        # a single stream is explicitly specified.
+        tagged = streams != patterns or 1 < len(streams)
+        if 1 < len(streams):
+            print_out(err, 'Peeking streams: {0}\n'.format(', '.join(streams)))
+        # Long strings are omitted while decoding so that large blobs are
+        # never decoded in full.
+        max_string_length = self.MAX_STRING_LENGTH if params.omit_long_strings else None
+        if params.agg is not None:
+            # Aggregation mode; --count is the number of windows.
+            tuples = self._aggregate(peeker.peek_many(
+                params.topology, streams, 0, params.expressions, params.duration or None,
+                max_string_length=max_string_length), params, streams, tagged)
+        else:
+            tuples = self._tuples(peeker.peek_many(
+                params.topology, streams, params.count, params.expressions, params.duration or None,
+                max_string_length=max_string_length), tagged)
+
+        if params.output is not None:
+            # File output mode
+            writer = TupleWriter(params.output, params.format, params.compress, params.rotate_size,
+                                 params.flush_size, params.flush_interval)
+            try:
+                for d in tuples:
+                    writer.write(d)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                writer.close()
+            print_out(err, 'Wrote {0} tuples to {1}\n'.format(writer.count, ', '.join(writer.files)))
+            return 0
+
         indent = None if params.oneline else 4
-        for d in Peeker(api).peek(params.topology, stream, params.count, params.expressions):
-            if params.omit_long_strings:
-                d = self._omit_long_strings(d)
-            print_out(self._out, json.dumps(d, indent=indent))
-            print_out(self._out, '\n')
-            self._out.flush()
+        try:
+            for d in tuples:
+                print_out(self._out, json.dumps(d, indent=indent))
+                print_out(self._out, '\n')
+                self._out.flush()
+        except KeyboardInterrupt:
+            pass
 
         return 0
 
-    def _omit_long_strings(self, v):
-        if isinstance(v, unicode) and len(v) > 40:
-            return '{0}... (omit)'.format(v[0:40])
-        elif isinstance(v, list):
-            return [self._omit_long_strings(elem) for elem in v]
-        elif isinstance(v, dict):
-            # keys should not be summarized
-            v2 = {}
-            for key in v.keys():
-                v2[key] = self._omit_long_strings(v[key])
-            return v2
-        return v
+    def _tuples(self, results, tagged):
+        for (stream, timestamp, d) in results:
+            if tagged:
+                d = {'stream': stream, 'timestamp': timestamp, 'tuple': d}
+            yield d
+
+    def _aggregator(self, params):
+        (window, count_based) = parse_window(params.window)
+        slide = None
+        if params.slide is not None:
+            (slide, slide_count_based) = parse_window(params.slide)
+            if slide_count_based != count_based:
+                raise ValueError('--window and --slide must be both durations or both numbers of tuples')
+        fields = [f.strip() for f in params.agg.split(',') if f.strip()]
+        if not fields:
+            raise ValueError('no field to aggregate')
+        return WindowAggregator(fields, window, slide, count_based, params.group_by)
+
+    def _aggregate(self, results, params, streams, tagged):
+        # Yields rows of windows aggregated for each stream, then rows of
+        # the current windows when stopped.
+        aggregators = dict((s, self._aggregator(params)) for s in streams)
+        n = 0
+        try:
+            for (stream, timestamp, d) in results:
+                for window in aggregators[stream].add(d, timestamp):
+                    for row in window:
+                        yield self._row(stream, row, tagged)
+                    n += 1
+                    if params.count != 0 and params.count <= n:
+                        return
+        except KeyboardInterrupt:
+            pass
+        for s in streams:
+            for window in aggregators[s].flush():
+                for row in window:
+                    yield self._row(s, row, tagged)
+                n += 1
+                if params.count != 0 and params.count <= n:
+                    return
+
+    def _row(self, stream, row, tagged):
+        if tagged:
+            row = collections.OrderedDict([('stream', stream)] + list(row.items()))
+        return row
 
     def _create_parser(self):
         version = '%prog {0}'.format(__version__)
-        usage = 'Usage: %prog [options] stream'
+        usage = 'Usage: %prog [options] stream [stream ...]'
         parser = _OptionParser(version=version, usage=usage, add_help_option=False)
         parser.add_option('-H', '--host', type='string', default='127.0.0.1',
                           help='host name or IP address of the server (default: %default)')
@@ -219,13 +550,40 @@ class SbPeekCommand(object):
         parser.add_option('-t', '--topology', type='string', default=None,
                           help='topology name')
         parser.add_option('-c', '--count', type='int', default=1,
-                          help='number of records to peek, 0 for infinite (default: %default)')
+                          help='number of records (windows with --agg) to peek in total, 0 for infinite '
+                               '(default: %default)')
+        parser.add_option('-d', '--duration', type='float', default=0, metavar='SECONDS',
+                          help='stop peeking after SECONDS, 0 for no limit (default: %default)')
         parser.add_option('-e', '--expressions', type='string', default='*',
                           help='comma-separated list of expressions to SELECT (default: %default)')
         parser.add_option('-1', '--oneline', default=False, action='store_true',
                           help='do not pretty-print tuples')
         parser.add_option('-m', '--omit-long-strings', default=False, action='store_true',
                           help='omit long string values; useful for large blobs')
+        parser.add_option('-o', '--output', type='string', default=None, metavar='FILE',
+                          help='write tuples to FILE instead of printing them')
+        parser.add_option('-f', '--format', type='string', default='jsonl',
+                          help='output file format: {0} (default: %default)'.format(', '.join(TupleWriter.FORMATS)))
+        parser.add_option('-z', '--compress', type='string', default='none',
+                          help='output file compression: {0} (default: %default)'.format(', '.join(TupleWriter.COMPRESSIONS)))
+        parser.add_option('--rotate-size', type='int', default=0, metavar='BYTES',
+                          help='start a new output file when it reaches BYTES, 0 for no rotation (default: %default)')
+        parser.add_option('--flush-size', type='int', default=1024 * 1024, metavar='BYTES',
+                          help='write to the output file when BYTES are buffered (default: %default)')
+        parser.add_option('--flush-interval', type='float', default=1.0, metavar='SECONDS',
+                          help='write to the output file at least every SECONDS (default: %default)')
+        parser.add_option('--agg', type='string', default=None, metavar='FIELD[,FIELD...]',
+                          help='print count, sum, mean, min, max and quantiles of the fields in each window '
+                               'instead of tuples')
+        parser.add_option('--window', type='string', default=None, metavar='SIZE',
+                          help='window size for --agg: a duration (e.g., 500ms, 10s, 1m) or a number of tuples '
+                               '(default: 10s)')
+        parser.add_option('--slide', type='string', default=None, metavar='SIZE',
+                          help='start a window every SIZE for --agg (default: same as --window)')
+        parser.add_option('--group-by', type='string', default=None, metavar='FIELD',
+                          help='aggregate for each value of FIELD for --agg')
+        parser.add_option('--stats', default=False, action='store_true',
+                          help='print request and stream statistics to stderr on exit')
         parser.add_option('--help', default=False, action='store_true',
                           help='print the usage and exit')
         return parser
@@ -238,6 +596,217 @@ class SbPeekCommand(object):
         self._parser.print_help(err)
         print_out(err, '\n')
 
+class SbBenchCommand(object):
+    def __init__(self, out=sys.stdout, err=sys.stderr):
+        self._out = out
+        self._err = err
+        self._parser = self._create_parser()
+
+    def main(self, argv):
+        # Imported here so that other commands do not load the stand-in server.
+        from .testing.benchmark import BenchmarkSuite, save_baseline, load_baseline, compare
+
+        err = self._err
+        (params, _) = self._parser.parse_args(argv + [''])  # [''] is added to workaround optparse bug
+
+        # Failed to parse options.
+        if self._parser._error:
+            print_out(err, 'Error: {0}'.format(self._parser._msg))
+            self.print_usage()
+            return 2
+
+        # Help option is specified.
+        if params.help:
+            self.print_usage()
+            return 0
+
+        # Validate parameters.
+        names = params.benchmark or None
+        for name in names or []:
+            if name not in BenchmarkSuite.BENCHMARKS:
+                print_out(err, 'Error: unknown benchmark: {0}\n'.format(name))
+                self.print_usage()
+                return 1
+        try:
+            sizes = [int(x) for x in params.sizes.split(',')]
+        except ValueError:
+            sizes = []
+        if not sizes or min(sizes) < 1:
+            print_out(err, 'Error: invalid topology sizes: {0}\n'.format(params.sizes))
+            self.print_usage()
+            return 1
+        if params.tuples < 1 or params.clients < 1 or params.repeat < 1:
+            print_out(err, 'Error: --tuples, --clients and --repeat must be positive\n')
+            self.print_usage()
+            return 1
+        if not 0 <= params.tolerance:
+            print_out(err, 'Error: tolerance must not be negative: {0}\n'.format(params.tolerance))
+            self.print_usage()
+            return 1
+
+        baseline = None
+        if params.baseline is not None:
+            baseline = load_baseline(params.baseline)
+
+        suite = BenchmarkSuite(params.tuples, params.tuple_size, sizes, params.clients, params.repeat)
+        results = suite.run(names, lambda name: print_out(err, 'Running {0}...\n'.format(name)))
+
+        if params.json:
+            json.dump(results, self._out, indent=4)
+            print_out(self._out, '\n')
+        else:
+            lines = [['Benchmark', 'Result', 'Unit', 'Peak Memory', 'Baseline']]
+            for (name, r) in results.items():
+                b = (baseline or {}).get(name)
+                lines.append([
+                    name,
+                    '{0:.6g}'.format(r['value']),
+                    r['unit'],
+                    '-' if r['peak_memory'] is None else '{0:.1f} MiB'.format(r['peak_memory'] / 1024 / 1024),
+                    '-' if b is None else '{0:+.1f}%'.format((r['value'] / b['value'] - 1) * 100),
+                ])
+            colsize = [max([len(line[i]) for line in lines]) for i in range(len(lines[0]))]
+            for line in lines:
+                print_out(self._out, '   '.join([v.ljust(colsize[i]) for (i, v) in enumerate(line)]).rstrip())
+                print_out(self._out, '\n')
+
+        if params.save is not None:
+            save_baseline(results, params.save)
+            print_out(err, 'Saved baseline to {0}\n'.format(params.save))
+
+        if baseline is not None:
+            regressions = compare(results, baseline, params.tolerance)
+            for (name, metric, old, new) in regressions:
+                print_out(err, 'Regression: {0} {1}: {2:.6g} -> {3:.6g}\n'.format(name, metric, old, new))
+            if regressions:
+                return 1
+
+        return 0
+
+    def _create_parser(self):
+        from .testing.benchmark import BenchmarkSuite
+
+        version = '%prog {0}'.format(__version__)
+        usage = 'Usage: %prog [options]'
+        parser = _OptionParser(version=version, usage=usage, add_help_option=False)
+        parser.add_option('-b', '--benchmark', type='string', action='append', default=[],
+                          help='benchmark to run: {0} (default: all; can be specified multiple times)'.format(
+                              ', '.join(BenchmarkSuite.BENCHMARKS)))
+        parser.add_option('--tuples', type='int', default=100000,
+                          help='number of tuples to read (default: %default)')
+        parser.add_option('--tuple-size', type='int', default=100, metavar='BYTES',
+                          help='approximate size of each tuple (default: %default)')
+        parser.add_option('--sizes', type='string', default='10,100,1000',
+                          help='comma-separated numbers of streams in synthetic topologies (default: %default)')
+        parser.add_option('--clients', type='int', default=8,
+                          help='number of WebSocket clients (default: %default)')
+        parser.add_option('--repeat', type='int', default=3,
+                          help='number of runs of each benchmark (default: %default)')
+        parser.add_option('--save', type='string', default=None, metavar='FILE',
+                          help='save results as the baseline to FILE')
+        parser.add_option('--baseline', type='string', default=None, metavar='FILE',
+                          help='compare results with the baseline in FILE and fail on regressions')
+        parser.add_option('--tolerance', type='float', default=0.2,
+                          help='allowed relative regression from the baseline (default: %default)')
+        parser.add_option('--json', default=False, action='store_true',
+                          help='dump results as JSON')
+        parser.add_option('--help', default=False, action='store_true',
+                          help='print the usage and exit')
+        return parser
+
+    def print_usage(self):
+        err = self._err
+        print_out(err, '\n')
+        print_out(err, 'sbbench - SensorBee Client Benchmark\n')
+        print_out(err, '\n')
+        self._parser.print_help(err)
+        print_out(err, '\n')
+
+class SbExporterCommand(object):
+    def __init__(self, out=sys.stdout, err=sys.stderr):
+        self._out = out
+        self._err = err
+        self._parser = self._create_parser()
+
+    def main(self, argv):
+        err = self._err
+        (params, servers) = self._parser.parse_args(argv)
+
+        # Failed to parse options.
+        if self._parser._error:
+            print_out(err, 'Error: {0}'.format(self._parser._msg))
+            self.print_usage()
+            return 2
+
+        # Help option is specified.
+        if params.help:
+            self.print_usage()
+            return 0
+
+        # Validate parameters.
+        endpoints = []
+        for s in servers or ['127.0.0.1']:
+            endpoint = parse_endpoint(s)
+            if endpoint is None:
+                print_out(err, 'Error: invalid server: {0}\n'.format(s))
+                self.print_usage()
+                return 1
+            endpoints.append(endpoint)
+        if params.listen_port < 0 or 65535 < params.listen_port:
+            print_out(err, 'Error: port number out of range: {0}\n'.format(params.listen_port))
+            self.print_usage()
+            return 1
+        if params.interval <= 0:
+            print_out(err, 'Error: interval must be positive: {0}\n'.format(params.interval))
+            self.print_usage()
+            return 1
+        if params.timeout is not None and params.timeout <= 0:
+            print_out(err, 'Error: timeout must be positive: {0}\n'.format(params.timeout))
+            self.print_usage()
+            return 1
+        if params.workers < 1:
+            print_out(err, 'Error: number of workers must be positive: {0}\n'.format(params.workers))
+            self.print_usage()
+            return 1
+
+        apis = [SensorBeeAPI(host, port, timeout=params.timeout) for (host, port) in endpoints]
+        exporter = PrometheusExporter(apis, params.interval, params.workers)
+        exporter.listen(params.listen, params.listen_port)
+        print_out(err, 'Serving metrics of {0} at http://{1}:{2}/metrics\n'.format(
+            ', '.join(['{0}:{1}'.format(h, p) for (h, p) in endpoints]), *exporter.server_address))
+        exporter.start()
+        try:
+            exporter.serve()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def _create_parser(self):
+        version = '%prog {0}'.format(__version__)
+        usage = 'Usage: %prog [options] [host[:port] ...]'
+        parser = _OptionParser(version=version, usage=usage, add_help_option=False)
+        parser.add_option('-l', '--listen', type='string', default='127.0.0.1',
+                          help='address to serve metrics at (default: %default)')
+        parser.add_option('-p', '--listen-port', type='int', default=9601,
+                          help='port number to serve metrics at (default: %default)')
+        parser.add_option('-i', '--interval', type='float', default=15.0,
+                          help='interval between crawls of each server in seconds (default: %default)')
+        parser.add_option('--timeout', type='float', default=10.0,
+                          help='timeout of each request in seconds (default: %default)')
+        parser.add_option('--workers', type='int', default=8,
+                          help='number of concurrent requests per server (default: %default)')
+        parser.add_option('--help', default=False, action='store_true',
+                          help='print the usage and exit')
+        return parser
+
+    def print_usage(self):
+        err = self._err
+        print_out(err, '\n')
+        print_out(err, 'sbexporter - SensorBee Prometheus Exporter\n')
+        print_out(err, '\n')
+        self._parser.print_help(err)
+        print_out(err, '\n')
+
 def sbstat():
     cmd = SbStatCommand()
     retval = cmd.main(sys.argv[1:])
@@ -247,3 +816,13 @@ def sbpeek():
     cmd = SbPeekCommand()
     retval = cmd.main(sys.argv[1:])
     sys.exit(retval)
+
+def sbbench():
+    cmd = SbBenchCommand()
+    retval = cmd.main(sys.argv[1:])
+    sys.exit(retval)
+
+def sbexporter():
+    cmd = SbExporterCommand()
+    retval = cmd.main(sys.argv[1:])
+    sys.exit(retval)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import codecs
+import json
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+
+try:
+    import simdjson
+    _SIMDJSON_AVAILABLE = True
+except ImportError:
+    _SIMDJSON_AVAILABLE = False
+
+try:
+    import ujson
+    _UJSON_AVAILABLE = True
+except ImportError:
+    _UJSON_AVAILABLE = False
+
+
+# For Python 3 compatibility
+unicode = type('')
+
+def _to_bytes(data):
+    if isinstance(data, (bytes, unicode)):
+        return data
+    return bytes(data)
+
+
+class JSONCodec(object):
+    """
+    JSON codec using the standard ``json`` module.
+
+    ``loads`` accepts ``str``, ``bytes``, ``bytearray`` and ``memoryview``
+    (bytes must be encoded in UTF-8) and raises ``ValueError`` on invalid
+    input.  ``dumps`` returns UTF-8 encoded ``bytes``.
+    """
+    name = 'json'
+
+    def loads(self, data):
+        if not isinstance(data, unicode):
+            data = codecs.utf_8_decode(data)[0]
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode('utf-8')
+
+class OrjsonCodec(JSONCodec):
+    """
+    JSON codec using ``orjson``.  Note that integers which do not fit in
+    64 bits cannot be decoded.
+    """
+    name = 'orjson'
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+class SimdjsonCodec(JSONCodec):
+    """
+    JSON codec using ``pysimdjson`` for decoding.
+    """
+    name = 'simdjson'
+
+    def loads(self, data):
+        return simdjson.loads(_to_bytes(data))
+
+class UjsonCodec(JSONCodec):
+    """
+    JSON codec using ``ujson``.
+    """
+    name = 'ujson'
+
+    def loads(self, data):
+        return ujson.loads(_to_bytes(data))
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+# Available codecs, from the fastest to the slowest.
+CODECS = [c for (c, available) in [
+    (OrjsonCodec, _ORJSON_AVAILABLE),
+    (SimdjsonCodec, _SIMDJSON_AVAILABLE),
+    (UjsonCodec, _UJSON_AVAILABLE),
+    (JSONCodec, True),
+] if available]
+
+def get_codec(codec=None):
+    """
+    Returns a JSON codec.  ``codec`` can be a codec instance, a codec name
+    (``orjson``, ``simdjson``, ``ujson`` or ``json``), or None to use the
+    fastest one available.
+    """
+    if codec is None:
+        return CODECS[0]()
+    if isinstance(codec, JSONCodec):
+        return codec
+    for c in CODECS:
+        if c.name == codec:
+            return c()
+    raise ValueError('JSON codec unavailable: {0}'.format(codec))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Backlog(object):
+    def __init__(self):
+        self.items = collections.deque()  # (enqueued time, func, droppable)
+        self.scheduled = False
+        self.failed = False
+        self.max_depth = 0
+        self.processed = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+
+class CallbackDispatcher(object):
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'error')
+
+    def __init__(self, workers=4, max_backlog=1024, overflow='block', batch=64):
+        """
+        Runs WebSocket callbacks on a thread pool so that slow callbacks do
+        not stall the client thread.
+
+        Callbacks for the same key (a pair of the client and the request ID
+        for ``WebSocketClient``) are run one at a time in the order they were
+        dispatched; callbacks for different keys run concurrently on up to
+        ``workers`` threads.  A worker runs up to ``batch`` callbacks for a
+        key before yielding to other keys.
+
+        When the backlog of a key reaches ``max_backlog``, ``overflow``
+        decides what happens: ``block`` makes the dispatching (client) thread
+        wait, ``drop_oldest`` discards the oldest droppable message, and
+        ``error`` discards the backlog and all further messages for the key
+        until its request ends, and reports the overflow instead.
+
+        A dispatcher can be shared among clients.  Call ``shutdown`` when it
+        is no longer needed.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError('unknown overflow policy: {0}'.format(overflow))
+        self.max_backlog = max_backlog
+        self.overflow = overflow
+        self.batch = batch
+        self._executor = ThreadPoolExecutor(workers)
+        self._cond = threading.Condition()
+        self._backlogs = {}
+
+    def dispatch(self, key, func, droppable=True, on_overflow=None):
+        """
+        Schedules ``func`` to be called with no arguments.  ``droppable``
+        tells whether the message may be discarded on overflow; a message
+        which is not droppable ends the request.  ``on_overflow`` is called
+        instead of the discarded messages under the ``error`` policy.
+        """
+        now = time.time()
+        with self._cond:
+            b = self._backlogs.get(key)
+            if b is None:
+                b = self._backlogs[key] = _Backlog()
+            if b.failed:
+                b.dropped += 1
+                if not droppable:
+                    b.failed = False
+                    self._cleanup(key, b)
+                return
+            while self.max_backlog <= len(b.items):
+                if self.overflow == 'block':
+                    self._cond.wait()
+                elif self.overflow == 'drop_oldest':
+                    if not self._drop_oldest(b):
+                        break  # nothing droppable; let the backlog grow
+                else:
+                    b.dropped += len(b.items) + 1
+                    b.items.clear()
+                    b.failed = droppable
+                    if on_overflow is not None:
+                        b.items.append((now, on_overflow, False))
+                        self._schedule(key, b)
+                    self._cond.notify_all()
+                    return
+            b.items.append((now, func, droppable))
+            b.max_depth = max(b.max_depth, len(b.items))
+            self._schedule(key, b)
+
+    def _drop_oldest(self, b):
+        for (i, item) in enumerate(b.items):
+            if item[2]:
+                del b.items[i]
+                b.dropped += 1
+                return True
+        return False
+
+    def _schedule(self, key, b):
+        if not b.scheduled:
+            b.scheduled = True
+            self._executor.submit(self._drain, key, b)
+
+    def _cleanup(self, key, b):
+        # Forget idle keys so that the table does not grow forever.
+        if not b.items and not b.scheduled and not b.failed and self._backlogs.get(key) is b:
+            del self._backlogs[key]
+
+    def _drain(self, key, b):
+        for _ in range(self.batch):
+            with self._cond:
+                if not b.items:
+                    break
+                (enqueued, func, _) = b.items.popleft()
+                b.last_lag = time.time() - enqueued
+                self._cond.notify_all()
+            try:
+                func()
+            except Exception:
+                traceback.print_exc()
+            with self._cond:
+                b.processed += 1
+        with self._cond:
+            if b.items:
+                self._executor.submit(self._drain, key, b)
+            else:
+                b.scheduled = False
+                self._cleanup(key, b)
+
+    def stats(self):
+        """
+        Returns a dict that maps keys with pending or running callbacks to
+        their metrics: ``depth`` (number of pending callbacks), ``max_depth``,
+        ``lag`` (seconds the oldest pending callback has been waiting),
+        ``last_lag`` (seconds the last started callback had waited),
+        ``processed`` and ``dropped``.
+        """
+        now = time.time()
+        with self._cond:
+            return dict((key, {
+                'depth': len(b.items),
+                'max_depth': b.max_depth,
+                'lag': now - b.items[0][0] if b.items else 0.0,
+                'last_lag': b.last_lag,
+                'processed': b.processed,
+                'dropped': b.dropped,
+            }) for (key, b) in self._backlogs.items())
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads after running pending callbacks.
+        """
+        self._executor.shutdown(wait)
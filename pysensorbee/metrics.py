@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import bisect
+import threading
+import traceback
+
+
+class Histogram(object):
+    # Upper bounds of buckets in seconds: 10us to ~168s, doubling.
+    BOUNDS = tuple(1e-5 * 2 ** i for i in range(25))
+
+    def __init__(self, bounds=BOUNDS):
+        """
+        Histogram of values in fixed buckets.  Percentiles are estimated as
+        the upper bound of the bucket containing them.  Not thread-safe.
+        """
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # the last one is for overflow
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, v):
+        self.buckets[bisect.bisect_left(self.bounds, v)] += 1
+        self.count += 1
+        self.sum += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or self.max < v:
+            self.max = v
+
+    def percentile(self, p):
+        """
+        Returns the estimated ``p``-th percentile (0 to 100), or None if empty.
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * p / 100
+        n = 0
+        for (i, c) in enumerate(self.buckets):
+            n += c
+            if rank <= n and c:
+                bound = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': [[self.bounds[i] if i < len(self.bounds) else None, c]
+                        for (i, c) in enumerate(self.buckets) if c],
+        }
+
+
+class _RequestStats(object):
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status = {}
+        self.error_kinds = {}
+        self.latency = Histogram()
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'status': dict(self.status),
+            'error_kinds': dict(self.error_kinds),
+            'latency': self.latency.snapshot(),
+        }
+
+class _StreamStats(object):
+    def __init__(self):
+        self.tuples = 0
+        self.bytes = 0
+        self.decode_time = Histogram()
+        self.gap = Histogram()
+
+    def snapshot(self):
+        return {
+            'tuples': self.tuples,
+            'bytes': self.bytes,
+            'decode_time': self.decode_time.snapshot(),
+            'gap': self.gap.snapshot(),
+        }
+
+
+def endpoint(method, path):
+    """
+    Returns the name of the endpoint of a request, with topology and node
+    names replaced by placeholders (e.g., ``GET topologies/{topology}``).
+    """
+    parts = path.split('?')[0].strip('/').split('/')
+    if parts[0] == 'topologies':
+        if 2 <= len(parts):
+            parts[1] = '{topology}'
+        if 4 <= len(parts):
+            parts[3] = '{name}'
+    return '{0} {1}'.format(method, '/'.join(parts))
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        """
+        Collects metrics of API clients.  Pass it as ``metrics`` to
+        ``SensorBeeAPI`` (and ``WebSocketClient``) to record:
+
+        * requests: count, errors, bytes sent and received, HTTP status,
+          error kinds and latency per endpoint (see ``endpoint``); for
+          ``SELECT`` queries the latency is the time until the response
+          header is received.
+        * streams: tuples and bytes received, time to decode each tuple and
+          gaps between arrivals, of ``ResultSet`` (``resultset``) and
+          ``WebSocketClient`` (``websocket``).
+        * backlog: number of tuples buffered and not consumed yet per request
+          ID of ``WebSocketClient.submit`` streams.
+
+        Functions added by ``add_hook`` are called with an event name
+        (``request`` or ``tuple``) and a dict of its fields on every event;
+        they are called on the thread recording the event and must be fast.
+        ``snapshot`` returns the metrics as a dict.  Thread-safe.
+        """
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._gauges = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Clears recorded metrics.  Hooks and gauges are kept.
+        """
+        with self._lock:
+            self._requests = {}
+            self._streams = {}
+            self._backlog = {}
+
+    def add_hook(self, hook):
+        """
+        Adds a function called on every event.
+        """
+        self._hooks = self._hooks + [hook]
+
+    def add_gauge(self, name, func):
+        """
+        Adds a function whose return value is included in snapshots as
+        ``gauges[name]``.
+        """
+        with self._lock:
+            self._gauges[name] = func
+
+    def _notify(self, event, fields):
+        for hook in self._hooks:
+            try:
+                hook(event, fields)
+            except Exception:
+                traceback.print_exc()
+
+    def record_request(self, method, path, status, latency, bytes_sent, bytes_received, error=None):
+        """
+        Records a request.  ``status`` is None if no response was received;
+        ``error`` is the kind of the error (e.g., an exception class name),
+        or None on success.
+        """
+        name = endpoint(method, path)
+        with self._lock:
+            s = self._requests.get(name)
+            if s is None:
+                s = self._requests[name] = _RequestStats()
+            s.count += 1
+            s.bytes_sent += bytes_sent
+            s.bytes_received += bytes_received
+            s.latency.observe(latency)
+            if status is not None:
+                s.status[status] = s.status.get(status, 0) + 1
+            if error is not None:
+                s.errors += 1
+                s.error_kinds[error] = s.error_kinds.get(error, 0) + 1
+        if self._hooks:
+            self._notify('request', {
+                'endpoint': name, 'status': status, 'latency': latency,
+                'bytes_sent': bytes_sent, 'bytes_received': bytes_received, 'error': error,
+            })
+
+    def record_tuple(self, stream, size, decode_time, gap):
+        """
+        Records a tuple of ``size`` bytes received by ``stream``, decoded in
+        ``decode_time`` seconds ``gap`` seconds after the previous one.
+        """
+        with self._lock:
+            s = self._streams.get(stream)
+            if s is None:
+                s = self._streams[stream] = _StreamStats()
+            s.tuples += 1
+            s.bytes += size
+            s.decode_time.observe(decode_time)
+            if gap is not None:
+                s.gap.observe(gap)
+        if self._hooks:
+            self._notify('tuple', {'stream': stream, 'size': size, 'decode_time': decode_time, 'gap': gap})
+
+    def record_backlog(self, key, depth):
+        """
+        Records the backlog of ``key`` (e.g., a request ID); ``depth`` of
+        None removes it.
+        """
+        with self._lock:
+            if depth is None:
+                self._backlog.pop(key, None)
+                return
+            b = self._backlog.get(key)
+            if b is None:
+                b = self._backlog[key] = {'depth': 0, 'max_depth': 0}
+            b['depth'] = depth
+            b['max_depth'] = max(b['max_depth'], depth)
+
+    def snapshot(self):
+        """
+        Returns the metrics as a dict of ``requests`` (by endpoint),
+        ``streams``, ``backlog`` (by key) and ``gauges``.  Latencies and
+        times are in seconds.
+        """
+        with self._lock:
+            snapshot = {
+                'requests': dict((k, v.snapshot()) for (k, v) in self._requests.items()),
+                'streams': dict((k, v.snapshot()) for (k, v) in self._streams.items()),
+                'backlog': dict((k, dict(v)) for (k, v) in self._backlog.items()),
+            }
+            gauges = list(self._gauges.items())
+        snapshot['gauges'] = dict((name, func()) for (name, func) in gauges)
+        return snapshot
+
+
+def format_summary(snapshot):
+    """
+    Renders a snapshot as a human-readable summary.
+    """
+    def ms(v):
+        return '-' if v is None else '{0:.1f}'.format(v * 1000)
+
+    def us(v):
+        return '-' if v is None else '{0:.1f}'.format(v * 1000000)
+
+    lines = []
+    rows = [['Endpoint', 'Count', 'Errors', 'Sent', 'Received', 'p50 ms', 'p90 ms', 'p99 ms', 'Max ms']]
+    for (name, s) in sorted(snapshot['requests'].items()):
+        l = s['latency']
+        rows.append([name, s['count'], s['errors'], s['bytes_sent'], s['bytes_received'],
+                     ms(l['p50']), ms(l['p90']), ms(l['p99']), ms(l['max'])])
+    lines += _table(rows)
+    if snapshot['streams']:
+        rows = [['Stream', 'Tuples', 'Bytes', 'Decode us', 'Gap p50 ms', 'Gap p99 ms', 'Gap max ms']]
+        for (name, s) in sorted(snapshot['streams'].items()):
+            g = s['gap']
+            rows.append([name, s['tuples'], s['bytes'], us(s['decode_time']['mean']),
+                         ms(g['p50']), ms(g['p99']), ms(g['max'])])
+        lines += [''] + _table(rows)
+    if snapshot['backlog']:
+        rows = [['Request ID', 'Backlog', 'Max Backlog']]
+        for (key, b) in sorted(snapshot['backlog'].items()):
+            rows.append([key, b['depth'], b['max_depth']])
+        lines += [''] + _table(rows)
+    return '\n'.join(lines)
+
+def _table(rows):
+    rows = [[str(v) for v in row] for row in rows]
+    colsize = [max([len(row[i]) for row in rows]) for i in range(len(rows[0]))]
+    return ['   '.join([v.ljust(colsize[0]) if i == 0 else v.rjust(colsize[i]) for (i, v) in enumerate(row)])
+            for row in rows]
@@ -2,11 +2,20 @@
 
 import os
 
+from pysensorbee.testing import StandInServer
+
 def _getenv(key):
     v = os.environ.get(key, None)
     if v is None:
         raise RuntimeError('environment variable {0} must be defined'.format(key))
     return v
 
-SB_TEST_HOST = _getenv('SB_TEST_HOST')
-SB_TEST_PORT = _getenv('SB_TEST_PORT')
+# Tests run against the SensorBee server specified by SB_TEST_HOST and
+# SB_TEST_PORT, or a stand-in server if SB_TEST_HOST is not defined.
+if 'SB_TEST_HOST' in os.environ:
+    SB_TEST_HOST = _getenv('SB_TEST_HOST')
+    SB_TEST_PORT = _getenv('SB_TEST_PORT')
+else:
+    _server = StandInServer().start()
+    SB_TEST_HOST = _server.host
+    SB_TEST_PORT = str(_server.port)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import random
+from unittest import TestCase
+
+from pysensorbee.tools import aggregate
+from pysensorbee.tools.aggregate import QuantileSketch, WindowAggregator, parse_window
+
+
+class ParseWindowTest(TestCase):
+    def test_parse_window(self):
+        self.assertEqual((10.0, False), parse_window('10s'))
+        self.assertEqual((0.5, False), parse_window('500ms'))
+        self.assertEqual((120.0, False), parse_window('2m'))
+        self.assertEqual((1000, True), parse_window('1000'))
+        for s in ('', '0', '1.5', '0s', '10x', '-1s'):
+            self.assertRaises(ValueError, parse_window, s)
+
+
+class QuantileSketchTest(TestCase):
+    def test_quantile(self):
+        rng = random.Random(0)
+        values = [rng.lognormvariate(0, 2) * rng.choice([-1, 1]) for _ in range(10000)] + [0.0] * 100
+        (a, b) = (QuantileSketch(0.01), QuantileSketch(0.01))
+        a.add(values[:5000])
+        b.add(values[5000:])
+        a.merge(b)
+        self.assertEqual(len(values), a.count)
+        values.sort()
+        for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+            expected = values[int(len(values) * q) - 1]
+            self.assertTrue(abs(a.quantile(q) - expected) <= 0.01 * abs(expected) + 1e-9)
+        self.assertEqual(None, QuantileSketch().quantile(0.5))
+        self.assertRaises(ValueError, QuantileSketch, 0)
+
+
+class WindowAggregatorTest(TestCase):
+    def _run(self, aggregator, tuples, step=None):
+        windows = []
+        for (i, d) in enumerate(tuples):
+            windows += aggregator.add(d, None if step is None else 1000.0 + i * step)
+        return windows + aggregator.flush()
+
+    def test_count_windows(self):
+        tuples = [{'v': i, 'g': i % 2, 'n': {'x': 'str' if i == 3 else i}} for i in range(10)]
+        windows = self._run(WindowAggregator(['v', 'n.x'], 4, 2, count_based=True, group_by='g', batch_size=3),
+                            tuples)
+        self.assertEqual([(0, 4), (2, 6), (4, 8), (6, 10)], [(w[0]['start'], w[0]['end']) for w in windows])
+        self.assertEqual([(0, 'v'), (0, 'n.x'), (1, 'v'), (1, 'n.x')], [(r['group'], r['field']) for r in windows[0]])
+        row = windows[0][3]  # group 1, n.x: 1 and 'str'
+        self.assertEqual((2, 1, 1.0, 1.0, 1.0, 1.0), (row['tuples'], row['count'], row['sum'], row['mean'], row['min'], row['max']))
+        row = windows[1][0]  # group 0, v: 2 and 4
+        self.assertEqual((2, 6.0, 3.0, 2.0, 4.0), (row['count'], row['sum'], row['mean'], row['min'], row['max']))
+
+        # Tumbling windows; the last one is flushed as is.
+        windows = self._run(WindowAggregator(['v'], 4, count_based=True), tuples)
+        self.assertEqual([4, 4, 2], [w[0]['tuples'] for w in windows])
+        self.assertRaises(ValueError, WindowAggregator, ['v'], 4, 3, count_based=True)
+
+    def test_time_windows(self):
+        tuples = [{'v': float(i), 's': 'x'} for i in range(100)]
+        windows = self._run(WindowAggregator(['v', 's'], 10.0), tuples, 0.25)
+        self.assertEqual([(1000.0, 1010.0), (1010.0, 1020.0), (1020.0, 1030.0)],
+                         [(w[0]['start'], w[0]['end']) for w in windows])
+        self.assertEqual([40, 40, 20], [w[0]['count'] for w in windows])
+        self.assertEqual([0, 0, 0], [w[1]['count'] for w in windows])
+        self.assertEqual(None, windows[0][1]['mean'])
+        self.assertTrue(abs(windows[0][0]['p50'] - 19) <= 0.2)
+
+        # Sliding windows start after the first window is covered.
+        windows = self._run(WindowAggregator(['v'], 10.0, 5.0), tuples, 0.25)
+        self.assertEqual([(1000.0, 1010.0), (1005.0, 1015.0), (1010.0, 1020.0), (1015.0, 1025.0)],
+                         [(w[0]['start'], w[0]['end']) for w in windows])
+
+    def test_without_numpy(self):
+        rng = random.Random(0)
+        tuples = [{'v': rng.gauss(0, 10) if i % 7 else None} for i in range(1000)]
+        expected = self._run(WindowAggregator(['v'], 300, count_based=True), tuples)
+        numpy_available = aggregate._NUMPY_AVAILABLE
+        aggregate._NUMPY_AVAILABLE = False
+        try:
+            actual = self._run(WindowAggregator(['v'], 300, count_based=True), tuples)
+        finally:
+            aggregate._NUMPY_AVAILABLE = numpy_available
+        self.assertEqual(len(expected), len(actual))
+        for (e, a) in zip(expected, actual):
+            for k in ('tuples', 'count', 'min', 'max', 'p50', 'p90', 'p99'):
+                self.assertEqual(e[0][k], a[0][k])
+            self.assertAlmostEqual(e[0]['sum'], a[0]['sum'])
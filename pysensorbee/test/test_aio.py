@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+from unittest import TestCase, skipUnless
+from . import SB_TEST_HOST, SB_TEST_PORT
+
+_AIOHTTP_AVAILABLE = False
+if (3, 5) <= sys.version_info:
+    import asyncio
+    from pysensorbee.aio import AsyncSensorBeeAPI, AsyncResultSet, _AIOHTTP_AVAILABLE
+from pysensorbee.api import SensorBeeAPIError
+from pysensorbee.testing import StandInServer
+
+
+@skipUnless(_AIOHTTP_AVAILABLE, 'aiohttp is not available')
+class AsyncSensorBeeAPITest(TestCase):
+    TOPOLOGY = 'aio_test'
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.api = AsyncSensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT)
+        self._run(self.api.delete_topology(self.TOPOLOGY))
+        self._run(self.api.create_topology(self.TOPOLOGY))
+
+    def tearDown(self):
+        self._run(self.api.delete_topology(self.TOPOLOGY))
+        self._run(self.api.close())
+        self.loop.close()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_error(self):
+        self.assertRaises(SensorBeeAPIError, self._run, self.api.sources('no_such_topology'))
+
+    def test_runtime_status(self):
+        status = self._run(self.api.runtime_status())
+        self.assertTrue('pid' in status)
+
+    def test_query(self):
+        api = self.api
+        self.assertEqual(42, self._run(api.query(self.TOPOLOGY, 'EVAL 7 * 6;'))['result'])
+        self._run(api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;'))
+        rs = self._run(api.query(self.TOPOLOGY, 'SELECT RSTREAM [LIMIT 2] * FROM ns [RANGE 1 TUPLES];'))
+        self.assertTrue(isinstance(rs, AsyncResultSet))
+        self.assertTrue(isinstance(self._run(rs.__anext__()), dict))
+        self.assertTrue(isinstance(self._run(rs.__anext__()), dict))
+        self.assertRaises(StopAsyncIteration, self._run, rs.__anext__())
+
+    def test_wsquery(self):
+        api = self.api
+        wsc = self._run(api.wsquery(self.TOPOLOGY))
+        try:
+            stream = self._run(wsc.send('EVAL 7 * 6;'))
+            self.assertEqual(('result', {'result': 42}), self._run(stream.__anext__()))
+            self.assertRaises(StopAsyncIteration, self._run, stream.__anext__())
+        finally:
+            self._run(wsc.close())
+
+    def test_wsquery_overflow(self):
+        server = StandInServer().start()
+        api = AsyncSensorBeeAPI(server.host, server.port)
+        try:
+            self._run(api.create_topology(self.TOPOLOGY))
+            self._run(api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 0;'))
+            query = 'SELECT RSTREAM [LIMIT 100] * FROM syn [RANGE 1 TUPLES];'
+            wsc = self._run(api.wsquery(self.TOPOLOGY, maxsize=4))
+            try:
+                # Streams not consumed do not stall the other requests.
+                dropping = self._run(wsc.send(query, overflow='drop_oldest'))
+                failing = self._run(wsc.send(query, overflow='error'))
+                stream = self._run(wsc.send('EVAL 7 * 6;'))
+                self.assertEqual(('result', {'result': 42}), self._run(stream.__anext__()))
+                self._run(asyncio.sleep(0.5))
+                self.assertTrue(0 < dropping.dropped)
+                self.assertRaises(RuntimeError, self._run, failing.__anext__())
+
+                # Cancelling a blocking stream resumes the session.
+                blocking = self._run(wsc.send(query))
+                self._run(asyncio.sleep(0.1))
+                blocking.cancel()
+                self.assertRaises(StopAsyncIteration, self._run, blocking.__anext__())
+                stream = self._run(wsc.send('EVAL 7 * 6;'))
+                self.assertEqual(('result', {'result': 42}), self._run(stream.__anext__()))
+            finally:
+                self._run(wsc.close())
+        finally:
+            self._run(api.close())
+            server.shutdown()
@@ -2,11 +2,26 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import json
+import socket
+import threading
 import time
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 from . import SB_TEST_HOST, SB_TEST_PORT
 
-from pysensorbee.api import SensorBeeAPI, ResultSet, SensorBeeAPIError, WebSocketClient
+from pysensorbee.api import SensorBeeAPI, ResultSet, SensorBeeAPIError, WebSocketClient, WebSocketStream
+from pysensorbee._columnar import _NUMPY_AVAILABLE
+from pysensorbee._multipart import _MultipartReader
+from pysensorbee.dispatcher import CallbackDispatcher
+from pysensorbee.codec import CODECS
+from pysensorbee.metrics import MetricsRegistry
+from pysensorbee.testing import StandInServer
+
+
+def _seq(d):
+    if d['seq'] == 42:
+        raise KeyError(d['seq'])
+    return d['seq']
 
 
 class SensorBeeAPITest(TestCase):
@@ -30,6 +45,21 @@ class SensorBeeAPITest(TestCase):
         self.assertEqual(SB_TEST_HOST, self.api.host)
         self.assertEqual(SB_TEST_PORT, self.api.port)
 
+    def test_concurrent_requests(self):
+        for per_thread in (False, True):
+            api = SensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT, pool_size=2, pool_per_thread=per_thread)
+            results = []
+            def run():
+                for i in range(10):
+                    results.append(api.topology(self.TOPOLOGY)['topology']['name'])
+            threads = [threading.Thread(target=run) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            api.close()
+            self.assertEqual([self.TOPOLOGY] * 40, results)
+
     def test_runtime_status(self):
         status = self.api.runtime_status()
         self.assertTrue(isinstance(status, dict))
@@ -105,10 +135,218 @@ class SensorBeeAPITest(TestCase):
                 FROM ns [RANGE 1 TUPLES];''')
             self.assertTrue(isinstance(result, ResultSet))
             self.assertEqual(2, len(list(result)))
+
+            # Tuples larger than the limit are rejected.
+            result = api.query(self.TOPOLOGY,
+                'SELECT RSTREAM [LIMIT 1] * FROM ns [RANGE 1 TUPLES];',
+                max_part_size=10)
+            self.assertRaises(RuntimeError, list, result)
         finally:
             api.query(self.TOPOLOGY,
                 'DROP SOURCE ns;')
 
+    def test_codec(self):
+        for codec in CODECS:
+            api = SensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT, codec=codec.name)
+            self.assertEqual(codec.name, api.codec.name)
+            self.assertEqual(42, api.query(self.TOPOLOGY, 'EVAL 7 * 6;')['result'])
+            self.assertRaises(SensorBeeAPIError, api.sources, 'no_such_topology')
+            api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses;')
+            try:
+                result = api.query(self.TOPOLOGY,
+                    'SELECT RSTREAM [LIMIT 1] "✓" AS test_unicode FROM ns [RANGE 1 TUPLES];')
+                self.assertEqual([{'test_unicode': '✓'}], list(result))
+            finally:
+                api.query(self.TOPOLOGY, 'DROP SOURCE ns;')
+        self.assertRaises(ValueError, SensorBeeAPI, codec='no_such_codec')
+
+    def test_metrics(self):
+        metrics = MetricsRegistry()
+        events = []
+        metrics.add_hook(lambda event, fields: events.append(event))
+        api = SensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT, metrics=metrics)
+        self.assertRaises(SensorBeeAPIError, api.sources, 'no_such_topology')
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        try:
+            self.assertEqual(2, len(list(api.query(self.TOPOLOGY,
+                'SELECT RSTREAM [LIMIT 2] * FROM ns [RANGE 1 TUPLES];'))))
+        finally:
+            api.query(self.TOPOLOGY, 'DROP SOURCE ns;')
+
+        snapshot = metrics.snapshot()
+        sources = snapshot['requests']['GET topologies/{topology}/sources']
+        self.assertEqual(1, sources['errors'])
+        self.assertEqual({404: 1}, sources['status'])
+        self.assertEqual({'SensorBeeAPIError': 1}, sources['error_kinds'])
+        queries = snapshot['requests']['POST topologies/{topology}/queries']
+        self.assertEqual(3, queries['count'])
+        self.assertEqual(3, queries['latency']['count'])
+        self.assertEqual(2, snapshot['streams']['resultset']['tuples'])
+        self.assertEqual(['request'] * 3 + ['tuple'] * 2 + ['request'], events)
+
+    def test_iter_batches(self):
+        api = self.api
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        try:
+            query = 'SELECT RSTREAM [LIMIT 5] * FROM ns [RANGE 1 TUPLES];'
+            result = api.query(self.TOPOLOGY, query)
+            self.assertEqual([2, 2, 1], [len(b) for b in result.iter_batches(2)])
+            result = api.query(self.TOPOLOGY, query)
+            self.assertEqual(5, sum([len(b) for b in result.iter_batches(100, timeout=0.05)]))
+        finally:
+            api.query(self.TOPOLOGY, 'DROP SOURCE ns;')
+
+    def test_raw_and_project(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE blobs TYPE synthetic WITH tuple_size = 1000;')
+            query = 'SELECT RSTREAM [LIMIT 2] * FROM blobs [RANGE 1 TUPLES];'
+            raw = list(api.query(self.TOPOLOGY, query).raw())
+            self.assertEqual(2, len(raw))
+            self.assertTrue(isinstance(raw[0], bytes))
+            self.assertEqual(960, len(json.loads(raw[0].decode('utf-8'))['payload']))
+            projected = list(api.query(self.TOPOLOGY, query).project(['seq', 'payload'], max_string_length=10))
+            self.assertEqual([['payload', 'seq']] * 2, [sorted(d.keys()) for d in projected])
+            self.assertEqual('xxxxxxxxxx... (omit)', projected[0]['payload'])
+        finally:
+            api.close()
+            server.shutdown()
+
+    def test_prefetch(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 1000;')
+            query = 'SELECT RSTREAM [LIMIT 50] * FROM syn [RANGE 1 TUPLES];'
+            with api.query(self.TOPOLOGY, query).prefetch(maxsize=10) as reader:
+                time.sleep(0.1)
+                self.assertEqual(list(range(50)), [d['seq'] for d in reader])
+                stats = reader.stats()
+                self.assertEqual(10, stats['max_depth'])
+                self.assertTrue(1 <= stats['stalls'] and 0 < stats['stall_time'])
+
+            reader = api.query(self.TOPOLOGY, query).prefetch(maxsize=10, overflow='drop_oldest')
+            time.sleep(0.1)
+            self.assertEqual(50, len(list(reader)) + reader.dropped)
+
+            reader = api.query(self.TOPOLOGY, query).prefetch(maxsize=10, overflow='error')
+            time.sleep(0.1)
+            self.assertRaises(RuntimeError, list, reader)
+
+            rs = api.query(self.TOPOLOGY, 'SELECT RSTREAM * FROM syn [RANGE 1 TUPLES];')
+            reader = rs.prefetch(tuples=rs.project(['seq']))
+            self.assertEqual({'seq': 0}, next(reader))
+            reader.close()
+            self.assertRaises(StopIteration, next, reader)
+            self.assertRaises(ValueError, rs.prefetch, overflow='no_such_policy')
+        finally:
+            api.close()
+            server.shutdown()
+
+    def test_close(self):
+        server = StandInServer(rate=0).start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 100;')
+            query = 'SELECT RSTREAM * FROM syn [RANGE 1 TUPLES];'
+
+            def wait_for_queries(n):
+                deadline = time.time() + 5
+                while server.active_queries != n and time.time() < deadline:
+                    time.sleep(0.01)
+                return server.active_queries
+
+            # Leaving the loop early.
+            for d in api.query(self.TOPOLOGY, query):
+                break
+            self.assertEqual(0, wait_for_queries(0))
+
+            # Context manager; the result set is closed before the end.
+            with api.query(self.TOPOLOGY, query) as rs:
+                it = iter(rs)
+                self.assertEqual(0, next(it)['seq'])
+                self.assertEqual(1, wait_for_queries(1))
+            self.assertEqual(0, wait_for_queries(0))
+            self.assertEqual([], list(it))
+            rs.close()
+
+            # Closed by another thread while reading.
+            rs = api.query(self.TOPOLOGY, query)
+            threading.Timer(0.1, rs.close).start()
+            self.assertTrue(0 < len(list(rs)))
+            self.assertEqual(0, wait_for_queries(0))
+
+            # Leaving a loop over batches read by a background thread, which
+            # is waiting for the next tuple.
+            api.query(self.TOPOLOGY, 'CREATE SOURCE slow TYPE synthetic WITH rate = 0.1;')
+            rs = api.query(self.TOPOLOGY, 'SELECT RSTREAM * FROM slow [RANGE 1 TUPLES];')
+            for b in rs.iter_batches(2, timeout=0.05):
+                break
+            self.assertTrue(rs._closed)
+        finally:
+            api.close()
+            server.shutdown()
+
+    def test_timeouts(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE slow TYPE synthetic WITH rate = 2;')
+            query = 'SELECT RSTREAM * FROM slow [RANGE 1 TUPLES];'
+            self.assertRaises(socket.timeout, list, api.query(self.TOPOLOGY, query, idle_timeout=0.1))
+            self.assertRaises(socket.timeout, list, api.query(self.TOPOLOGY, query, read_timeout=0.1))
+            rs = api.query(self.TOPOLOGY, 'SELECT RSTREAM [LIMIT 1] * FROM slow [RANGE 1 TUPLES];',
+                           connect_timeout=5, read_timeout=5, idle_timeout=5)
+            self.assertEqual(1, len(list(rs)))
+            # Timeouts do not stick to connections reused afterwards.
+            self.assertEqual(2, api.query(self.TOPOLOGY, 'EVAL 1 + 1;', read_timeout=5)['result'])
+            self.assertTrue(all([c.sock.gettimeout() == api.timeout for (c, _) in api._pool._shared]))
+            api2 = SensorBeeAPI(server.host, server.port)
+            self.assertEqual(2, api2.query(self.TOPOLOGY, 'EVAL 1 + 1;', connect_timeout=5)['result'])
+            self.assertEqual([api2._pool._new_conn().timeout], [c.timeout for (c, _) in api2._pool._shared])
+            api2.close()
+        finally:
+            api.close()
+            server.shutdown()
+
+    def test_parallel_map(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 10000;')
+            query = 'SELECT RSTREAM [LIMIT 40] * FROM syn [RANGE 1 TUPLES];'
+            self.assertEqual(list(range(40)), list(api.query(self.TOPOLOGY, query).parallel_map(
+                _seq, workers=2, chunksize=3, max_pending=2)))
+            self.assertEqual(list(range(40)), sorted(api.query(self.TOPOLOGY, query).parallel_map(
+                _seq, workers=2, ordered=False, chunksize=7, timeout=0.01)))
+            query = 'SELECT RSTREAM [LIMIT 50] * FROM syn [RANGE 1 TUPLES];'
+            self.assertRaises(KeyError, list, api.query(self.TOPOLOGY, query).parallel_map(_seq, workers=2))
+        finally:
+            api.close()
+            server.shutdown()
+
+    @skipUnless(_NUMPY_AVAILABLE, 'numpy is not available')
+    def test_iter_batches_columnar(self):
+        api = self.api
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        try:
+            result = api.query(self.TOPOLOGY,
+                'SELECT RSTREAM [LIMIT 3] 1 AS i, 1.5 AS f, "s" AS s FROM ns [RANGE 1 TUPLES];')
+            batches = list(result.iter_batches(3, columnar=True))
+            self.assertEqual(1, len(batches))
+            self.assertEqual('int64', batches[0]['i'].dtype.name)
+            self.assertEqual('float64', batches[0]['f'].dtype.name)
+            self.assertEqual('object', batches[0]['s'].dtype.name)
+            self.assertEqual(['s'] * 3, list(batches[0]['s']))
+        finally:
+            api.query(self.TOPOLOGY, 'DROP SOURCE ns;')
+
     def test_wsquery(self):
         api = self.api
         api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
@@ -179,3 +417,163 @@ class SensorBeeAPITest(TestCase):
             self.assertEqual('expected exception', wsc.get_error().args[0])
         finally:
             wsc.close()
+
+    def test_wssubmit(self):
+        api = self.api
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        wsc = api.wsquery(self.TOPOLOGY)
+        wsc.start()
+        try:
+            # One-shot
+            self.assertEqual({'result': 42}, wsc.submit('EVAL 7 * 6;').result(10))
+
+            # Stream
+            stream = wsc.submit('SELECT RSTREAM [LIMIT 2] * FROM ns [RANGE 1 TUPLES];').result(10)
+            self.assertTrue(isinstance(stream, WebSocketStream))
+            self.assertEqual(2, len(list(stream)))
+
+            # Error
+            self.assertRaises(SensorBeeAPIError, wsc.submit('INVALID BQL').result, 10)
+
+            # Request IDs are unique among threads.
+            futures = []
+            def run():
+                for i in range(10):
+                    futures.append(wsc.submit('EVAL 0;'))
+            threads = [threading.Thread(target=run) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(40, len(set([f.rid for f in futures])))
+            for f in futures:
+                self.assertEqual({'result': 0}, f.result(10))
+
+            self.assertRaises(ValueError, wsc.submit, 'EVAL 0;', overflow='unknown')
+
+            # Closed while the buffer is full.
+            stream = wsc.submit('SELECT RSTREAM * FROM ns [RANGE 1 TUPLES];', maxsize=1,
+                                overflow='drop_oldest').result(10)
+            deadline = time.time() + 10
+            while not stream._queue.full() and time.time() < deadline:
+                time.sleep(0.01)
+            wsc.close()
+            self.assertRaises(RuntimeError, list, stream)
+            self.assertRaises(RuntimeError, wsc.submit, 'EVAL 0;')
+        finally:
+            wsc.close()
+
+    def test_wsquery_dispatcher(self):
+        api = self.api
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        dispatcher = CallbackDispatcher(workers=2)
+        wsc = api.wsquery(self.TOPOLOGY, dispatcher)
+        wsc.start()
+        try:
+            done = threading.Event()
+            types = []
+            def callback(wsc2, rid, type, payload):
+                self.assertNotEqual(threading.current_thread().name, 'MainThread')
+                types.append(type)
+                if type == 'eos':
+                    done.set()
+            wsc.send('SELECT RSTREAM [LIMIT 3] * FROM ns [RANGE 1 TUPLES];', callback, 1)
+            self.assertTrue(done.wait(10))
+            # Messages are delivered in order.
+            self.assertEqual(['sos', 'result', 'result', 'result', 'eos'], types)
+
+            # Clients sharing the dispatcher may use the same request ID.
+            other = api.wsquery(self.TOPOLOGY, dispatcher)
+            other.start()
+            try:
+                other_done = threading.Event()
+                done.clear()
+                def blocked(wsc2, rid, type, payload):
+                    if type == 'eos' and other_done.wait(10):
+                        done.set()
+                def callback2(wsc2, rid, type, payload):
+                    if type == 'eos':
+                        other_done.set()
+                wsc.send('SELECT RSTREAM [LIMIT 1] * FROM ns [RANGE 1 TUPLES];', blocked, 1)
+                other.send('SELECT RSTREAM [LIMIT 1] * FROM ns [RANGE 1 TUPLES];', callback2, 1)
+                self.assertTrue(other_done.wait(10))
+                self.assertTrue(done.wait(10))
+            finally:
+                other.close()
+        finally:
+            wsc.close()
+            dispatcher.shutdown()
+
+    def test_wsquery_reconnect(self):
+        api = self.api
+        api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        wsc = api.wsquery(self.TOPOLOGY, reconnect=True, reconnect_delay=0.01)
+        wsc.start()
+        try:
+            types = []
+            (received, resumed) = (threading.Event(), threading.Event())
+            def callback(wsc2, rid, type, payload):
+                types.append(type)
+                if type == 'result':
+                    received.set()
+                if types.count('sos') == 2:
+                    resumed.set()
+            wsc.send('SELECT RSTREAM * FROM ns [RANGE 1 TUPLES];', callback, 1)
+            self.assertTrue(received.wait(10))
+
+            # Drop the connection behind the client.
+            wsc._app.sock.sock.shutdown(socket.SHUT_RDWR)
+            self.assertTrue(resumed.wait(10))
+            self.assertTrue(wsc.is_open())
+            self.assertEqual('reconnect', types[types.index('sos', 1) - 1])
+            self.assertEqual(1, wsc.get_reconnect_stats()['reconnects'])
+        finally:
+            wsc.close()
+
+    def test_wsquery_reconnect_give_up(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+            wsc = api.wsquery(self.TOPOLOGY, reconnect=True, reconnect_delay=0.01, reconnect_max_attempts=2)
+            wsc.start()
+            stream = wsc.submit('SELECT RSTREAM * FROM ns [RANGE 1 TUPLES];').result(10)
+            self.assertTrue(isinstance(next(stream), dict))
+        finally:
+            api.close()
+            server.shutdown()
+        wsc._app.sock.sock.shutdown(socket.SHUT_RDWR)
+        failed = threading.Event()
+        def consume():
+            try:
+                list(stream)
+            except RuntimeError:
+                failed.set()
+        threading.Thread(target=consume).start()
+        self.assertTrue(failed.wait(10))
+        self.assertFalse(wsc.is_open())
+
+
+class _Unbuffered(object):
+    # File-like object without ``read1``.
+    def __init__(self, data):
+        self._data = data
+        self.sizes = []
+
+    def read(self, n):
+        self.sizes.append(n)
+        (data, self._data) = (self._data[:n], self._data[n:])
+        return data
+
+
+class MultipartReaderTest(TestCase):
+    def test_read_without_read1(self):
+        parts = [json.dumps({'seq': i, 'payload': 'x' * 1000}).encode() for i in range(3)]
+        stream = b''.join([
+            b'--b\r\nContent-Type: application/json\r\nContent-Length: ' +
+            '{0}'.format(len(p)).encode() + b'\r\n\r\n' + p + b'\r\n' for p in parts]) + b'--b--\r\n'
+        f = _Unbuffered(stream)
+        self.assertEqual(parts, [bytes(p) for p in _MultipartReader(f, 'b')])
+        # Bodies are read at once.
+        self.assertTrue(len(f.sizes) < len(stream) // 10)
@@ -2,12 +2,25 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
 import time
 from unittest import TestCase
 from . import SB_TEST_HOST, SB_TEST_PORT
 
+try:
+    # Python 2; the json module writes both str and unicode.
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 from pysensorbee.api import SensorBeeAPI
-from pysensorbee.cli import SbStatCommand, SbPeekCommand
+from pysensorbee.cli import SbStatCommand, SbPeekCommand, SbBenchCommand
+from pysensorbee.testing import StandInServer
 
 
 class SbStatCommandTest(TestCase):
@@ -33,6 +46,42 @@ class SbStatCommandTest(TestCase):
         self.assertEqual(0, self.cmd.main(self.args))
         self.assertEqual(0, self.cmd.main(self.args + ['--json']))
         self.assertEqual(0, self.cmd.main(self.args + ['--dot']))
+        self.assertEqual(0, self.cmd.main(self.args + ['--workers', '1', '--timeout', '10']))
+        self.assertEqual(0, self.cmd.main(self.args + ['--stats']))
+        self.assertEqual(0, self.cmd.main(self.args + ['--watch', '0.1', '--count', '2']))
+        self.assertEqual(1, self.cmd.main(self.args + ['--watch', '0.1', '--json']))
+
+        # Sparklines fall back to ASCII; trends need samples of two seconds.
+        out = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+        self.assertEqual(0, SbStatCommand(out=out).main(self.args + ['--watch', '1', '--count', '2']))
+        out.flush()
+        self.assertTrue(b'Trend' in out.buffer.getvalue())
+        path = tempfile.mkdtemp()
+        try:
+            self.assertEqual(0, self.cmd.main(self.args + ['--watch', '0.1', '--count', '2', '--history', path]))
+            self.assertTrue(os.listdir(path))
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(1, self.cmd.main(self.args + ['--history', path]))
+
+    def test_fleet(self):
+        server = '{0}:{1}'.format(SB_TEST_HOST, SB_TEST_PORT)
+        path = tempfile.mkdtemp()
+        try:
+            endpoints = os.path.join(path, 'endpoints')
+            with open(endpoints, 'w') as f:
+                f.write('# fleet\n{0}\n\n127.0.0.1:1\n'.format(server))
+            out = StringIO()
+            self.assertEqual(0, SbStatCommand(out=out).main(['--endpoints-file', endpoints, '--json']))
+            result = json.loads(out.getvalue())
+            self.assertEqual(sorted([server, '127.0.0.1:1']), sorted(result.keys()))
+            self.assertIn(self.TOPOLOGY, result[server]['topologies'])
+            self.assertIn('error', result['127.0.0.1:1'])
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(0, self.cmd.main(['-e', server, '-e', server, '--host-timeout', '10']))
+        self.assertEqual(1, self.cmd.main(['-e', '127.0.0.1:1']))
+        self.assertEqual(1, self.cmd.main(['-e', server, '--topology', self.TOPOLOGY]))
 
 class SbPeekCommandTest(TestCase):
     TOPOLOGY = 'cli_test'
@@ -63,3 +112,62 @@ class SbPeekCommandTest(TestCase):
             '--oneline',
             '--omit-long-strings',
         ]))
+        self.assertEqual(0, self.cmd.main(self.args + ['--stats']))
+
+    def test_output(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'out.csv.gz')
+            self.assertEqual(0, self.cmd.main(self.args + [
+                '--count', '3',
+                '--output', path,
+                '--format', 'csv',
+                '--compress', 'gzip',
+            ]))
+            with gzip.open(path) as f:
+                self.assertEqual(4, len(f.read().splitlines()))
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(1, self.cmd.main(self.args + ['--format', 'csv']))
+
+    def test_multiple_streams(self):
+        self.api.query(self.TOPOLOGY,
+            'CREATE STREAM ns_copy AS SELECT RSTREAM * FROM ns [RANGE 1 TUPLES];')
+        self.assertEqual(0, self.cmd.main(self.args + ['ns_*', '--count', '3', '--duration', '10']))
+        self.assertEqual(1, self.cmd.main(self.args + ['no_such_stream_*']))
+
+    def test_agg(self):
+        server = StandInServer().start()
+        api = SensorBeeAPI(server.host, server.port)
+        try:
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 0;')
+            args = [
+                '--host', server.host,
+                '--port', '{0}'.format(server.port),
+                '--topology', self.TOPOLOGY,
+                'syn',
+                '--oneline',
+            ]
+            out = StringIO()
+            cmd = SbPeekCommand(out=out)
+            self.assertEqual(0, cmd.main(args + ['--agg', 'seq,payload', '--window', '100', '--count', '2']))
+            rows = [json.loads(line) for line in out.getvalue().splitlines()]
+            self.assertEqual([(0, 100, 'seq'), (0, 100, 'payload'), (100, 200, 'seq'), (100, 200, 'payload')],
+                             [(r['start'], r['end'], r['field']) for r in rows])
+            self.assertEqual([4950.0, 0], [rows[0]['sum'], rows[1]['count']])
+            self.assertEqual(0, self.cmd.main(args + ['--agg', 'seq', '--window', '100ms', '--duration', '0.3',
+                                                      '--count', '0']))
+            self.assertEqual(1, self.cmd.main(args + ['--agg', 'seq', '--window', '10s', '--slide', '3s']))
+            self.assertEqual(1, self.cmd.main(args + ['--agg', 'seq', '--window', '1x']))
+            self.assertEqual(1, self.cmd.main(args + ['--group-by', 'seq']))
+            self.assertEqual(1, self.cmd.main(args + ['--window', '10s']))
+        finally:
+            api.close()
+            server.shutdown()
+
+class SbBenchCommandTest(TestCase):
+    def test_main(self):
+        cmd = SbBenchCommand()
+        self.assertEqual(0, cmd.main(['--benchmark', 'resultset', '--tuples', '100', '--repeat', '1']))
+        self.assertEqual(1, cmd.main(['--benchmark', 'unknown']))
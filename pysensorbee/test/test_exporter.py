@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import threading
+from unittest import TestCase
+from . import SB_TEST_HOST, SB_TEST_PORT
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+from pysensorbee.api import SensorBeeAPI
+from pysensorbee.tools.exporter import PrometheusExporter
+
+
+class PrometheusExporterTest(TestCase):
+    TOPOLOGY = 'exporter_test'
+
+    def setUp(self):
+        self.api = SensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT)
+        self.api.delete_topology(self.TOPOLOGY)
+        self.api.create_topology(self.TOPOLOGY)
+        self.api.query(self.TOPOLOGY, 'CREATE SOURCE ns TYPE node_statuses;')
+
+    def tearDown(self):
+        self.api.delete_topology(self.TOPOLOGY)
+
+    def test_exporter(self):
+        exporter = PrometheusExporter([self.api, SensorBeeAPI('127.0.0.1', 1, timeout=1)])
+        exporter.listen('127.0.0.1', 0)
+        for target in exporter._targets:
+            exporter.crawl(target)
+        self.assertEqual([1, 0], [t['up'] for t in exporter.targets()])
+
+        t = threading.Thread(target=exporter.serve)
+        t.start()
+        try:
+            body = urlopen('http://{0}:{1}/metrics'.format(*exporter.server_address)).read().decode('utf-8')
+        finally:
+            exporter.stop()
+            t.join()
+        self.assertEqual(exporter.render().decode('utf-8'), body)
+        server = '{0}:{1}'.format(SB_TEST_HOST, SB_TEST_PORT)
+        self.assertIn('# TYPE sensorbee_node_sent_total counter\n', body)
+        self.assertIn('sensorbee_up{{server="{0}"}} 1\n'.format(server), body)
+        self.assertIn('sensorbee_up{server="127.0.0.1:1"} 0\n', body)
+        self.assertIn('sensorbee_node_sent_total{{server="{0}",topology="{1}",node="ns",node_type="source"}}'.format(
+            server, self.TOPOLOGY), body)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from unittest import TestCase
+
+from pysensorbee.tools.dot import DotView
+from pysensorbee.tools.graph import TopologyGraph
+
+
+def _node(node_type, outputs=None, dropped=0):
+    status = {}
+    if node_type != 'source':
+        status['input_stats'] = {'num_received_total': 0, 'num_errors': 0}
+    if node_type != 'sink':
+        status['output_stats'] = {
+            'num_sent_total': 0,
+            'num_dropped': dropped,
+            'outputs': dict((out, {'num_sent': 10, 'num_queued': queued, 'queue_size': 1024})
+                            for (out, queued) in (outputs or {}).items()),
+        }
+    return {'node_type': node_type, 'state': 'running', 'status': status}
+
+
+class TopologyGraphTest(TestCase):
+    def setUp(self):
+        # src -> a -> b -> sink1, where b is slow; c <-> d is a dangling cycle.
+        self.graph = TopologyGraph({
+            'sources': {'src': _node('source', {'a': 1000}, dropped=5)},
+            'streams': {
+                'a': _node('box', {'b': 1024}),
+                'b': _node('box', {'sink1': 0}),
+                'c': _node('box', {'d': 0}),
+                'd': _node('box', {'c': 0, 'gone': 0}),
+            },
+            'sinks': {'sink1': _node('sink'), 'sink2': _node('sink')},
+        })
+
+    def test_structure(self):
+        g = self.graph
+        self.assertEqual(['src', 'a', 'b', 'c', 'd', 'sink1', 'sink2'], g.order())
+        self.assertEqual(['c', 'd', 'sink2'], g.dangling())
+        self.assertEqual([['c', 'd']], g.cycles())
+        self.assertEqual(['sink2', 'src', 'a', 'b', 'sink1'], g.topological_order())
+        self.assertEqual(['gone'], g.missing)
+        self.assertEqual(['a'], g.inputs['b'])
+
+    def test_backpressure(self):
+        self.assertEqual([{
+            'node': 'b',
+            'fill': 1.0,
+            'inputs': [('a', 1.0)],
+            'upstream': ['a', 'src'],
+            'dropped': 5,
+        }], self.graph.backpressure())
+        self.assertEqual([(['a'], 0)], [(b['upstream'], b['dropped']) for b in self.graph.backpressure(0.99)])
+
+    def test_dot(self):
+        dot = DotView(None, spider=object()).render_graph(self.graph)
+        self.assertIn('"a" -> "b" [label="10 (100.0%)", penwidth=2.04, color=red]', dot)
+        self.assertIn('"b" -> "sink1" [label="10 (0.0%)", penwidth=2.04]', dot)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pysensorbee.tools.history import ASCII_SPARKS, HistoryStore, sparkline
+
+
+def _status(sent, queued):
+    return {
+        'sources': {'src': {'node_type': 'source', 'status': {'output_stats': {
+            'num_sent_total': sent, 'num_dropped': 0,
+            'outputs': {'sink': {'num_sent': sent, 'num_queued': queued, 'queue_size': 1024}},
+        }}}},
+        'streams': {},
+        'sinks': {'sink': {'node_type': 'sink', 'status': {'input_stats': {
+            'num_received_total': sent, 'num_errors': 0,
+        }}}},
+    }
+
+
+class HistoryStoreTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_query(self):
+        h = HistoryStore()
+        # 10 tuples/s for 3 hours, then the counter is reset.
+        for i in range(3 * 3600):
+            h.record(1000000000 + i, 't', _status(i * 10, i % 5))
+        h.record(1000000000 + 3 * 3600, 't', _status(10, 0))
+        self.assertEqual([('t', 'sink'), ('t', 'src')], h.series())
+        self.assertEqual(10.0, h.rate('t', 'src', 'sent', 30))
+        self.assertEqual(10.0, h.rate('t', 'sink', 'received', 3600, end=1000000000 + 3 * 3600 - 1))
+        self.assertEqual(180, len(h.samples('t', 'src', 'sent', 3 * 3600)))  # 1m tier
+        self.assertEqual(4, h.percentile('t', 'src', 'queued', 99, 60))
+        self.assertEqual(10.0, h.percentile('t', 'src', 'sent', 50, 60))
+        self.assertEqual([10.0] * 3, h.trend('t', 'src', 'sent', 3))
+        self.assertEqual(None, h.rate('t', 'unknown', 'sent', 60))
+
+    def test_persist(self):
+        h = HistoryStore(self.path, segment_size=100, max_segments=2)
+        for i in range(20):
+            h.record(1000000000 + i, 't', _status(i, 0))
+        h.close()
+        self.assertEqual(4, len(os.listdir(self.path)))
+        h = HistoryStore(self.path)
+        samples = h.samples('t', 'src', 'sent', 60)
+        self.assertTrue(0 < len(samples) < 20)
+        self.assertEqual((1000000019.0, 19.0), samples[-1])
+        h.close()
+
+    def test_sparkline(self):
+        self.assertEqual('▁▃▅█', sparkline([0, 1, 2, 4]))
+        self.assertEqual('▁▁', sparkline([0, 0]))
+        self.assertEqual('_:=#', sparkline([0, 1, 2, 4], ASCII_SPARKS))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+from unittest import TestCase
+
+from pysensorbee._projection import _Projector
+from pysensorbee.codec import CODECS
+
+
+class ProjectorTest(TestCase):
+    TUPLE = {
+        'id': 1,
+        'blob': 'A' * 100000,
+        'text': '日本語\\"😀' * 20,
+        'short': 'é\\"',
+        'nested': {'list': ['x' * 50, 1.5, None, {'deep': 'y' * 50}], 'key' * 20: True},
+        'empty': {},
+    }
+
+    def test_project(self):
+        for codec in CODECS:
+            for ensure_ascii in (True, False):
+                data = json.dumps(self.TUPLE, ensure_ascii=ensure_ascii).encode('utf-8')
+                p = _Projector(codec(), max_string_length=40)
+                d = p.project(memoryview(data))
+                self.assertEqual('A' * 40 + '... (omit)', d['blob'])
+                self.assertEqual(self.TUPLE['text'][:40] + '... (omit)', d['text'])
+                self.assertEqual('é\\"', d['short'])
+                self.assertEqual({'list': ['x' * 40 + '... (omit)', 1.5, None, {'deep': 'y' * 40 + '... (omit)'}],
+                                  'key' * 20: True}, d['nested'])
+                self.assertEqual({}, d['empty'])
+
+                d = _Projector(codec(), keys=['id', 'empty', 'missing']).project(data)
+                self.assertEqual({'id': 1, 'empty': {}}, d)
+                self.assertEqual(self.TUPLE, _Projector(codec()).project(data))
+
+    def test_invalid(self):
+        p = _Projector(CODECS[-1](), max_string_length=10)
+        self.assertEqual([1, 2], p.project(b' [1, 2]'))
+        self.assertRaises(ValueError, p.project, b'{"a": "unterminated')
+        self.assertRaises(ValueError, p.project, b'{"a": 1')
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from unittest import TestCase
+
+from pysensorbee.tools.rate import RateCalculator
+
+
+def _runtime_status(goroutines, cgo_calls):
+    return {'num_goroutine': goroutines, 'num_cgo_call': cgo_calls}
+
+
+def _status(sent, queued, received=None):
+    if received is None:
+        received = sent
+    return {
+        'sources': {'src': {'node_type': 'source', 'status': {'output_stats': {
+            'num_sent_total': sent, 'num_dropped': 0,
+            'outputs': {
+                'box': {'num_sent': sent, 'num_queued': queued, 'queue_size': 1024},
+                'sink': {'num_sent': sent, 'num_queued': 0, 'queue_size': 1024},
+            },
+        }}}},
+        'streams': {'box': {'node_type': 'box', 'status': {
+            'input_stats': {'num_received_total': received, 'num_errors': 1},
+            'output_stats': {'num_sent_total': received, 'num_dropped': 0, 'outputs': {}},
+        }}},
+        'sinks': {'sink': {'node_type': 'sink', 'status': {'input_stats': {
+            'num_received_total': received, 'num_errors': 0,
+        }}}},
+    }
+
+
+class RateCalculatorTest(TestCase):
+    def test_update(self):
+        c = RateCalculator()
+        self.assertEqual(None, c.update(100, _runtime_status(10, 0), _status(0, 5)))
+        rates = c.update(102, _runtime_status(14, 20), _status(40, 2))
+        self.assertEqual({
+            'num_goroutine': 14,
+            'num_goroutine_delta': 4,
+            'num_goroutine_min': 10,
+            'num_goroutine_max': 14,
+            'num_cgo_call_rate': 10.0,
+        }, rates['runtime'])
+        self.assertEqual(['box', 'sink', 'src'], sorted(rates['nodes']))
+        src = rates['nodes']['src']
+        self.assertEqual([None, None, 20.0, 0.0], [src[k] for k in ('received', 'errors', 'sent', 'dropped')])
+        self.assertEqual(-3, src['queued'])
+        self.assertEqual({'box': {'sent': 20.0, 'queued': -3}, 'sink': {'sent': 20.0, 'queued': 0}},
+                         src['outputs'])
+        box = rates['nodes']['box']
+        self.assertEqual([20.0, 0.0, 20.0, 0], [box[k] for k in ('received', 'errors', 'sent', 'queued')])
+        self.assertEqual({}, box['outputs'])
+        self.assertEqual(20.0, rates['nodes']['sink']['received'])
+        self.assertEqual(None, rates['nodes']['sink']['sent'])
+
+        # No time elapsed.
+        self.assertEqual(None, c.update(102, _runtime_status(14, 20), _status(40, 2)))
+
+        rates = c.update(103, _runtime_status(8, 20), _status(40, 6))
+        self.assertEqual([-6, 8, 14], [rates['runtime'][k] for k in (
+            'num_goroutine_delta', 'num_goroutine_min', 'num_goroutine_max')])
+        self.assertEqual(0.0, rates['nodes']['src']['sent'])
+        self.assertEqual(4, rates['nodes']['src']['queued'])
+        self.assertEqual(4, rates['nodes']['src']['outputs']['box']['queued'])
+
+    def test_reset(self):
+        c = RateCalculator()
+        c.update(100, _runtime_status(10, 100), _status(100, 3))
+        rates = c.update(101, _runtime_status(10, 0), _status(10, 1, received=5))
+        self.assertEqual(None, rates['runtime']['num_cgo_call_rate'])
+        src = rates['nodes']['src']
+        self.assertEqual(None, src['sent'])
+        self.assertEqual(None, src['outputs']['box']['sent'])
+        self.assertEqual(-2, src['queued'])
+        self.assertEqual(None, rates['nodes']['sink']['received'])
+
+        # Rates resume from the reset counters.
+        rates = c.update(102, _runtime_status(10, 5), _status(20, 1, received=15))
+        self.assertEqual(5.0, rates['runtime']['num_cgo_call_rate'])
+        self.assertEqual(10.0, rates['nodes']['src']['sent'])
+        self.assertEqual(10.0, rates['nodes']['sink']['received'])
+
+    def test_new_node(self):
+        c = RateCalculator()
+        status = _status(0, 0)
+        del status['sinks']['sink']
+        c.update(100, _runtime_status(10, 0), status)
+        rates = c.update(101, _runtime_status(10, 0), _status(10, 0))
+        self.assertEqual([None, None, None], [rates['nodes']['sink'][k] for k in ('received', 'errors', 'queued')])
+        self.assertEqual(10.0, rates['nodes']['src']['sent'])
+
+    def test_history(self):
+        c = RateCalculator(history=2)
+        for (i, n) in enumerate([30, 10, 20]):
+            rates = c.update(100 + i, _runtime_status(n, 0), _status(0, 0))
+        self.assertEqual([10, 20], [rates['runtime'][k] for k in ('num_goroutine_min', 'num_goroutine_max')])
+        self.assertEqual([(101, 10, 0), (102, 20, 0)], list(c.runtime_history))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import shutil
+import tempfile
+from unittest import TestCase
+from . import SB_TEST_HOST, SB_TEST_PORT
+
+from pysensorbee.api import SensorBeeAPI
+from pysensorbee.tools.recorder import Recorder, Recording, ReplayServer, SegmentWriter
+
+
+class RecorderTest(TestCase):
+    TOPOLOGY = 'recorder_test'
+
+    def setUp(self):
+        self.api = SensorBeeAPI(SB_TEST_HOST, SB_TEST_PORT)
+        self.api.delete_topology(self.TOPOLOGY)
+        self.api.create_topology(self.TOPOLOGY)
+        self.api.query(self.TOPOLOGY,
+            'CREATE SOURCE ns TYPE node_statuses WITH interval = 0.1;')
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.api.delete_topology(self.TOPOLOGY)
+        shutil.rmtree(self.path)
+
+    def test_record(self):
+        self.assertEqual(3, Recorder(self.api, self.path).record(self.TOPOLOGY, 'ns', count=3))
+        with SegmentWriter(self.path, segment_size=1) as w:
+            w.append({'n': 1}, 2000000000.0)
+            w.append({'n': 2}, 2000000001.0)
+        with Recording(self.path) as r:
+            self.assertEqual(5, len(r))
+            self.assertTrue(isinstance(r.get(0), dict))
+            self.assertEqual(4, r.seek(2000000000.5))
+            self.assertEqual({'n': 2}, r.get(4))
+            self.assertEqual([3, 1, 1], [len(b) for b in r.iter_batches(10)])
+            self.assertEqual(1, sum([len(b) for b in r.iter_batches(10, start=2000000000.0, end=2000000001.0)]))
+
+            with ReplayServer(r) as server:
+                api = SensorBeeAPI('127.0.0.1', server.port)
+                self.assertEqual(5, len(list(api.query('replay', 'SELECT RSTREAM * FROM replay [RANGE 1 TUPLES];'))))
+                self.assertEqual(2, len(list(api.query('replay', 'SELECT RSTREAM [LIMIT 2] * FROM replay [RANGE 1 TUPLES];'))))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import threading
+from unittest import TestCase
+
+from pysensorbee.api import ResultSet, SensorBeeAPI
+from pysensorbee.testing import StandInServer
+from pysensorbee.tools.shard import ShardedQuery, partition_query
+
+
+def _seq(d):
+    if d['seq'] == 31:
+        raise KeyError(d['seq'])
+    return d['seq']
+
+
+def _lock(d):
+    return threading.Lock()
+
+
+def _exit(d):
+    os._exit(1)
+
+
+class PartitionQueryTest(TestCase):
+    def test_partition_query(self):
+        self.assertEqual(
+            'SELECT RSTREAM * FROM s [RANGE 1 TUPLES] WHERE abs(id) % 4 = 1;',
+            partition_query('SELECT RSTREAM * FROM s [RANGE 1 TUPLES];', 'id', 4, 1))
+        self.assertEqual(
+            'SELECT RSTREAM * FROM s [RANGE 1 TUPLES] WHERE (a = "where;" OR b) AND abs(id) % 4 = 1;',
+            partition_query('SELECT RSTREAM * FROM s [RANGE 1 TUPLES] WHERE a = "where;" OR b;', 'id', 4, 1))
+        self.assertEqual(
+            'SELECT ISTREAM k, count(*) FROM s [RANGE 1 SECONDS] WHERE (x > 1) AND hash(k) % 2 = 0 '
+            'GROUP BY k HAVING count(*) > 2',
+            partition_query('SELECT ISTREAM k, count(*) FROM s [RANGE 1 SECONDS] WHERE x > 1 '
+                            'GROUP BY k HAVING count(*) > 2', 'k', 2, 0, 'hash({key}) % {shards} = {shard}'))
+        for q in ('CREATE STREAM x AS SELECT RSTREAM * FROM s [RANGE 1 TUPLES];',
+                  'SELECT RSTREAM 1 AS one;',
+                  'SELECT RSTREAM * FROM s [RANGE 1 TUPLES]; SELECT RSTREAM * FROM t [RANGE 1 TUPLES];'):
+            self.assertRaises(ValueError, partition_query, q, 'id', 2, 0)
+
+
+class ShardedQueryTest(TestCase):
+    TOPOLOGY = 'shard_test'
+    QUERY = 'SELECT RSTREAM [LIMIT 20] * FROM syn [RANGE 1 TUPLES];'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandInServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.api = SensorBeeAPI(self.server.host, self.server.port)
+        self.api.delete_topology(self.TOPOLOGY)
+        self.api.create_topology(self.TOPOLOGY)
+        self.api.query(self.TOPOLOGY, 'CREATE SOURCE syn TYPE synthetic WITH rate = 0;')
+
+    def tearDown(self):
+        self.api.delete_topology(self.TOPOLOGY)
+        self.api.close()
+
+    def test_open(self):
+        results = ShardedQuery(self.api, self.TOPOLOGY, self.QUERY, 'seq', 3).open()
+        self.assertEqual(3, len(results))
+        for (i, rs) in enumerate(results):
+            self.assertTrue(isinstance(rs, ResultSet))
+            self.assertEqual(list(range(i, 60, 3)), [d['seq'] for d in rs])
+
+    def test_merge(self):
+        sq = ShardedQuery(self.api, self.TOPOLOGY, self.QUERY, 'seq', 3)
+        self.assertEqual(list(range(60)), sorted([d['seq'] for d in sq]))
+        tagged = list(sq.merge(maxsize=4, tagged=True))
+        self.assertEqual(60, len(tagged))
+        self.assertTrue(all([d['seq'] % 3 == i for (i, d) in tagged]))
+        raw = list(sq.merge(reader=ResultSet.raw))
+        self.assertTrue(all([isinstance(d, bytes) for d in raw]))
+
+        # Stopped early.
+        it = ShardedQuery(self.api, self.TOPOLOGY, 'SELECT RSTREAM * FROM syn [RANGE 1 TUPLES];', 'seq', 2).merge()
+        self.assertEqual(10, len([d for (_, d) in zip(range(10), it)]))
+        it.close()
+
+        sq = ShardedQuery(self.api, self.TOPOLOGY, 'SELECT RSTREAM * FROM no_such_stream [RANGE 1 TUPLES];', 'seq', 2)
+        self.assertRaises(Exception, list, sq)
+
+    def test_map(self):
+        sq = ShardedQuery(self.api, self.TOPOLOGY, 'SELECT RSTREAM [LIMIT 10] * FROM syn [RANGE 1 TUPLES];', 'seq', 3)
+        self.assertEqual(list(range(30)), sorted(sq.map(_seq, chunksize=4)))
+        tagged = list(sq.map(_seq, chunksize=4, timeout=0.1, tagged=True))
+        self.assertEqual(30, len(tagged))
+        self.assertTrue(all([r % 3 == i for (i, r) in tagged]))
+
+        # Shards connect with the codec of the API.
+        api = SensorBeeAPI(self.server.host, self.server.port, codec='json')
+        try:
+            sq = ShardedQuery(api, self.TOPOLOGY, 'SELECT RSTREAM [LIMIT 10] * FROM syn [RANGE 1 TUPLES];', 'seq', 2)
+            self.assertEqual(list(range(20)), sorted(sq.map(_seq)))
+        finally:
+            api.close()
+
+        sq = ShardedQuery(self.api, self.TOPOLOGY, self.QUERY, 'seq', 3)
+        self.assertRaises(KeyError, list, sq.map(_seq))
+        self.assertRaises(Exception, list, sq.map(_lock))
+        self.assertRaises(RuntimeError, list, sq.map(_exit))
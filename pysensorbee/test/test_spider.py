@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from unittest import TestCase
+
+from pysensorbee.api import SensorBeeAPI, SensorBeeAPIError
+from pysensorbee.testing import StandInServer
+from pysensorbee.tools.spider import Spider
+
+
+class SpiderTest(TestCase):
+    TOPOLOGY = 'spider_test'
+
+    def setUp(self):
+        self.server = StandInServer(rate=0).start()
+        self.server.create_synthetic_topology(self.TOPOLOGY, sources=2, streams=20, sinks=3)
+        self.api = SensorBeeAPI(self.server.host, self.server.port)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.shutdown()
+
+    def test_get(self):
+        spider = Spider(self.api, workers=4)
+        status = spider.get()
+        self.assertTrue('pid' in status['runtime_status'])
+        t = status['topologies'][self.TOPOLOGY]
+        self.assertEqual([2, 20, 3], [len(t[k]) for k in Spider.KINDS])
+        self.assertEqual(['source_0', 'source_1'], sorted(t['sources']))
+        self.assertEqual([], spider.errors)
+
+    def test_errors(self):
+        # A node deleted after listing it.
+        sink = self.api.sink
+
+        def drop_and_get(t, name):
+            if name == 'sink_1':
+                self.api.query(t, 'DROP SINK sink_1;')
+            return sink(t, name)
+        self.api.sink = drop_and_get
+
+        spider = Spider(self.api, workers=4)
+        status = spider.get_topology_status(self.TOPOLOGY)
+        self.assertEqual(['sink_0', 'sink_2'], sorted(status['sinks']))
+        self.assertEqual([2, 20], [len(status[k]) for k in ('sources', 'streams')])
+        self.assertEqual([(self.TOPOLOGY, 'sinks', 'sink_1')], [e[:3] for e in spider.errors])
+        self.assertTrue(isinstance(spider.errors[0][3], SensorBeeAPIError))
+
+        # Listing nodes of a topology failed.
+        status = spider.get_topology_status('no_such_topology')
+        self.assertEqual([{}, {}, {}], [status[k] for k in Spider.KINDS])
+        self.assertEqual([('no_such_topology', k, None) for k in Spider.KINDS], [e[:3] for e in spider.errors])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from unittest import TestCase
+
+from pysensorbee.api import SensorBeeAPI
+from pysensorbee.testing import StandInServer
+from pysensorbee.testing.benchmark import BenchmarkSuite, compare
+from pysensorbee.tools.spider import Spider
+
+
+class StandInServerTest(TestCase):
+    def setUp(self):
+        self.server = StandInServer(rate=0, tuple_size=1000).start()
+        self.api = SensorBeeAPI(self.server.host, self.server.port)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.shutdown()
+
+    def test_synthetic_topology(self):
+        self.server.create_synthetic_topology('t', sources=2, streams=20, sinks=3)
+        status = Spider(self.api).get_topology_status('t')
+        self.assertEqual([2, 20, 3], [len(status[k]) for k in Spider.KINDS])
+
+        rs = self.api.query('t', 'SELECT RSTREAM [LIMIT 10] * FROM stream_19 [RANGE 1 TUPLES];')
+        tuples = list(rs)
+        self.assertEqual(list(range(10)), [d['seq'] for d in tuples])
+        self.assertTrue(all([900 < len(d['payload']) for d in tuples]))
+
+class BenchmarkSuiteTest(TestCase):
+    def test_run(self):
+        suite = BenchmarkSuite(tuples=100, topology_sizes=(5,), clients=2, repeat=1)
+        results = suite.run(['resultset', 'spider'])
+        self.assertEqual(['resultset', 'spider[5]'], list(results.keys()))
+        self.assertEqual([], compare(results, results))
+
+        worse = dict((k, dict(r)) for (k, r) in results.items())
+        worse['resultset']['value'] /= 2
+        self.assertEqual(['resultset'], [x[0] for x in compare(worse, results)])
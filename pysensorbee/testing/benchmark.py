@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import json
+import multiprocessing
+import platform
+import threading
+import time
+
+try:
+    import tracemalloc
+    _TRACEMALLOC_AVAILABLE = True
+except ImportError:
+    # Python 3.3 or earlier
+    _TRACEMALLOC_AVAILABLE = False
+
+from ..api import SensorBeeAPI, _WEBSOCKET_AVAILABLE
+from ..tools.spider import Spider
+from ..tools.top import TopView
+from .server import StandInServer
+
+
+def _serve(conn, rate, tuple_size, topologies):
+    server = StandInServer(rate=rate, tuple_size=tuple_size)
+    for (name, size) in topologies:
+        server.create_synthetic_topology(name, sources=max(1, size // 10), streams=size, sinks=max(1, size // 10))
+    conn.send(server.port)
+    server.serve_forever()
+
+
+class BenchmarkSuite(object):
+    BENCHMARKS = ('resultset', 'spider', 'top', 'websocket')
+    TOPOLOGY = 'bench'
+
+    def __init__(self, tuples=100000, tuple_size=100, topology_sizes=(10, 100, 1000), clients=8, repeat=3):
+        """
+        Benchmarks of the client hot paths against a ``StandInServer`` run in
+        a separate process:
+
+        * ``resultset``: tuples per second read from a ``ResultSet`` (of
+          ``tuples`` tuples of about ``tuple_size`` bytes).
+        * ``spider``: latency of ``Spider.get`` for synthetic topologies of
+          each of ``topology_sizes`` streams.
+        * ``top``: time of ``TopView.render_status`` for the largest topology.
+        * ``websocket``: tuples per second received by ``clients`` WebSocket
+          clients reading ``tuples`` tuples in total concurrently.
+
+        Each benchmark is run ``repeat`` times and the best result is taken;
+        the peak memory allocated by the client (``tracemalloc``) is measured
+        in an additional run.
+        """
+        self.tuples = tuples
+        self.tuple_size = tuple_size
+        self.topology_sizes = topology_sizes
+        self.clients = clients
+        self.repeat = repeat
+
+    def run(self, names=None, progress=None):
+        """
+        Runs the benchmarks (all if ``names`` is None) and returns an ordered
+        dict that maps result names to dicts of ``value``, ``unit``,
+        ``higher_is_better`` and ``peak_memory`` (bytes, or None if
+        unavailable).  ``progress`` is called with each result name before
+        it is measured.
+        """
+        names = self.BENCHMARKS if names is None else names
+        for name in names:
+            if name not in self.BENCHMARKS:
+                raise ValueError('unknown benchmark: {0}'.format(name))
+
+        (parent, child) = multiprocessing.Pipe()
+        topologies = [('synthetic_{0}'.format(n), n) for n in self.topology_sizes]
+        process = multiprocessing.Process(target=_serve, args=(child, 0, self.tuple_size, topologies))
+        process.daemon = True
+        process.start()
+        try:
+            api = SensorBeeAPI('127.0.0.1', parent.recv())
+            api.create_topology(self.TOPOLOGY)
+            api.query(self.TOPOLOGY, 'CREATE SOURCE synthetic TYPE synthetic;')
+            results = collections.OrderedDict()
+            for name in names:
+                for (key, func, unit, higher_is_better) in getattr(self, '_' + name)(api):
+                    if progress is not None:
+                        progress(key)
+                    value = self._measure(func, higher_is_better)
+                    if value is None:
+                        continue  # unavailable in this environment
+                    results[key] = {
+                        'value': value,
+                        'unit': unit,
+                        'higher_is_better': higher_is_better,
+                        'peak_memory': self._peak_memory(func),
+                    }
+            return results
+        finally:
+            process.terminate()
+            process.join()
+
+    def _measure(self, func, higher_is_better):
+        values = [func() for _ in range(self.repeat)]
+        if None in values:
+            return None
+        return max(values) if higher_is_better else min(values)
+
+    def _peak_memory(self, func):
+        if not _TRACEMALLOC_AVAILABLE:
+            return None
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def _select(self, count):
+        return 'SELECT RSTREAM [LIMIT {0}] * FROM synthetic [RANGE 1 TUPLES];'.format(count)
+
+    def _resultset(self, api):
+        def run():
+            started = time.time()
+            n = 0
+            for _ in api.query(self.TOPOLOGY, self._select(self.tuples)):
+                n += 1
+            return n / (time.time() - started)
+        return [('resultset', run, 'tuples/s', True)]
+
+    def _spider(self, api):
+        def bench(t):
+            def run():
+                spider = Spider(api)
+                started = time.time()
+                spider.get_topology_status(t)
+                return time.time() - started
+            return run
+        return [('spider[{0}]'.format(n), bench('synthetic_{0}'.format(n)), 's', False)
+                for n in self.topology_sizes]
+
+    def _top(self, api):
+        t = 'synthetic_{0}'.format(max(self.topology_sizes))
+        spider = Spider(api)
+        (rs, ts) = (spider.get_runtime_status(), spider.get_topology_status(t))
+        view = TopView(api, spider)
+
+        def run():
+            started = time.time()
+            view.render_status(t, rs, ts)
+            return time.time() - started
+        return [('top[{0}]'.format(max(self.topology_sizes)), run, 's', False)]
+
+    def _websocket(self, api):
+        def run():
+            if not _WEBSOCKET_AVAILABLE:
+                return None
+            clients = [api.wsquery(self.TOPOLOGY) for _ in range(self.clients)]
+            counts = [0] * self.clients
+            try:
+                for wsc in clients:
+                    wsc.start()
+                started = time.time()
+                streams = [wsc.submit(self._select(self.tuples // self.clients)).result() for wsc in clients]
+
+                def read(i):
+                    for _ in streams[i]:
+                        counts[i] += 1
+                threads = [threading.Thread(target=read, args=(i,)) for i in range(self.clients)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                return sum(counts) / (time.time() - started)
+            finally:
+                for wsc in clients:
+                    wsc.close()
+        return [('websocket[{0}]'.format(self.clients), run, 'tuples/s', True)]
+
+
+def save_baseline(results, path):
+    """
+    Saves benchmark results as the baseline to ``path`` in JSON.
+    """
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+def load_baseline(path):
+    """
+    Loads the baseline results saved by ``save_baseline``.
+    """
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compares results with the baseline and returns the list of regressions
+    as tuples of (result name, metric, baseline value, current value); a
+    regression is a value worse than the baseline by more than ``tolerance``
+    (relative).  ``metric`` is ``value`` or ``peak_memory``.
+    """
+    regressions = []
+    for (name, r) in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        if r['higher_is_better']:
+            if r['value'] < b['value'] * (1 - tolerance):
+                regressions.append((name, 'value', b['value'], r['value']))
+        elif b['value'] * (1 + tolerance) < r['value']:
+            regressions.append((name, 'value', b['value'], r['value']))
+        if r['peak_memory'] is not None and b.get('peak_memory') is not None:
+            if b['peak_memory'] * (1 + tolerance) < r['peak_memory']:
+                regressions.append((name, 'peak_memory', b['peak_memory'], r['peak_memory']))
+    return regressions
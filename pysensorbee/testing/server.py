@@ -0,0 +1,849 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import ast
+import base64
+import collections
+import hashlib
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from ..codec import get_codec
+
+
+# For Python 3 compatibility
+unicode = type('')
+
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Python 3.8 or later parses all literals into ast.Constant.
+_CONSTANT_NODE = (3, 8) <= sys.version_info
+_LITERAL_NODES = (ast.Constant,) if _CONSTANT_NODE else (ast.Num, ast.Str)
+
+
+class StandInError(Exception):
+    def __init__(self, status, code, message):
+        """
+        Error returned to the client as a SensorBee error response.
+        """
+        super(StandInError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def to_dict(self, request_id):
+        return {'code': self.code, 'message': self.message, 'request_id': request_id, 'meta': {}}
+
+
+def _literal(expr):
+    """
+    Evaluates a BQL literal or an arithmetic expression of literals.
+    """
+    expr = expr.strip()
+    lowered = expr.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    if lowered == 'null':
+        return None
+    node = ast.parse(expr, mode='eval').body
+
+    def evaluate(node):
+        if isinstance(node, ast.BinOp):
+            (left, right) = (evaluate(node.left), evaluate(node.right))
+            op = type(node.op)
+            if op is ast.Add:
+                return left + right
+            if op is ast.Sub:
+                return left - right
+            if op is ast.Mult:
+                return left * right
+            if op is ast.Div:
+                return left / right
+            if op is ast.Mod:
+                return left % right
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            v = evaluate(node.operand)
+            return -v if isinstance(node.op, ast.USub) else v
+        elif isinstance(node, _LITERAL_NODES):
+            value = node.value if _CONSTANT_NODE else getattr(node, 'n', getattr(node, 's', None))
+            if isinstance(value, bytes):
+                value = value.decode('utf-8')
+            if isinstance(value, (int, float, unicode)) and not isinstance(value, bool):
+                return value
+        raise ValueError('unsupported expression: {0}'.format(expr))
+    return evaluate(node)
+
+
+def _split(text, sep):
+    """
+    Splits ``text`` by ``sep`` outside of quotes and brackets.
+    """
+    (parts, buf, depth, quote) = ([], [], 0, None)
+    for c in text:
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(''.join(buf))
+            buf = []
+            continue
+        buf.append(c)
+    parts.append(''.join(buf))
+    return [p.strip() for p in parts if p.strip()]
+
+
+class _Projection(object):
+    def __init__(self, exprs):
+        # List of (name, kind, value) where kind is '*', 'field' or 'literal'.
+        self.items = []
+        for item in _split(exprs, ','):
+            m = re.match(r'^(.*?)\s+AS\s+(\w+)$', item, re.IGNORECASE | re.DOTALL)
+            (expr, name) = (m.group(1).strip(), m.group(2)) if m else (item, None)
+            if expr == '*':
+                self.items.append((None, '*', None))
+            elif re.match(r'^[A-Za-z_]\w*$', expr) and expr.lower() not in ('true', 'false', 'null'):
+                self.items.append((name or expr, 'field', expr))
+            else:
+                try:
+                    value = _literal(expr)
+                except (ValueError, SyntaxError):
+                    raise StandInError(400, 'E0003', 'unsupported expression: {0}'.format(expr))
+                self.items.append((name or 'col_{0}'.format(len(self.items) + 1), 'literal', value))
+
+    def apply(self, d):
+        if len(self.items) == 1 and self.items[0][1] == '*':
+            return d
+        result = {}
+        for (name, kind, value) in self.items:
+            if kind == '*':
+                result.update(d)
+            elif kind == 'field':
+                result[name] = d.get(value)
+            else:
+                result[name] = value
+        return result
+
+
+class _Condition(object):
+    # BQL operators and keywords that differ from Python.
+    _TOKENS = re.compile(r'("[^"]*"|\'[^\']*\')|<>|[<>!=]=|=|\b(AND|OR|NOT|TRUE|FALSE|NULL)\b', re.IGNORECASE)
+    _REPLACE = {'<>': '!=', '=': '==', 'AND': 'and', 'OR': 'or', 'NOT': 'not',
+                'TRUE': 'True', 'FALSE': 'False', 'NULL': 'None'}
+    _COMPARE = {ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b,
+                ast.Lt: lambda a, b: a < b, ast.LtE: lambda a, b: a <= b,
+                ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b}
+    _ARITHMETIC = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b,
+                   ast.Mult: lambda a, b: a * b, ast.Div: lambda a, b: a / b,
+                   ast.Mod: lambda a, b: a % b}
+    _FUNCTIONS = {'abs': abs}
+    _CONSTANTS = {'True': True, 'False': False, 'None': None}
+
+    def __init__(self, text):
+        """
+        ``WHERE`` condition: comparisons, ``AND``, ``OR``, ``NOT``,
+        arithmetic and ``abs`` of fields and literals.  Operations on NULL
+        (a missing field) yield NULL, which does not match.
+        """
+        def replace(m):
+            if m.group(1):
+                return m.group(1)
+            token = m.group(0)
+            return self._REPLACE.get(token.upper(), token)
+        try:
+            self._node = ast.parse(self._TOKENS.sub(replace, text.strip()), mode='eval').body
+            self.evaluate({})
+        except (SyntaxError, ValueError):
+            raise StandInError(400, 'E0003', 'unsupported condition: {0}'.format(text))
+        except (ArithmeticError, TypeError):
+            pass
+
+    def match(self, d):
+        try:
+            return self.evaluate(d) is True
+        except (ArithmeticError, TypeError):
+            return False
+
+    def evaluate(self, d, node=None):
+        node = self._node if node is None else node
+        if isinstance(node, ast.BoolOp):
+            values = [self.evaluate(d, v) for v in node.values]
+            if isinstance(node.op, ast.And):
+                if any([v is False for v in values]):
+                    return False
+                return None if None in values else True
+            if any([v is True for v in values]):
+                return True
+            return None if None in values else False
+        if isinstance(node, ast.UnaryOp):
+            v = self.evaluate(d, node.operand)
+            if v is None:
+                return None
+            if isinstance(node.op, ast.Not):
+                return not v
+            return -v if isinstance(node.op, ast.USub) else v
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in self._COMPARE:
+            (left, right) = (self.evaluate(d, node.left), self.evaluate(d, node.comparators[0]))
+            if left is None or right is None:
+                return None
+            return self._COMPARE[type(node.ops[0])](left, right)
+        if isinstance(node, ast.BinOp) and type(node.op) in self._ARITHMETIC:
+            (left, right) = (self.evaluate(d, node.left), self.evaluate(d, node.right))
+            if left is None or right is None:
+                return None
+            return self._ARITHMETIC[type(node.op)](left, right)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in self._FUNCTIONS:
+            args = [self.evaluate(d, a) for a in node.args]
+            if None in args:
+                return None
+            return self._FUNCTIONS[node.func.id](*args)
+        if isinstance(node, ast.Name):
+            if node.id in self._CONSTANTS:  # Python 2
+                return self._CONSTANTS[node.id]
+            return d.get(node.id)
+        if type(node).__name__ == 'NameConstant':  # Python 3.4 to 3.7
+            return node.value
+        if isinstance(node, _LITERAL_NODES):
+            value = node.value if _CONSTANT_NODE else getattr(node, 'n', getattr(node, 's', None))
+            return value.decode('utf-8') if isinstance(value, bytes) else value
+        raise ValueError('unsupported expression')
+
+
+class _Node(object):
+    def __init__(self, topology, name, node_type, kind, params=None, inputs=None, projection=None,
+                 condition=None):
+        self.topology = topology
+        self.name = name
+        self.node_type = node_type  # 'source', 'box' or 'sink'
+        self.kind = kind            # source/sink type, e.g., 'node_statuses'
+        self.params = params or {}
+        self.inputs = list(inputs or [])
+        self.projection = projection
+        self.condition = condition
+        self.created = time.time()
+
+    def rate(self):
+        """
+        Returns the number of tuples per second emitted by the node.
+        """
+        if self.node_type == 'source':
+            if self.kind == 'node_statuses':
+                return len(self.topology.nodes) / float(self.params.get('interval', 1.0))
+            return float(self.params.get('rate', self.topology.server.rate))
+        return sum([self.topology.nodes[i].rate() for i in self.inputs if i in self.topology.nodes])
+
+    def outputs(self):
+        return sorted([n.name for n in self.topology.nodes.values() if self.name in n.inputs])
+
+    def status(self):
+        # Counters grow with the time elapsed since the node was created so
+        # that rates computed from successive snapshots are meaningful.
+        rate = self.rate()
+        if self.node_type == 'source' and rate == 0:
+            rate = self.topology.server.UNLIMITED_STATUS_RATE
+        elapsed = time.time() - self.created
+        total = int(elapsed * rate)
+        status = {}
+        if self.node_type != 'source':
+            status['input_stats'] = {
+                'num_received_total': total,
+                'num_errors': 0,
+                'inputs': dict((i, {'num_received': total // max(1, len(self.inputs)), 'num_errors': 0})
+                               for i in self.inputs),
+            }
+        if self.node_type != 'sink':
+            outputs = self.outputs()
+            status['output_stats'] = {
+                'num_sent_total': total * len(outputs),
+                'num_dropped': 0 if outputs else total,
+                'outputs': dict((o, {'num_sent': total, 'num_queued': int(elapsed) % 8, 'queue_size': 1024})
+                                for o in outputs),
+            }
+        return {
+            'name': self.name,
+            'node_type': self.node_type,
+            'state': 'running',
+            'status': status,
+        }
+
+    def tuples(self, stopped):
+        """
+        Returns a generator of tuples emitted by the node, paced at its rate.
+        """
+        if self.node_type == 'source':
+            generator = self._source_tuples(stopped)
+        elif self.node_type == 'box':
+            if not self.inputs or self.inputs[0] not in self.topology.nodes:
+                return iter([])
+            generator = self.topology.nodes[self.inputs[0]].tuples(stopped)
+        else:
+            raise StandInError(400, 'E0003', 'sink cannot be selected: {0}'.format(self.name))
+        if self.condition is not None:
+            generator = (d for d in generator if self.condition.match(d))
+        if self.projection is None:
+            return generator
+        return (self.projection.apply(d) for d in generator)
+
+    def _source_tuples(self, stopped):
+        params = self.params
+        if self.kind == 'node_statuses':
+            interval = float(params.get('interval', 1.0))
+            while not stopped.is_set():
+                started = time.time()
+                for node in list(self.topology.nodes.values()):
+                    d = node.status()
+                    yield {
+                        'node_name': node.name,
+                        'node_type': node.node_type,
+                        'state': d['state'],
+                        'input_stats': d['status'].get('input_stats'),
+                        'output_stats': d['status'].get('output_stats'),
+                        'behaviors': {'stop_on_disconnect': False, 'remove_on_stop': False},
+                    }
+                stopped.wait(max(0, started + interval - time.time()))
+            return
+
+        rate = float(params.get('rate', self.topology.server.rate))
+        size = int(params.get('tuple_size', self.topology.server.tuple_size))
+        # {"seq": 0, "ts": 0.0, "payload": ""} is about 40 bytes.
+        payload = 'x' * max(0, size - 40)
+        started = time.time()
+        seq = 0
+        while not stopped.is_set():
+            if 0 < rate:
+                wait = started + seq / rate - time.time()
+                if 0 < wait:
+                    stopped.wait(wait)
+            yield {'seq': seq, 'ts': time.time(), 'payload': payload}
+            seq += 1
+
+
+class _Topology(object):
+    def __init__(self, server, name):
+        self.server = server
+        self.name = name
+        self.nodes = collections.OrderedDict()
+
+    def add(self, node):
+        if node.name in self.nodes:
+            raise StandInError(400, 'E0003', 'node already exists: {0}'.format(node.name))
+        self.nodes[node.name] = node
+
+    def get(self, name, node_type=None):
+        node = self.nodes.get(name)
+        if node is None or (node_type is not None and node.node_type != node_type):
+            raise StandInError(404, 'E0002', 'node not found: {0}'.format(name))
+        return node
+
+    def to_dict(self):
+        return {'name': self.name}
+
+
+class _Select(object):
+    def __init__(self, node, limit, stopped):
+        self.node = node
+        self.limit = limit
+        self.stopped = stopped
+
+    def __iter__(self):
+        n = 0
+        for d in self.node.tuples(self.stopped):
+            if self.limit is not None and self.limit <= n:
+                return
+            yield d
+            n += 1
+            if self.limit is not None and self.limit <= n:
+                return
+
+
+_CREATE_SOURCE = re.compile(r'^CREATE\s+(?:PAUSED\s+)?SOURCE\s+(\w+)\s+TYPE\s+(\w+)(?:\s+WITH\s+(.*))?$',
+                            re.IGNORECASE | re.DOTALL)
+_CREATE_SINK = re.compile(r'^CREATE\s+SINK\s+(\w+)\s+TYPE\s+(\w+)(?:\s+WITH\s+(.*))?$', re.IGNORECASE | re.DOTALL)
+_CREATE_STREAM = re.compile(r'^CREATE\s+STREAM\s+(\w+)\s+AS\s+(SELECT\s.*)$', re.IGNORECASE | re.DOTALL)
+_INSERT = re.compile(r'^INSERT\s+INTO\s+(\w+)\s+FROM\s+(\w+)$', re.IGNORECASE)
+_DROP = re.compile(r'^DROP\s+(SOURCE|STREAM|SINK)\s+(\w+)$', re.IGNORECASE)
+_EVAL = re.compile(r'^EVAL\s+(.*)$', re.IGNORECASE | re.DOTALL)
+_SELECT = re.compile(r'^SELECT\s+(?:ISTREAM|DSTREAM|RSTREAM)\s*(?:\[\s*LIMIT\s+(\d+)\s*\])?\s*(.*?)\s+'
+                     r'FROM\s+(\w+)\s*(?:\[[^\]]*\])?(?:\s+WHERE\s+(.*))?$', re.IGNORECASE | re.DOTALL)
+
+
+class StandInServer(object):
+    # Rate used for status counters of sources emitting as fast as possible.
+    UNLIMITED_STATUS_RATE = 1000.0
+
+    def __init__(self, host='127.0.0.1', port=0, rate=100.0, tuple_size=100, codec=None):
+        """
+        Stand-in SensorBee server for tests and benchmarks.
+
+        It implements the REST API (topologies, nodes and queries), ``SELECT``
+        streams over HTTP (``multipart/mixed``) and the ``wsqueries``
+        WebSocket protocol, on top of a small subset of BQL: ``CREATE
+        SOURCE``, ``CREATE STREAM ... AS SELECT``, ``CREATE SINK``, ``INSERT
+        INTO``, ``DROP``, ``EVAL`` of literal expressions and ``SELECT``
+        with ``[LIMIT n]``, projections of fields and literals and simple
+        ``WHERE`` conditions (see ``_Condition``).
+
+        Sources of the ``node_statuses`` type emit the statuses of all nodes
+        every ``interval`` seconds (1.0 by default), like the real one.
+        Sources of other types emit synthetic tuples of about ``tuple_size``
+        bytes at ``rate`` tuples per second (0 for as fast as possible); both
+        can be overridden per source with ``WITH rate = ..., tuple_size = ...``.
+        ``create_synthetic_topology`` builds a topology of arbitrary size.
+
+        Port 0 selects a free port; see ``port`` for the actual one.
+        ``active_queries`` is the number of ``SELECT`` streams being sent
+        over HTTP; a stream ends when the client goes away.
+        """
+        self.rate = rate
+        self.tuple_size = tuple_size
+        self._codec = get_codec(codec)
+        self._lock = threading.Lock()
+        self._topologies = collections.OrderedDict()
+        self._request_id = 0
+        self.active_queries = 0
+        self._started = time.time()
+        self._server = _StandInHTTPServer((host, port), _StandInHandler)
+        self._server.standin = self
+        self._thread = None
+        (self.host, self.port) = self._server.server_address[:2]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def start(self):
+        """
+        Starts serving in a background thread and returns self.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serves in the current thread until ``shutdown`` is called.
+        """
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops the server and ends all streams.
+        """
+        self._server.stopped.set()
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def create_synthetic_topology(self, name, sources=1, streams=10, sinks=1, fanout=2, rate=None,
+                                  tuple_size=None, seed=0):
+        """
+        Creates a topology of ``sources`` synthetic sources, ``streams``
+        streams and ``sinks`` sinks.  Each stream reads from a randomly chosen
+        source or earlier stream, and each sink reads from one of the last
+        streams; every node has up to about ``fanout`` outputs.  ``rate`` and
+        ``tuple_size`` configure the sources (server defaults if None).
+        """
+        rnd = random.Random(seed)
+        with self._lock:
+            if name in self._topologies:
+                raise StandInError(400, 'E0003', 'topology already exists: {0}'.format(name))
+            t = self._topologies[name] = _Topology(self, name)
+            params = {}
+            if rate is not None:
+                params['rate'] = rate
+            if tuple_size is not None:
+                params['tuple_size'] = tuple_size
+            upstreams = []
+            for i in range(sources):
+                t.add(_Node(t, 'source_{0}'.format(i), 'source', 'synthetic', dict(params)))
+                upstreams.append('source_{0}'.format(i))
+            outputs = collections.Counter()
+            for i in range(streams):
+                candidates = [u for u in upstreams if outputs[u] < fanout] or upstreams
+                parent = rnd.choice(candidates[-fanout * 4:])
+                outputs[parent] += 1
+                t.add(_Node(t, 'stream_{0}'.format(i), 'box', None, inputs=[parent]))
+                upstreams.append('stream_{0}'.format(i))
+            for i in range(sinks):
+                t.add(_Node(t, 'sink_{0}'.format(i), 'sink', 'stdout', inputs=[rnd.choice(upstreams[-fanout:])]))
+        return t.to_dict()
+
+    def _next_request_id(self):
+        with self._lock:
+            self._request_id += 1
+            return self._request_id
+
+    def _topology(self, name):
+        t = self._topologies.get(name)
+        if t is None:
+            raise StandInError(404, 'E0001', 'topology not found: {0}'.format(name))
+        return t
+
+    def runtime_status(self):
+        return {
+            'hostname': socket.gethostname(),
+            'pid': os.getpid(),
+            'gomaxprocs': 1,
+            'num_cpu': 1,
+            'num_goroutine': threading.active_count(),
+            'num_cgo_call': int(time.time() - self._started),
+            'go_version': 'stand-in',
+            'goos': 'python',
+            'goarch': 'python',
+            'working_directory': os.getcwd(),
+        }
+
+    def handle_rest(self, method, path, body):
+        """
+        Handles a REST request and returns the response object; raises
+        ``StandInError`` on failure.  ``SELECT`` queries return ``_Select``.
+        """
+        if path == ['runtime_status'] and method == 'GET':
+            return self.runtime_status()
+        if path[0:1] != ['topologies']:
+            raise StandInError(404, 'E0001', 'not found: {0}'.format('/'.join(path)))
+        with self._lock:
+            if len(path) == 1:
+                if method == 'GET':
+                    return {'topologies': [t.to_dict() for t in self._topologies.values()]}
+                if method == 'POST':
+                    name = self._codec.loads(body).get('name')
+                    if not name or name in self._topologies:
+                        raise StandInError(400, 'E0003', 'cannot create topology: {0}'.format(name))
+                    t = self._topologies[name] = _Topology(self, name)
+                    return {'topology': t.to_dict()}
+            elif len(path) == 2:
+                if method == 'DELETE':
+                    self._topologies.pop(path[1], None)
+                    return {}
+                if method == 'GET':
+                    return {'topology': self._topology(path[1]).to_dict()}
+            else:
+                t = self._topology(path[1])
+                kind = path[2]
+                if kind == 'queries' and len(path) == 3 and method == 'POST':
+                    return self._query(t, self._codec.loads(body).get('queries', ''))
+                node_types = {'sources': 'source', 'streams': 'box', 'sinks': 'sink'}
+                if kind in node_types and method == 'GET':
+                    if len(path) == 3:
+                        nodes = [n for n in t.nodes.values() if n.node_type == node_types[kind]]
+                        return {'topology': t.name, 'count': len(nodes),
+                                kind: [{'name': n.name, 'node_type': n.node_type} for n in nodes]}
+                    if len(path) == 4:
+                        return {'topology': t.name, kind[:-1]: t.get(path[3], node_types[kind]).status()}
+        raise StandInError(404, 'E0001', 'not found: {0}'.format('/'.join(path)))
+
+    def query(self, topology, queries, stopped=None):
+        """
+        Runs BQL statements in the topology.  Returns the result of the last
+        statement; a ``SELECT`` statement returns an iterable of tuples.
+        """
+        with self._lock:
+            return self._query(self._topology(topology), queries, stopped)
+
+    def _query(self, t, queries, stopped=None):
+        statements = _split(queries, ';')
+        if not statements:
+            raise StandInError(400, 'E0003', 'no statement given')
+        result = None
+        for (i, stmt) in enumerate(statements):
+            m = _SELECT.match(stmt)
+            if m:
+                if i != len(statements) - 1:
+                    raise StandInError(400, 'E0003', 'SELECT must be the last statement')
+                (limit, exprs, name, where) = m.groups()
+                node = t.get(name)
+                if node.node_type == 'sink':
+                    raise StandInError(400, 'E0003', 'sink cannot be selected: {0}'.format(name))
+                projected = _Node(t, name, 'box', None, inputs=[name], projection=_Projection(exprs),
+                                  condition=None if where is None else _Condition(where))
+                return _Select(projected, None if limit is None else int(limit),
+                               stopped if stopped is not None else self._server.stopped)
+            result = self._statement(t, stmt)
+        return result
+
+    def _params(self, text):
+        params = {}
+        for item in _split(text or '', ','):
+            (key, _, value) = item.partition('=')
+            try:
+                params[key.strip()] = _literal(value)
+            except (ValueError, SyntaxError):
+                raise StandInError(400, 'E0003', 'invalid parameter: {0}'.format(item))
+        return params
+
+    def _statement(self, t, stmt):
+        m = _CREATE_SOURCE.match(stmt)
+        if m:
+            t.add(_Node(t, m.group(1), 'source', m.group(2).lower(), self._params(m.group(3))))
+            return {'topology_name': t.name, 'status': 'running', 'name': m.group(1)}
+        m = _CREATE_STREAM.match(stmt)
+        if m:
+            s = _SELECT.match(m.group(2))
+            if not s:
+                raise StandInError(400, 'E0003', 'unsupported statement: {0}'.format(stmt))
+            t.get(s.group(3))
+            t.add(_Node(t, m.group(1), 'box', None, inputs=[s.group(3)], projection=_Projection(s.group(2)),
+                        condition=None if s.group(4) is None else _Condition(s.group(4))))
+            return {'topology_name': t.name, 'status': 'running', 'name': m.group(1)}
+        m = _CREATE_SINK.match(stmt)
+        if m:
+            t.add(_Node(t, m.group(1), 'sink', m.group(2).lower(), self._params(m.group(3))))
+            return {'topology_name': t.name, 'status': 'running', 'name': m.group(1)}
+        m = _INSERT.match(stmt)
+        if m:
+            sink = t.get(m.group(1), 'sink')
+            t.get(m.group(2))
+            sink.inputs.append(m.group(2))
+            return {}
+        m = _DROP.match(stmt)
+        if m:
+            node_type = {'source': 'source', 'stream': 'box', 'sink': 'sink'}[m.group(1).lower()]
+            del t.nodes[t.get(m.group(2), node_type).name]
+            return {}
+        m = _EVAL.match(stmt)
+        if m:
+            try:
+                return {'result': _literal(m.group(1))}
+            except (ValueError, SyntaxError, ArithmeticError, TypeError):
+                raise StandInError(400, 'E0003', 'cannot evaluate: {0}'.format(m.group(1)))
+        raise StandInError(400, 'E0003', 'unsupported statement: {0}'.format(stmt))
+
+
+class _StandInHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.stopped = threading.Event()
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    BOUNDARY = 'sensorbee-stand-in'
+
+    # Size of the buffer to send tuples emitted as fast as possible.
+    STREAM_BUFFER_SIZE = 65536
+
+    def log_message(self, format, *args):
+        pass
+
+    def _path(self):
+        path = self.path.split('?')[0].strip('/').split('/')
+        if path[0:2] != ['api', 'v1'] or len(path) < 3:
+            return None
+        return path[2:]
+
+    def _send_json(self, status, obj):
+        body = self.server.standin._codec.dumps(obj)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        standin = self.server.standin
+        body = None
+        if 'Content-Length' in self.headers:
+            body = self.rfile.read(int(self.headers['Content-Length']))
+        path = self._path()
+        try:
+            if path is None:
+                raise StandInError(404, 'E0001', 'not found: {0}'.format(self.path))
+            if len(path) == 3 and path[0] == 'topologies' and path[2] == 'wsqueries' and method == 'GET':
+                standin._topology(path[1])
+                return _WebSocketSession(self, path[1]).run()
+            result = standin.handle_rest(method, path, body)
+        except StandInError as e:
+            return self._send_json(e.status, {'error': e.to_dict(standin._next_request_id())})
+        except ValueError as e:
+            return self._send_json(400, {'error': StandInError(400, 'E0003', str(e)).to_dict(
+                standin._next_request_id())})
+        if isinstance(result, _Select):
+            return self._stream(result)
+        self._send_json(200, result)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _send_chunk(self, data):
+        self.wfile.write('{0:x}\r\n'.format(len(data)).encode() + data + b'\r\n')
+
+    def _stream(self, select):
+        codec = self.server.standin._codec
+        head = '--{0}\r\nContent-Type: application/json\r\nContent-Length: '.format(self.BOUNDARY).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/mixed; boundary={0}'.format(self.BOUNDARY))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.close_connection = True
+        # Tuples emitted as fast as possible are buffered; others are sent
+        # as soon as they are emitted.
+        buffered = select.node.rate() == 0
+        buf = []
+        size = 0
+        standin = self.server.standin
+        with standin._lock:
+            standin.active_queries += 1
+        try:
+            for d in select:
+                data = codec.dumps(d)
+                buf.append(b''.join([head, str(len(data)).encode(), b'\r\n\r\n', data, b'\r\n']))
+                size += len(buf[-1])
+                if not buffered or self.STREAM_BUFFER_SIZE <= size:
+                    self._send_chunk(b''.join(buf))
+                    self.wfile.flush()
+                    (buf, size) = ([], 0)
+            buf.append('--{0}--\r\n'.format(self.BOUNDARY).encode())
+            self._send_chunk(b''.join(buf))
+            self.wfile.write(b'0\r\n\r\n')
+        except EnvironmentError:
+            pass  # the client went away
+        finally:
+            with standin._lock:
+                standin.active_queries -= 1
+
+
+class _WebSocketSession(object):
+    def __init__(self, handler, topology):
+        """
+        Server side of the ``wsqueries`` protocol on a request upgraded to a
+        WebSocket connection (RFC 6455).
+        """
+        self._handler = handler
+        self._topology = topology
+        self._standin = handler.server.standin
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        handler = self._handler
+        key = handler.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+        handler.send_response(101, 'Switching Protocols')
+        handler.send_header('Upgrade', 'websocket')
+        handler.send_header('Connection', 'Upgrade')
+        handler.send_header('Sec-WebSocket-Accept', accept)
+        handler.end_headers()
+        handler.wfile.flush()
+        handler.close_connection = True
+        try:
+            while not self._handler.server.stopped.is_set():
+                (opcode, payload) = self._receive()
+                if opcode == 0x8:  # close
+                    self._send_frame(0x8, payload[:2])
+                    break
+                elif opcode == 0x9:  # ping
+                    self._send_frame(0xA, payload)
+                elif opcode in (0x1, 0x2):
+                    self._on_message(payload)
+        except (EnvironmentError, EOFError, ValueError):
+            pass  # the connection was lost
+        finally:
+            self._stopped.set()
+
+    def _read(self, n):
+        data = self._handler.rfile.read(n)
+        if len(data) < n:
+            raise EOFError()
+        return data
+
+    def _receive(self):
+        (message, message_opcode) = (b'', None)
+        while True:
+            (b1, b2) = struct.unpack('!BB', self._read(2))
+            (fin, opcode, masked, length) = (b1 & 0x80, b1 & 0x0F, b2 & 0x80, b2 & 0x7F)
+            if length == 126:
+                length = struct.unpack('!H', self._read(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._read(8))[0]
+            mask = self._read(4) if masked else None
+            payload = bytearray(self._read(length))
+            if mask is not None:
+                mask = bytearray(mask)
+                for i in range(length):
+                    payload[i] ^= mask[i % 4]
+            if 0x8 <= opcode:
+                return (opcode, bytes(payload))  # control frames are never fragmented
+            if opcode != 0:
+                message_opcode = opcode
+            message += bytes(payload)
+            if fin:
+                return (message_opcode, message)
+
+    def _send_frame(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            header = struct.pack('!BB', 0x80 | opcode, n)
+        elif n < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+        with self._lock:
+            self._handler.wfile.write(header + payload)
+            self._handler.wfile.flush()
+
+    def _send(self, rid, msgtype, payload):
+        data = self._standin._codec.dumps({'rid': rid, 'type': msgtype, 'payload': payload})
+        self._send_frame(0x1, data)
+
+    def _on_message(self, data):
+        standin = self._standin
+        msg = standin._codec.loads(data)
+        rid = msg.get('rid')
+        try:
+            result = standin.query(self._topology, msg['payload']['queries'], self._stopped)
+        except StandInError as e:
+            return self._send(rid, 'error', e.to_dict(standin._next_request_id()))
+        except (KeyError, TypeError, ValueError) as e:
+            return self._send(rid, 'error', StandInError(400, 'E0003', str(e)).to_dict(
+                standin._next_request_id()))
+        if not isinstance(result, _Select):
+            return self._send(rid, 'result', result)
+        t = threading.Thread(target=self._stream, args=(rid, result))
+        t.daemon = True
+        t.start()
+
+    def _stream(self, rid, select):
+        try:
+            self._send(rid, 'sos', None)
+            for d in select:
+                self._send(rid, 'result', d)
+            if not self._stopped.is_set():
+                self._send(rid, 'eos', None)
+        except EnvironmentError:
+            self._stopped.set()
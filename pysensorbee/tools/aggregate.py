@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import math
+import re
+import time
+
+try:
+    import numpy
+    _NUMPY_AVAILABLE = True
+except ImportError:
+    _NUMPY_AVAILABLE = False
+
+# For Python 3 compatibility
+try:
+    _NUMBER_TYPES = (int, long, float)
+except NameError:
+    _NUMBER_TYPES = (int, float)
+
+_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_window(s):
+    """
+    Parses a window size: a duration with a unit (``ms``, ``s``, ``m`` or
+    ``h``; e.g., ``10s``) or a number of tuples without a unit (e.g.,
+    ``1000``).  Returns a tuple of (size, count_based).  A ``ValueError`` is
+    raised if the size is invalid.
+    """
+    m = re.match(r'^\s*(\d+(?:\.\d*)?)\s*(ms|s|m|h)?\s*$', s)
+    if m is None:
+        raise ValueError('invalid window size: {0}'.format(s))
+    (value, unit) = m.groups()
+    if unit is None:
+        if '.' in value or int(value) < 1:
+            raise ValueError('number of tuples must be a positive integer: {0}'.format(s))
+        return (int(value), True)
+    size = float(value) * _UNITS[unit]
+    if size <= 0:
+        raise ValueError('window size must be positive: {0}'.format(s))
+    return (size, False)
+
+
+class QuantileSketch(object):
+    def __init__(self, accuracy=0.01):
+        """
+        Mergeable sketch to estimate quantiles with a relative ``accuracy``
+        (DDSketch): values are counted in buckets whose bounds grow by a
+        factor of ``(1 + accuracy) / (1 - accuracy)``, so an estimate is
+        within ``accuracy`` of the true value relative to it.  The number of
+        buckets grows only with the logarithm of the range of values.
+        """
+        if not 0 < accuracy < 1:
+            raise ValueError('accuracy must be between 0 and 1: {0}'.format(accuracy))
+        self.accuracy = accuracy
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = collections.Counter()  # bucket index -> count
+        self.negative = collections.Counter()  # of absolute values
+        self.zero = 0
+        self.count = 0
+
+    def _index(self, v):
+        return int(math.ceil(math.log(v) / self._log_gamma))
+
+    def add(self, values):
+        """
+        Adds finite numbers, a list or a NumPy array.
+        """
+        if _NUMPY_AVAILABLE and isinstance(values, numpy.ndarray):
+            self._add_array(values)
+            return
+        for v in values:
+            if 0 < v:
+                self.positive[self._index(v)] += 1
+            elif v < 0:
+                self.negative[self._index(-v)] += 1
+            else:
+                self.zero += 1
+        self.count += len(values)
+
+    def _add_array(self, values):
+        for (store, v) in ((self.positive, values[0 < values]), (self.negative, -values[values < 0])):
+            if len(v):
+                index = numpy.ceil(numpy.log(v) / self._log_gamma).astype(numpy.int64)
+                (keys, counts) = numpy.unique(index, return_counts=True)
+                for (k, c) in zip(keys.tolist(), counts.tolist()):
+                    store[k] += c
+        self.zero += int(numpy.count_nonzero(values == 0))
+        self.count += len(values)
+
+    def merge(self, other):
+        """
+        Adds the values counted by another sketch of the same accuracy.
+        """
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q):
+        """
+        Returns the estimated ``q``-quantile (0 to 1) by the nearest rank,
+        or None if empty.
+        """
+        if self.count == 0:
+            return None
+        rank = max(0, min(self.count - 1, int(math.ceil(self.count * q)) - 1))
+        n = 0
+        for k in sorted(self.negative, reverse=True):
+            n += self.negative[k]
+            if rank < n:
+                return -self._value(k)
+        n += self.zero
+        if rank < n:
+            return 0.0
+        for k in sorted(self.positive):
+            n += self.positive[k]
+            if rank < n:
+                return self._value(k)
+        return self._value(max(self.positive))
+
+    def _value(self, k):
+        return 2 * self._gamma ** k / (self._gamma + 1)
+
+
+def _numbers(values):
+    # Finite numbers (including booleans) among values, as floats.
+    result = []
+    for v in values:
+        if isinstance(v, _NUMBER_TYPES):
+            try:
+                f = float(v)
+            except OverflowError:
+                continue
+            if not (math.isnan(f) or math.isinf(f)):
+                result.append(f)
+    return result
+
+
+class _Stats(object):
+    def __init__(self, accuracy):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, values):
+        if _NUMPY_AVAILABLE:
+            try:
+                arr = numpy.array(values)
+            except (TypeError, ValueError, OverflowError):
+                arr = None  # e.g., nested lists of different lengths
+            if arr is not None and arr.ndim == 1 and arr.dtype.kind in 'biuf':
+                arr = arr.astype(numpy.float64)
+                arr = arr[numpy.isfinite(arr)]
+            else:
+                # Mixed with missing values, strings, etc.
+                arr = numpy.array(_numbers(values), dtype=numpy.float64)
+            if not len(arr):
+                return
+            (count, total, lo, hi) = (len(arr), float(arr.sum()), float(arr.min()), float(arr.max()))
+            values = arr
+        else:
+            values = _numbers(values)
+            if not values:
+                return
+            (count, total, lo, hi) = (len(values), math.fsum(values), min(values), max(values))
+        self.count += count
+        self.sum += total
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        self.sketch.add(values)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+
+def _getter(path):
+    keys = path.split('.')
+
+    def get(d):
+        for k in keys:
+            if not isinstance(d, dict):
+                return None
+            d = d.get(k)
+        return d
+    return get
+
+
+class WindowAggregator(object):
+    def __init__(self, fields, window, slide=None, count_based=False, group_by=None,
+                 quantiles=(0.5, 0.9, 0.99), accuracy=0.01, batch_size=1024):
+        """
+        Aggregates numeric ``fields`` of tuples over windows on the client:
+        the count, sum, mean, min, max and ``quantiles`` (estimated by
+        ``QuantileSketch`` with ``accuracy``) of each field, per value of
+        the ``group_by`` field if given.  Fields are names of top-level
+        fields or paths to nested ones separated by dots; values that are
+        not numbers are ignored.
+
+        Windows are ``window`` seconds long (time windows aligned to the
+        first tuple), or ``window`` tuples if ``count_based`` is True, and
+        start every ``slide`` (``window`` by default, i.e., tumbling
+        windows); ``window`` must be a multiple of ``slide``.  Tuples are
+        aggregated into panes of ``slide`` in batches of ``batch_size``
+        tuples, vectorized by NumPy if available, and a window is merged
+        from its panes when it closes.
+        """
+        if slide is None:
+            slide = window
+        if window <= 0 or slide <= 0:
+            raise ValueError('window and slide must be positive')
+        panes = window / slide
+        if panes < 1 or 1e-9 < abs(panes - round(panes)) or (count_based and window % slide != 0):
+            raise ValueError('window must be a multiple of slide: {0}, {1}'.format(window, slide))
+        self.fields = list(fields)
+        self.window = window
+        self.slide = slide
+        self.count_based = count_based
+        self.group_by = group_by
+        self.quantiles = list(quantiles)
+        self.accuracy = accuracy
+        self.batch_size = batch_size
+        self._panes_per_window = int(round(panes))
+        self._getters = [_getter(f) for f in self.fields]
+        self._group = None if group_by is None else _getter(group_by)
+        self._reset()
+
+    def _reset(self):
+        self._panes = {}  # pane index -> {group: [number of tuples, [_Stats of each field]]}
+        self._pane = None  # index of the current pane
+        self._origin = None
+        self._seen = 0
+        self._buffer = []
+
+    def add(self, d, timestamp=None):
+        """
+        Adds a tuple that arrived at ``timestamp`` (now if None; ignored
+        for count windows).  Returns the list of windows closed by it, each
+        a list of rows (see ``rows``).  Windows close when a tuple of a
+        later pane arrives; tuples older than the current pane are added to
+        it.
+        """
+        if self.count_based:
+            pane = self._seen // self.slide
+        else:
+            if timestamp is None:
+                timestamp = time.time()
+            if self._origin is None:
+                self._origin = timestamp
+            pane = int((timestamp - self._origin) // self.slide)
+        self._seen += 1
+        windows = []
+        if self._pane is None or self._pane < pane:
+            if self._pane is not None:
+                windows = self._close(pane)
+            self._pane = pane
+        self._buffer.append(d)
+        if self.batch_size <= len(self._buffer):
+            self._aggregate()
+        return windows
+
+    def flush(self):
+        """
+        Closes the current window as is (e.g., at the end of the stream) and
+        returns it as a list of windows like ``add``; the aggregator is
+        reset.
+        """
+        self._aggregate()
+        windows = []
+        if self._pane is not None:
+            windows = [w for w in [self.rows(self._pane)] if w]
+        self._reset()
+        return windows
+
+    def aggregate(self, tuples):
+        """
+        Aggregates an iterable of tuples (e.g., a ``ResultSet``) and yields
+        windows as they close, and the current one at the end.
+        """
+        for d in tuples:
+            for w in self.add(d):
+                yield w
+        for w in self.flush():
+            yield w
+
+    def _aggregate(self):
+        batch = self._buffer
+        if not batch:
+            return
+        self._buffer = []
+        pane = self._panes.setdefault(self._pane, {})
+        if self._group is None:
+            groups = {None: batch}
+        else:
+            groups = collections.defaultdict(list)
+            for d in batch:
+                key = self._group(d)
+                if isinstance(key, (dict, list)):
+                    key = '{0}'.format(key)
+                groups[key].append(d)
+        for (key, tuples) in groups.items():
+            g = pane.get(key)
+            if g is None:
+                g = pane[key] = [0, [_Stats(self.accuracy) for _ in self.fields]]
+            g[0] += len(tuples)
+            for (get, stats) in zip(self._getters, g[1]):
+                stats.add([get(d) for d in tuples])
+
+    def _close(self, pane):
+        # Closes windows ending before the pane; windows not covered by
+        # tuples since the beginning are skipped.
+        self._aggregate()
+        k = self._panes_per_window
+        windows = []
+        for end in range(max(self._pane, k - 1), min(pane, self._pane + k)):
+            w = self.rows(end)
+            if w:
+                windows.append(w)
+        for p in [p for p in self._panes if p <= pane - k]:
+            del self._panes[p]
+        return windows
+
+    def rows(self, end):
+        """
+        Returns the rows of the window ending with the pane ``end``: a dict
+        per group and field of ``start`` and ``end`` (times, or offsets of
+        tuples for count windows), ``group`` (if grouped), ``field``,
+        ``tuples`` (the number of tuples in the group), ``count`` (the number
+        of numbers), ``sum``, ``mean``, ``min``, ``max`` and quantiles
+        (``p50`` for 0.5, etc.), in the order of groups and fields.
+        """
+        k = self._panes_per_window
+        groups = {}
+        for p in range(end - k + 1, end + 1):
+            for (key, (n, stats)) in self._panes.get(p, {}).items():
+                g = groups.get(key)
+                if g is None:
+                    g = groups[key] = [0, [_Stats(self.accuracy) for _ in self.fields]]
+                g[0] += n
+                for (merged, s) in zip(g[1], stats):
+                    merged.merge(s)
+        (start, stop) = ((end - k + 1) * self.slide, (end + 1) * self.slide)
+        if self.count_based:
+            start = max(0, start)
+        else:
+            (start, stop) = (self._origin + start, self._origin + stop)
+        result = []
+        for key in sorted(groups, key=lambda x: (x is not None, '{0}'.format(x))):
+            (n, stats) = groups[key]
+            for (field, s) in zip(self.fields, stats):
+                row = collections.OrderedDict([('start', start), ('end', stop)])
+                if self.group_by is not None:
+                    row['group'] = key
+                row['field'] = field
+                row['tuples'] = n
+                row['count'] = s.count
+                row['sum'] = s.sum
+                row['mean'] = s.sum / s.count if s.count else None
+                row['min'] = s.min
+                row['max'] = s.max
+                for q in self.quantiles:
+                    row['p{0:g}'.format(q * 100)] = s.sketch.quantile(q)
+                result.append(row)
+        return result
@@ -2,24 +2,58 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import math
+
+from .graph import TopologyGraph
+from .spider import Spider
+
 
 class DotView(object):
-    def __init__(self, api):
+    def __init__(self, api, spider=None, threshold=0.9):
+        """
+        Renders a topology in the DOT language.  Each edge is labeled with
+        its throughput and queue fill ratio; the pen width grows with the
+        throughput, and edges with queues filled ``threshold`` or more are
+        drawn in red (or orange when half filled).
+        """
         self._api = api
-
-    def render(self, t):
+        self._spider = spider if spider is not None else Spider(api)
+        self.threshold = threshold
+
+    def render(self, t, rates=None):
+        return self.render_graph(TopologyGraph(self._spider.get_topology_status(t)), rates)
+
+    def render_graph(self, graph, rates=None):
+        """
+        Renders ``graph`` (``TopologyGraph``).  When ``rates`` computed by
+        ``RateCalculator`` is given, the throughput is tuples sent per
+        second; otherwise it is the total number of tuples sent.
+        """
         buf = ['digraph {']
 
-        for s in [x['name'] for x in self._api.sources(t)['sources']]:
-            outputs = self._api.source(t, s)['source']['status']['output_stats']['outputs']
-            for out in outputs.keys():
-                buf += ['{0} -> {1}'.format(s, out)]
-
-        for s in [x['name'] for x in self._api.streams(t)['streams']]:
-            outputs = self._api.stream(t, s)['stream']['status']['output_stats']['outputs']
-            for out in outputs.keys():
-                buf += ['{0} -> {1}'.format(s, out)]
+        for (src, dst, v) in graph.edges():
+            throughput = v['num_sent']
+            if rates is not None:
+                r = rates['nodes'].get(src, {}).get('outputs', {}).get(dst, {}).get('sent')
+                throughput = 0.0 if r is None else r
+            fill = graph.fill(src, dst)
+            attrs = [
+                'label="{0}{1} ({2})"'.format(
+                    throughput if rates is None else '{0:.1f}'.format(throughput),
+                    '' if rates is None else '/s',
+                    '-' if fill is None else '{0:.1f}%'.format(fill * 100)),
+                'penwidth={0:.2f}'.format(1 + math.log10(1 + throughput)),
+            ]
+            if fill is not None and self.threshold <= fill:
+                attrs.append('color=red')
+            elif fill is not None and 0.5 <= fill:
+                attrs.append('color=orange')
+            buf += ['{0} -> {1} [{2}]'.format(_quote(src), _quote(dst), ', '.join(attrs))]
 
         buf += ['}']
 
         return '\n'.join(buf)
+
+
+def _quote(name):
+    return '"{0}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import threading
+import time
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from .spider import Spider
+
+
+# Python 3.3 or later
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# Metric families: name, type and help.
+_FAMILIES = [
+    ('sensorbee_up', 'gauge', 'Whether the last crawl of the server succeeded.'),
+    ('sensorbee_crawl_duration_seconds', 'gauge', 'Time taken by the last crawl.'),
+    ('sensorbee_crawl_errors', 'gauge', 'Number of requests failed during the last crawl.'),
+    ('sensorbee_last_crawl_timestamp_seconds', 'gauge', 'Time when the last crawl finished.'),
+    ('sensorbee_runtime_num_goroutine', 'gauge', 'Number of goroutines.'),
+    ('sensorbee_runtime_num_cgo_call_total', 'counter', 'Number of cgo calls.'),
+    ('sensorbee_node_received_total', 'counter', 'Number of tuples received by the node.'),
+    ('sensorbee_node_errors_total', 'counter', 'Number of tuples failed to be processed by the node.'),
+    ('sensorbee_node_sent_total', 'counter', 'Number of tuples sent by the node.'),
+    ('sensorbee_node_dropped_total', 'counter', 'Number of tuples dropped by the node.'),
+    ('sensorbee_node_queued', 'gauge', 'Number of tuples queued in outputs of the node.'),
+    ('sensorbee_output_sent_total', 'counter', 'Number of tuples sent to the output.'),
+    ('sensorbee_output_queued', 'gauge', 'Number of tuples queued for the output.'),
+    ('sensorbee_output_queue_size', 'gauge', 'Capacity of the queue for the output.'),
+    ('sensorbee_output_queue_fill_ratio', 'gauge', 'Ratio of queued tuples to the queue capacity.'),
+]
+
+
+def _escape(v):
+    return '{0}'.format(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    return ','.join(['{0}="{1}"'.format(k, _escape(v)) for (k, v) in labels])
+
+
+def samples(status):
+    """
+    Returns samples of a status crawled by ``Spider.get`` as a list of
+    (metric name, labels, value), where labels is a list of (name, value).
+    """
+    result = []
+    rs = status['runtime_status']
+    result.append(('sensorbee_runtime_num_goroutine', [], rs['num_goroutine']))
+    result.append(('sensorbee_runtime_num_cgo_call_total', [], rs['num_cgo_call']))
+    for (t, ts) in sorted(status['topologies'].items()):
+        for kind in Spider.KINDS:
+            for (name, node) in sorted(ts[kind].items()):
+                labels = [('topology', t), ('node', name), ('node_type', node['node_type'])]
+                s = node['status']
+                if 'input_stats' in s:  # Stream or Sink
+                    result.append(('sensorbee_node_received_total', labels, s['input_stats']['num_received_total']))
+                    result.append(('sensorbee_node_errors_total', labels, s['input_stats']['num_errors']))
+                if 'output_stats' in s:  # Stream or Source
+                    outputs = s['output_stats']['outputs']
+                    result.append(('sensorbee_node_sent_total', labels, s['output_stats']['num_sent_total']))
+                    result.append(('sensorbee_node_dropped_total', labels, s['output_stats']['num_dropped']))
+                    result.append(('sensorbee_node_queued', labels,
+                                   sum([v['num_queued'] for v in outputs.values()])))
+                    for (out, v) in sorted(outputs.items()):
+                        out_labels = labels + [('output', out)]
+                        result.append(('sensorbee_output_sent_total', out_labels, v['num_sent']))
+                        result.append(('sensorbee_output_queued', out_labels, v['num_queued']))
+                        result.append(('sensorbee_output_queue_size', out_labels, v['queue_size']))
+                        if v['queue_size']:
+                            result.append(('sensorbee_output_queue_fill_ratio', out_labels,
+                                           v['num_queued'] / v['queue_size']))
+    return result
+
+
+class _Target(object):
+    def __init__(self, api, workers):
+        self.api = api
+        self.spider = Spider(api, workers)
+        self.server = '{0}:{1}'.format(api.host, api.port)
+        self.samples = []
+        self.up = 0
+        self.duration = None
+        self.errors = 0
+        self.timestamp = None
+        self.error = None
+
+
+class PrometheusExporter(object):
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, apis, interval=15.0, workers=8):
+        """
+        Crawls SensorBee servers (``SensorBeeAPI`` instances) every
+        ``interval`` seconds in background threads, one per server, using
+        ``Spider`` with ``workers`` threads each, and exposes the results in
+        the Prometheus text format.
+
+        The document is rendered once per crawl and cached, so the cost of
+        ``render`` (and each scrape) does not depend on the number of
+        scrapers.  Every sample has a ``server`` label (``host:port``).
+        Samples of a server are kept while its crawl fails, with
+        ``sensorbee_up`` set to 0.
+        """
+        self.interval = interval
+        self._targets = [_Target(api, workers) for api in apis]
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._document = b''
+        self._server = None
+        self._serving = False
+
+    def crawl(self, target):
+        """
+        Crawls the server once and updates the cached document.
+        """
+        started = _monotonic()
+        try:
+            status = target.spider.get()
+            (target.samples, target.up, target.error) = (samples(status), 1, None)
+        except Exception as e:
+            (target.up, target.error) = (0, e)
+        target.duration = _monotonic() - started
+        target.errors = len(target.spider.errors)
+        target.timestamp = time.time()
+        self._update()
+
+    def _run(self, target):
+        next_time = _monotonic()
+        while not self._stopped.is_set():
+            self.crawl(target)
+            # Keep the interval without drifting; skip crawls already missed.
+            next_time += self.interval
+            now = _monotonic()
+            if next_time < now:
+                next_time += ((now - next_time) // self.interval + 1) * self.interval
+            self._stopped.wait(next_time - now)
+
+    def _update(self):
+        with self._lock:
+            families = dict((name, []) for (name, _, _) in _FAMILIES)
+            for t in self._targets:
+                server = [('server', t.server)]
+                families['sensorbee_up'].append((server, t.up))
+                if t.timestamp is None:
+                    continue
+                families['sensorbee_crawl_duration_seconds'].append((server, t.duration))
+                families['sensorbee_crawl_errors'].append((server, t.errors))
+                families['sensorbee_last_crawl_timestamp_seconds'].append((server, t.timestamp))
+                for (name, labels, value) in t.samples:
+                    families[name].append((server + labels, value))
+            lines = []
+            for (name, kind, doc) in _FAMILIES:
+                if not families[name]:
+                    continue
+                lines.append('# HELP {0} {1}'.format(name, doc))
+                lines.append('# TYPE {0} {1}'.format(name, kind))
+                for (labels, value) in families[name]:
+                    lines.append('{0}{{{1}}} {2}'.format(name, _labels(labels), _format_value(value)))
+            self._document = ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def render(self):
+        """
+        Returns the cached document in the Prometheus text format (bytes).
+        """
+        return self._document
+
+    def targets(self):
+        """
+        Returns the status of each server as a list of dicts of ``server``,
+        ``up``, ``duration`` (of the last crawl in seconds), ``errors``,
+        ``timestamp`` and ``error`` (the exception raised by the last crawl).
+        """
+        return [{
+            'server': t.server, 'up': t.up, 'duration': t.duration,
+            'errors': t.errors, 'timestamp': t.timestamp, 'error': t.error,
+        } for t in self._targets]
+
+    def start(self):
+        """
+        Starts crawling in background threads and returns self.
+        """
+        self._update()
+        for target in self._targets:
+            t = threading.Thread(target=self._run, args=(target,))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def listen(self, host='127.0.0.1', port=9601):
+        """
+        Binds the HTTP server to the address.  Port 0 selects a free port;
+        see ``server_address`` for the actual address.
+        """
+        self._server = _ExporterHTTPServer((host, port), _ExporterHandler)
+        self._server.exporter = self
+        self.server_address = self._server.server_address[:2]
+
+    def serve(self):
+        """
+        Serves the document at ``/metrics`` over HTTP in the current thread
+        until ``stop`` is called.  ``listen`` must be called beforehand.
+        """
+        self._serving = True
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stops crawling and serving.
+        """
+        self._stopped.set()
+        if self._server is not None:
+            if self._serving:
+                self._server.shutdown()
+            self._server.server_close()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+def _format_value(v):
+    if isinstance(v, float):
+        return repr(v)
+    return '{0}'.format(v)
+
+
+class _ExporterHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            (status, content_type, body) = (200, PrometheusExporter.CONTENT_TYPE, self.server.exporter.render())
+        elif path == '/':
+            (status, content_type, body) = (200, 'text/html', b'<a href="/metrics">Metrics</a>\n')
+        else:
+            (status, content_type, body) = (404, 'text/plain', b'Not Found\n')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import threading
+import time
+
+from .spider import Spider
+
+
+# Python 3.3 or later
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class FleetTimeout(Exception):
+    """
+    Raised (recorded in ``FleetSpider.failures``) when a host did not
+    respond within the per-host timeout.
+    """
+    pass
+
+
+class FleetSpider(object):
+    def __init__(self, apis, workers=8, timeout=None):
+        """
+        Crawls the status of all nodes of many servers (``SensorBeeAPI``
+        instances) concurrently, one thread per server, each using ``Spider``
+        with ``workers`` threads.
+
+        Each server is given ``timeout`` seconds (no limit if None) to
+        complete its crawl; the timeout of each request is the one
+        configured in its API.  Servers that failed or timed out are left out
+        of the result and recorded in ``failures``, a dict that maps hosts
+        (``host:port``) to exceptions.  Errors tolerated by ``Spider`` are
+        recorded in ``errors`` by host, and crawl times in seconds in
+        ``durations`` by host.
+        """
+        self._spiders = [('{0}:{1}'.format(api.host, api.port), Spider(api, workers)) for api in apis]
+        self.timeout = timeout
+        self.failures = {}
+        self.errors = {}
+        self.durations = {}
+
+    @property
+    def hosts(self):
+        return [host for (host, _) in self._spiders]
+
+    def get(self):
+        """
+        Returns a dict that maps hosts to their statuses (see ``Spider.get``).
+        It takes about as long as the slowest server (up to ``timeout``).
+        """
+        results = {}
+        durations = {}
+        started = _monotonic()
+
+        def crawl(host, spider):
+            try:
+                result = spider.get()
+            except Exception as e:
+                result = e
+            # The duration is recorded first as the result may be seen as
+            # soon as it is set.
+            durations[host] = _monotonic() - started
+            results[host] = result
+
+        self.failures = {}
+        self.errors = {}
+        self.durations = {}
+        threads = []
+        for (host, spider) in self._spiders:
+            # Daemon threads so that servers timed out do not block exit.
+            t = threading.Thread(target=crawl, args=(host, spider))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        for t in threads:
+            if self.timeout is None:
+                t.join()
+            else:
+                t.join(max(0, started + self.timeout - _monotonic()))
+
+        status = {}
+        for (host, spider) in self._spiders:
+            result = results.get(host)
+            if result is None:
+                self.failures[host] = FleetTimeout('no response in {0} seconds'.format(self.timeout))
+            elif isinstance(result, Exception):
+                self.failures[host] = result
+            else:
+                status[host] = result
+                self.errors[host] = list(spider.errors)
+                self.durations[host] = durations[host]
+        return status
+
+
+def _totals(status):
+    totals = {'topologies': len(status['topologies']), 'nodes': 0,
+              'received': 0, 'errors': 0, 'sent': 0, 'queued': 0, 'dropped': 0}
+    nodes = []
+    for (t, ts) in status['topologies'].items():
+        for kind in Spider.KINDS:
+            for (name, node) in ts[kind].items():
+                n = {'topology': t, 'name': name, 'node_type': node['node_type'],
+                     'received': 0, 'errors': 0, 'sent': 0, 'queued': 0, 'dropped': 0}
+                s = node['status']
+                if 'input_stats' in s:  # Stream or Sink
+                    n['received'] = s['input_stats']['num_received_total']
+                    n['errors'] = s['input_stats']['num_errors']
+                if 'output_stats' in s:  # Stream or Source
+                    n['sent'] = s['output_stats']['num_sent_total']
+                    n['dropped'] = s['output_stats']['num_dropped']
+                    n['queued'] = sum([v['num_queued'] for v in s['output_stats']['outputs'].values()])
+                nodes.append(n)
+                totals['nodes'] += 1
+                for k in ('received', 'errors', 'sent', 'queued', 'dropped'):
+                    totals[k] += n[k]
+    return (totals, nodes)
+
+
+class FleetView(object):
+    FLAGS = {'source': '->', 'box': '::', 'sink': '<-'}
+
+    def __init__(self, spider, busiest=10):
+        """
+        Renders the status of a fleet crawled by ``FleetSpider``: totals per
+        host, the ``busiest`` nodes across the fleet (by tuples received and
+        sent) and hosts that failed to respond.
+        """
+        self._spider = spider
+        self.busiest = busiest
+
+    def render(self):
+        return self.render_status(self._spider.get(), self._spider.failures, self._spider.durations)
+
+    def render_status(self, status, failures, durations=None):
+        durations = durations or {}
+        rows = [['Host', 'Topologies', 'Nodes', 'Received', 'Error', 'Sent', 'Queued', 'Dropped', 'Crawl ms']]
+        busiest = []
+        for host in sorted(status):
+            (totals, nodes) = _totals(status[host])
+            d = durations.get(host)
+            rows.append([host] + [totals[k] for k in ('topologies', 'nodes', 'received', 'errors', 'sent', 'queued', 'dropped')] +
+                        ['-' if d is None else '{0:.1f}'.format(d * 1000)])
+            busiest += [(host, n) for n in nodes]
+        lines = ['Hosts: {0} ({1} failed)'.format(len(status) + len(failures), len(failures)), '']
+        lines += _table(rows)
+
+        busiest.sort(key=lambda x: (-(x[1]['received'] + x[1]['sent']), x[0], x[1]['topology'], x[1]['name']))
+        if busiest and self.busiest:
+            rows = [['', 'Host', 'Topology', 'Node', 'Received', 'Sent', 'Queued', 'Dropped']]
+            for (host, n) in busiest[:self.busiest]:
+                rows.append([self.FLAGS[n['node_type']], host, n['topology'], n['name'],
+                             n['received'], n['sent'], n['queued'], n['dropped']])
+            lines += ['', 'Busiest Nodes:', ''] + _table(rows, 4)
+
+        if failures:
+            rows = [['Host', 'Error']]
+            for host in sorted(failures):
+                e = failures[host]
+                rows.append([host, getattr(e, 'error_message', None) or '{0}: {1}'.format(type(e).__name__, e)])
+            lines += ['', 'Failed Hosts:', ''] + _table(rows, 2)
+
+        return '\n'.join(lines)
+
+
+def _table(rows, left=1):
+    # The first ``left`` columns are aligned to the left, others to the right.
+    rows = [['{0}'.format(v) for v in row] for row in rows]
+    colsize = [max([len(row[i]) for row in rows]) for i in range(len(rows[0]))]
+    return ['   '.join([v.ljust(colsize[i]) if i < left else v.rjust(colsize[i]) for (i, v) in enumerate(row)]).rstrip()
+            for row in rows]
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+from .spider import Spider
+
+
+class TopologyGraph(object):
+    def __init__(self, ts):
+        """
+        Graph of a topology built from its status (``Spider.get_topology_status``).
+
+        ``nodes`` maps node names to their statuses, and ``outputs`` and
+        ``inputs`` map node names to the sorted lists of names of nodes
+        connected to/from them.  Outputs to nodes not in the status (e.g.,
+        deleted during the crawl) are kept in ``outputs`` and listed in
+        ``missing``.
+        """
+        self.nodes = {}
+        for kind in Spider.KINDS:
+            self.nodes.update(ts[kind])
+        self.outputs = {}
+        self.inputs = dict((name, []) for name in self.nodes)
+        missing = set()
+        for name in sorted(self.nodes):
+            outs = sorted(self._outputs(name))
+            self.outputs[name] = outs
+            for out in outs:
+                if out in self.inputs:
+                    self.inputs[out].append(name)
+                else:
+                    missing.add(out)
+        self.missing = sorted(missing)
+
+    def _outputs(self, name):
+        status = self.nodes[name]['status']
+        if 'output_stats' not in status:  # Sink
+            return {}
+        return status['output_stats']['outputs']
+
+    def names(self, node_type):
+        """
+        Returns the sorted list of names of ``source``, ``box`` or ``sink`` nodes.
+        """
+        return sorted([n for (n, s) in self.nodes.items() if s['node_type'] == node_type])
+
+    def edges(self):
+        """
+        Returns the list of edges as tuples of (source name, destination name,
+        output stats).
+        """
+        return [(name, out, self._outputs(name)[out]) for name in sorted(self.nodes) for out in self.outputs[name]]
+
+    def fill(self, src, dst):
+        """
+        Returns the ratio of queued tuples to the queue size of the edge, or
+        None if the queue size is unknown.
+        """
+        v = self._outputs(src)[dst]
+        if not v['queue_size']:
+            return None
+        return v['num_queued'] / v['queue_size']
+
+    def reachable(self):
+        """
+        Returns the list of names of nodes reachable from sources in the
+        breadth-first order; outputs of each node are visited in the sorted
+        order.  Sources are not included.
+        """
+        visited = set()
+        result = []
+        targets = self.names('source')
+        while targets:
+            targets2 = []
+            for t in targets:
+                for out in self.outputs.get(t, ()):
+                    if out in visited or out not in self.nodes:
+                        continue
+                    visited.add(out)
+                    result.append(out)
+                    targets2.append(out)
+            targets = targets2
+        return result
+
+    def order(self):
+        """
+        Returns the list of node names in the order to display:
+
+        1. Sources
+        2. Connected Streams
+        3. Dangling Streams
+        4. Connected Sinks
+        5. Dangling Sinks
+        """
+        connected = self.reachable()
+        found = set(connected)
+        streams = self.names('box')
+        sinks = self.names('sink')
+        return \
+            self.names('source') + \
+            [s for s in connected if self.nodes[s]['node_type'] == 'box'] + \
+            [s for s in streams   if s not in found] + \
+            [s for s in connected if self.nodes[s]['node_type'] == 'sink'] + \
+            [s for s in sinks     if s not in found]
+
+    def dangling(self):
+        """
+        Returns the sorted list of names of streams and sinks not reachable
+        from any source.
+        """
+        found = set(self.reachable())
+        return sorted([n for (n, s) in self.nodes.items() if s['node_type'] != 'source' and n not in found])
+
+    def topological_order(self):
+        """
+        Returns the list of node names in a topological order; nodes in or
+        downstream of cycles are not included.  Ties are broken by names.
+        """
+        degree = dict((name, len(ins)) for (name, ins) in self.inputs.items())
+        queue = collections.deque(sorted([n for (n, d) in degree.items() if d == 0]))
+        result = []
+        while queue:
+            name = queue.popleft()
+            result.append(name)
+            for out in self.outputs[name]:
+                if out not in degree:
+                    continue
+                degree[out] -= 1
+                if degree[out] == 0:
+                    queue.append(out)
+        return result
+
+    def cycles(self):
+        """
+        Returns the list of cycles (strongly connected components with more
+        than one node, or a node connected to itself) as sorted lists of
+        node names.
+        """
+        # Tarjan's algorithm without recursion.
+        outputs = dict((name, [out for out in self.outputs[name] if out in self.nodes]) for name in self.nodes)
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        result = []
+        for root in sorted(self.nodes):
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                (name, i) = work.pop()
+                if i == 0:
+                    index[name] = lowlink[name] = len(index)
+                    stack.append(name)
+                    on_stack.add(name)
+                outs = outputs[name]
+                if i < len(outs):
+                    work.append((name, i + 1))
+                    out = outs[i]
+                    if out not in index:
+                        work.append((out, 0))
+                    elif out in on_stack:
+                        lowlink[name] = min(lowlink[name], index[out])
+                    continue
+                if lowlink[name] == index[name]:
+                    component = []
+                    while True:
+                        n = stack.pop()
+                        on_stack.discard(n)
+                        component.append(n)
+                        if n == name:
+                            break
+                    if 1 < len(component) or name in self.outputs[name]:
+                        result.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[name])
+        return sorted(result)
+
+    def backpressure(self, threshold=0.9):
+        """
+        Finds bottlenecks: nodes with an input queue filled ``threshold`` or
+        more whose own output queues are not.  Returns a list of dicts of
+        ``node``, ``fill`` (the highest fill ratio of its input queues),
+        ``inputs`` (tuples of (source name, fill ratio) of the filled queues),
+        ``upstream`` (names of nodes backpressured by it, i.e., connected to
+        it through filled queues, nearest first) and ``dropped`` (the number
+        of tuples dropped by the node and the upstream nodes), sorted by
+        ``fill`` in the descending order.
+        """
+        congested = collections.defaultdict(list)  # destination -> [(source, fill)]
+        for (src, dst, _) in self.edges():
+            fill = self.fill(src, dst)
+            if fill is not None and threshold <= fill:
+                congested[dst].append((src, fill))
+
+        result = []
+        for (node, inputs) in congested.items():
+            if any([out in congested for out in self.outputs.get(node, ())]):
+                continue  # backpressured by another node downstream
+            upstream = []
+            visited = set([node])
+            targets = [node]
+            while targets:
+                targets2 = []
+                for t in targets:
+                    for (src, _) in congested.get(t, ()):
+                        if src not in visited:
+                            visited.add(src)
+                            upstream.append(src)
+                            targets2.append(src)
+                targets = targets2
+            result.append({
+                'node': node,
+                'fill': max([fill for (_, fill) in inputs]),
+                'inputs': inputs,
+                'upstream': upstream,
+                'dropped': sum([self._dropped(n) for n in [node] + upstream]),
+            })
+        return sorted(result, key=lambda x: (-x['fill'], x['node']))
+
+    def _dropped(self, name):
+        if name not in self.nodes:
+            return 0
+        status = self.nodes[name]['status']
+        if 'output_stats' not in status:  # Sink
+            return 0
+        return status['output_stats']['num_dropped']
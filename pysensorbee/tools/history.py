@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import math
+import threading
+
+from ..codec import get_codec
+from .recorder import Recording, SegmentWriter
+
+
+_NAN = float('nan')
+
+
+class _Ring(object):
+    def __init__(self, step, capacity):
+        """
+        Values of a series in ``capacity`` buckets of ``step`` seconds, the
+        last value in each bucket being kept.  Buckets are aligned to
+        multiples of ``step``, so only values and offsets of timestamps from
+        the start of buckets are stored; empty buckets are NaN.
+        """
+        self.step = step
+        self.capacity = capacity
+        self.values = array.array(str('d'), [_NAN]) * capacity
+        self.offsets = array.array(str('f'), [0.0]) * capacity
+        self.last = None  # index of the newest bucket
+
+    def put(self, timestamp, value):
+        b = int(timestamp // self.step)
+        if self.last is None:
+            self.last = b
+        elif b <= self.last - self.capacity:
+            return  # too old
+        elif self.last < b:
+            # Clear buckets skipped since the newest one.
+            for i in range(self.last + 1, min(b, self.last + self.capacity + 1)):
+                self.values[i % self.capacity] = _NAN
+            self.last = b
+        self.values[b % self.capacity] = value
+        self.offsets[b % self.capacity] = timestamp - b * self.step
+
+    def get(self, start, end):
+        """
+        Returns the list of (timestamp, value) of non-empty buckets between
+        ``start`` and ``end`` (inclusive).
+        """
+        if self.last is None:
+            return []
+        first = max(int(start // self.step), self.last - self.capacity + 1)
+        last = min(int(end // self.step), self.last)
+        result = []
+        for b in range(first, last + 1):
+            i = b % self.capacity
+            (t, v) = (b * self.step + self.offsets[i], self.values[i])
+            if not math.isnan(v) and start <= t <= end:
+                result.append((t, v))
+        return result
+
+
+class HistoryStore(object):
+    # Counters and gauges recorded for each node.
+    METRICS = ('received', 'errors', 'sent', 'dropped', 'queued')
+    GAUGES = ('queued',)
+
+    # Downsampling tiers: bucket size in seconds and number of buckets;
+    # 10 minutes in 1s, 12 hours in 1m and 2 weeks in 1h by default.
+    TIERS = ((1, 600), (60, 720), (3600, 336))
+
+    def __init__(self, path=None, tiers=TIERS, segment_size=16 * 1024 * 1024, max_segments=None):
+        """
+        Keeps the history of counters of nodes (``METRICS``) in memory, in
+        ring buffers of fixed size per series for each of ``tiers``.
+
+        When ``path`` is given, each sample is also appended to segments in
+        the directory (see ``SegmentWriter``) rotated at ``segment_size``
+        bytes, keeping up to ``max_segments`` segments (no limit if None).
+        Samples already in the directory are loaded first, so the history
+        survives restarts.  Thread-safe.
+        """
+        self.tiers = tiers
+        self._series = {}  # (topology, node) -> {metric: [_Ring for each tier]}
+        self._lock = threading.Lock()
+        self._writer = None
+        if path is not None:
+            codec = get_codec()
+            with Recording(path) as recording:
+                for (timestamps, batch) in recording.iter_batches(1024, timestamps=True):
+                    for (timestamp, data) in zip(timestamps, batch):
+                        self._put(timestamp, codec.loads(data))
+            self._writer = SegmentWriter(path, segment_size, max_segments=max_segments)
+
+    def close(self):
+        """
+        Closes the segment being written.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+
+    def record(self, timestamp, topology, topology_status):
+        """
+        Records the topology status (``Spider.get_topology_status``) of
+        ``topology`` crawled at ``timestamp``.
+        """
+        sample = {'topology': topology, 'nodes': {}}
+        for kind in ('sources', 'streams', 'sinks'):
+            for (name, node) in topology_status[kind].items():
+                sample['nodes'][name] = self._values(node['status'])
+        with self._lock:
+            self._put(timestamp, sample)
+            if self._writer is not None:
+                self._writer.append(sample, timestamp)
+                self._writer.flush()
+
+    def _values(self, status):
+        v = [None] * len(self.METRICS)
+        if 'input_stats' in status:  # Stream or Sink
+            s = status['input_stats']
+            (v[0], v[1]) = (s['num_received_total'], s['num_errors'])
+        if 'output_stats' in status:  # Stream or Source
+            s = status['output_stats']
+            (v[2], v[3]) = (s['num_sent_total'], s['num_dropped'])
+            v[4] = sum([x['num_queued'] for x in s['outputs'].values()])
+        return v
+
+    def _put(self, timestamp, sample):
+        t = sample['topology']
+        for (name, values) in sample['nodes'].items():
+            series = self._series.get((t, name))
+            if series is None:
+                series = self._series[(t, name)] = dict(
+                    (m, [_Ring(step, capacity) for (step, capacity) in self.tiers]) for m in self.METRICS)
+            for (m, v) in zip(self.METRICS, values):
+                if v is not None:
+                    for ring in series[m]:
+                        ring.put(timestamp, v)
+
+    def series(self):
+        """
+        Returns the sorted list of (topology, node) recorded.
+        """
+        with self._lock:
+            return sorted(self._series.keys())
+
+    def _ring(self, topology, node, metric, window):
+        # The finest tier covering the window.
+        rings = self._series.get((topology, node), {}).get(metric)
+        if rings is None:
+            return None
+        for ring in rings:
+            if window <= ring.step * ring.capacity:
+                return ring
+        return rings[-1]
+
+    def samples(self, topology, node, metric, window, end=None):
+        """
+        Returns the list of (timestamp, value) of the metric in ``window``
+        seconds until ``end`` (the latest sample if None), from the finest
+        tier covering the window; the last sample in each bucket is taken.
+        """
+        with self._lock:
+            ring = self._ring(topology, node, metric, window)
+            if ring is None or ring.last is None:
+                return []
+            if end is None:
+                end = (ring.last + 1) * ring.step
+            return ring.get(end - window, end)
+
+    def rates(self, topology, node, metric, window, end=None):
+        """
+        Returns the list of (timestamp, value per second) of a counter
+        between consecutive samples in the window.  Counter resets (e.g.,
+        on restart of the node) are taken as restarts from 0.
+        """
+        samples = self.samples(topology, node, metric, window, end)
+        result = []
+        for ((t0, v0), (t1, v1)) in zip(samples, samples[1:]):
+            result.append((t1, (v1 - v0 if v0 <= v1 else v1) / (t1 - t0)))
+        return result
+
+    def rate(self, topology, node, metric, window, end=None):
+        """
+        Returns the average rate per second of a counter over the window, or
+        None if there are less than two samples.
+        """
+        samples = self.samples(topology, node, metric, window, end)
+        if len(samples) < 2:
+            return None
+        total = sum([v1 - v0 if v0 <= v1 else v1 for ((_, v0), (_, v1)) in zip(samples, samples[1:])])
+        return total / (samples[-1][0] - samples[0][0])
+
+    def percentile(self, topology, node, metric, p, window, end=None):
+        """
+        Returns the ``p``-th percentile (0 to 100) of rates of a counter, or
+        of values of a gauge (``GAUGES``), over the window, or None if there
+        is no data.
+        """
+        if metric in self.GAUGES:
+            values = [v for (_, v) in self.samples(topology, node, metric, window, end)]
+        else:
+            values = [v for (_, v) in self.rates(topology, node, metric, window, end)]
+        if not values:
+            return None
+        values.sort()
+        return values[max(0, min(len(values) - 1, int(math.ceil(len(values) * p / 100)) - 1))]
+
+    def trend(self, topology, node, metric, points=20):
+        """
+        Returns up to ``points`` latest rates of a counter, or values of a
+        gauge, in the finest tier, oldest first.
+        """
+        with self._lock:
+            rings = self._series.get((topology, node), {}).get(metric)
+            if rings is None or rings[0].last is None:
+                return []
+            ring = rings[0]
+            samples = ring.get((ring.last - ring.capacity + 1) * ring.step, (ring.last + 1) * ring.step)
+        if metric in self.GAUGES:
+            return [v for (_, v) in samples[-points:]]
+        samples = samples[-points - 1:]
+        return [(v1 - v0 if v0 <= v1 else v1) / (t1 - t0) for ((t0, v0), (t1, v1)) in zip(samples, samples[1:])]
+
+
+SPARKS = '▁▂▃▄▅▆▇█'
+ASCII_SPARKS = '_.:-=+*#'
+
+def sparkline(values, sparks=SPARKS):
+    """
+    Renders values as a sparkline, scaled from 0 to the maximum value, with
+    the characters of ``sparks`` from the lowest to the highest level (e.g.,
+    ``ASCII_SPARKS`` for terminals that cannot display block elements).
+    """
+    top = max(values) if values else 0
+    if top <= 0:
+        return sparks[0] * len(values)
+    return ''.join([sparks[int(round(max(v, 0) / top * (len(sparks) - 1)))] for v in values])
@@ -2,15 +2,134 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import fnmatch
+import threading
+import time
+
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
 
 class Peeker(object):
     def __init__(self, api):
         self._api = api
 
-    def peek(self, topology, stream, count, expressions='*'):
+    def _query(self, stream, count, expressions):
         limit = ''
         if count != 0:
             limit = '[LIMIT {0}]'.format(count)
-        query = 'SELECT RSTREAM {0} {1} FROM {2} [RANGE 1 TUPLES];'.format(limit, expressions, stream)
-        for data in self._api.query(topology, query):
-            yield data
+        return 'SELECT RSTREAM {0} {1} FROM {2} [RANGE 1 TUPLES];'.format(limit, expressions, stream)
+
+    def peek(self, topology, stream, count, expressions='*', max_string_length=None):
+        """
+        Yields tuples of the stream.  Strings longer than
+        ``max_string_length`` characters are replaced with stubs while
+        decoding (see ``ResultSet.project``).  The query is stopped when the
+        generator is closed.
+        """
+        with self._api.query(topology, self._query(stream, count, expressions)) as rs:
+            for data in self._tuples(rs, max_string_length):
+                yield data
+
+    def _tuples(self, rs, max_string_length):
+        if max_string_length is None:
+            return rs
+        return rs.project(max_string_length=max_string_length)
+
+    def expand(self, topology, patterns):
+        """
+        Returns the list of stream names matching ``patterns``.  Patterns
+        containing glob characters (``*``, ``?`` or ``[``) are matched
+        against the streams in the topology; others are used as is.
+        A ``ValueError`` is raised if a pattern does not match any stream.
+        """
+        names = None
+        streams = []
+        for p in patterns:
+            if not any(c in p for c in '*?['):
+                matched = [p]
+            else:
+                if names is None:
+                    names = sorted([x['name'] for x in self._api.streams(topology)['streams']])
+                matched = fnmatch.filter(names, p)
+                if not matched:
+                    raise ValueError('no stream matches: {0}'.format(p))
+            streams.extend([s for s in matched if s not in streams])
+        return streams
+
+    def peek_many(self, topology, streams, count, expressions='*', duration=None, maxsize=1024,
+                  max_string_length=None):
+        """
+        Peeks the streams concurrently and yields ``(stream, timestamp,
+        tuple)`` in the order tuples arrived, where ``timestamp`` is the
+        arrival time in seconds since the epoch.
+
+        Stops after ``count`` tuples in total (0 for infinite) or after
+        ``duration`` seconds (None for no limit), whichever comes first.
+        Up to ``maxsize`` tuples received but not consumed yet are buffered;
+        readers wait while the buffer is full.  If a query fails, the others
+        are stopped and the error is raised.  See ``peek`` for
+        ``max_string_length``.
+        """
+        q = queue.Queue(maxsize)
+        stopped = threading.Event()
+        lock = threading.Lock()
+        results = []
+        end = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read(stream):
+            try:
+                rs = self._api.query(topology, self._query(stream, count, expressions))
+                with lock:
+                    results.append(rs)
+                    if stopped.is_set():
+                        rs.close()
+                for d in self._tuples(rs, max_string_length):
+                    if not put((stream, time.time(), d)):
+                        return
+                item = (stream, end, None)
+            except Exception as e:
+                item = (stream, end, e)
+            put(item)
+
+        for s in streams:
+            t = threading.Thread(target=read, args=(s,))
+            t.daemon = True
+            t.start()
+
+        deadline = None if duration is None else time.time() + duration
+        (running, n) = (len(streams), 0)
+        try:
+            while running and (count == 0 or n < count):
+                try:
+                    if deadline is None:
+                        (stream, ts, d) = q.get()
+                    else:
+                        (stream, ts, d) = q.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    return
+                if ts is end:
+                    running -= 1
+                    if d is not None:
+                        raise d
+                    continue
+                n += 1
+                yield (stream, ts, d)
+        finally:
+            with lock:
+                stopped.set()
+                for rs in results:
+                    rs.close()
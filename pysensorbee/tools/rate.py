@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+
+
+class RateCalculator(object):
+    def __init__(self, history=3600):
+        """
+        Computes per-node rates from successive status snapshots.
+
+        The runtime status values ``num_goroutine`` and ``num_cgo_call`` of
+        the last ``history`` snapshots are kept to track them over time.
+        """
+        self._prev = None
+        self.runtime_history = collections.deque(maxlen=history)
+
+    def update(self, timestamp, runtime_status, topology_status):
+        """
+        Adds a snapshot taken at ``timestamp`` (in seconds) and returns the
+        rates since the previous snapshot, or None for the first snapshot.
+
+        The rates are a dict with ``runtime`` and ``nodes`` keys.  ``nodes``
+        maps node names to dicts of ``received``, ``errors``, ``sent`` and
+        ``dropped`` per second, the change of the number of queued tuples
+        (``queued``), and per-output ``sent`` and ``queued`` (``outputs``).
+        Values are None when unavailable, e.g., the node has just appeared or
+        its counters were reset.
+        """
+        self.runtime_history.append(
+            (timestamp, runtime_status['num_goroutine'], runtime_status['num_cgo_call']))
+        counters = {}
+        for kind in ('sources', 'streams', 'sinks'):
+            for (name, s) in topology_status[kind].items():
+                counters[name] = self._counters(s['status'])
+
+        prev = self._prev
+        self._prev = (timestamp, runtime_status, counters)
+        if prev is None:
+            return None
+        (prev_timestamp, prev_runtime_status, prev_counters) = prev
+        elapsed = timestamp - prev_timestamp
+        if elapsed <= 0:
+            return None
+
+        goroutines = [x[1] for x in self.runtime_history]
+        rates = {
+            'runtime': {
+                'num_goroutine': runtime_status['num_goroutine'],
+                'num_goroutine_delta': runtime_status['num_goroutine'] - prev_runtime_status['num_goroutine'],
+                'num_goroutine_min': min(goroutines),
+                'num_goroutine_max': max(goroutines),
+                'num_cgo_call_rate': self._rate(
+                    runtime_status['num_cgo_call'], prev_runtime_status['num_cgo_call'], elapsed),
+            },
+            'nodes': {},
+        }
+        for (name, c) in counters.items():
+            p = prev_counters.get(name, {})
+            rates['nodes'][name] = {
+                'received': self._rate(c.get('received'), p.get('received'), elapsed),
+                'errors': self._rate(c.get('errors'), p.get('errors'), elapsed),
+                'sent': self._rate(c.get('sent'), p.get('sent'), elapsed),
+                'dropped': self._rate(c.get('dropped'), p.get('dropped'), elapsed),
+                'queued': self._delta(c.get('queued'), p.get('queued')),
+                'outputs': dict((out, {
+                    'sent': self._rate(v['sent'], p.get('outputs', {}).get(out, {}).get('sent'), elapsed),
+                    'queued': self._delta(v['queued'], p.get('outputs', {}).get(out, {}).get('queued')),
+                }) for (out, v) in c.get('outputs', {}).items()),
+            }
+        return rates
+
+    def _counters(self, status):
+        c = {}
+        if 'input_stats' in status:  # Stream or Sink
+            s = status['input_stats']
+            c['received'] = s['num_received_total']
+            c['errors'] = s['num_errors']
+        if 'output_stats' in status:  # Stream or Source
+            s = status['output_stats']
+            c['sent'] = s['num_sent_total']
+            c['dropped'] = s['num_dropped']
+            c['outputs'] = dict((out, {'sent': v['num_sent'], 'queued': v['num_queued']})
+                                for (out, v) in s['outputs'].items())
+            c['queued'] = sum([v['queued'] for v in c['outputs'].values()])
+        return c
+
+    def _rate(self, cur, prev, elapsed):
+        if cur is None or prev is None or cur < prev:
+            return None
+        return (cur - prev) / elapsed
+
+    def _delta(self, cur, prev):
+        if cur is None or prev is None:
+            return None
+        return cur - prev
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from ..codec import get_codec
+from .peeker import Peeker
+
+
+# Index record: arrival timestamp, offset and length of the tuple in the
+# data file of the segment.
+_INDEX_RECORD = struct.Struct('<dQI')
+
+
+def _segment_paths(path, seq):
+    base = os.path.join(path, '{0:08d}'.format(seq))
+    return (base + '.data', base + '.index')
+
+def _segment_seq(data_path):
+    return int(os.path.basename(data_path)[:8])
+
+
+class SegmentWriter(object):
+    def __init__(self, path, segment_size=64 * 1024 * 1024, codec=None, max_segments=None):
+        """
+        Appends tuples to a recording in the directory ``path``.
+
+        A recording consists of segments; each segment is a pair of a data
+        file holding encoded tuples (one JSON per line) and an index file
+        holding the arrival timestamp, offset and length of each tuple.  A
+        new segment is started once the data file reaches ``segment_size``
+        bytes.  Appending to an existing recording starts a new segment.
+        When ``max_segments`` is given, the oldest segments are removed
+        so that no more than ``max_segments`` segments are kept.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.count = 0
+        self._codec = get_codec(codec)
+        segments = Recording._list_segments(path)
+        self._seq = _segment_seq(segments[-1][0]) if segments else 0
+        self._data = None
+        self._index = None
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open(self):
+        self._seq += 1
+        if self.max_segments is not None:
+            # Keep room for the new segment.
+            segments = Recording._list_segments(self.path)
+            for (data_path, index_path) in segments[:max(0, len(segments) - self.max_segments + 1)]:
+                os.remove(index_path)
+                os.remove(data_path)
+        (data_path, index_path) = _segment_paths(self.path, self._seq)
+        self._data = open(data_path, 'wb')
+        self._index = open(index_path, 'wb')
+        self._offset = 0
+
+    def _close_segment(self):
+        # The data must be on disk before the index refers to it.
+        self._data.close()
+        self._index.close()
+        (self._data, self._index) = (None, None)
+
+    def append(self, d, timestamp=None):
+        """
+        Appends a tuple received at ``timestamp`` (now if omitted).
+        """
+        self.append_raw(self._codec.dumps(d), timestamp)
+
+    def append_raw(self, data, timestamp=None):
+        """
+        Appends an encoded tuple (``bytes``) received at ``timestamp``.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self._data is None:
+            self._open()
+        self._data.write(data)
+        self._data.write(b'\n')
+        self._index.write(_INDEX_RECORD.pack(timestamp, self._offset, len(data)))
+        self._offset += len(data) + 1
+        self.count += 1
+        if self.segment_size <= self._offset:
+            self._close_segment()
+
+    def flush(self):
+        """
+        Writes buffered tuples to the files.
+        """
+        if self._data is not None:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self):
+        """
+        Closes the current segment.
+        """
+        if self._data is not None:
+            self._close_segment()
+
+
+class Recorder(object):
+    def __init__(self, api, path, segment_size=64 * 1024 * 1024):
+        """
+        Records tuples emitted by streams to the directory ``path``.  See
+        ``SegmentWriter`` for the format.
+        """
+        self._api = api
+        self.path = path
+        self.segment_size = segment_size
+
+    def record(self, topology, streams, count=0, duration=None, expressions='*'):
+        """
+        Records tuples of the streams until ``count`` tuples (0 for infinite)
+        are recorded or ``duration`` seconds (None for no limit) have passed,
+        and returns the number of tuples recorded.  ``streams`` can be a
+        stream name or a list of them.
+        """
+        if not isinstance(streams, (list, tuple)):
+            streams = [streams]
+        with SegmentWriter(self.path, self.segment_size, self._api.codec) as writer:
+            for (_, timestamp, d) in Peeker(self._api).peek_many(
+                    topology, streams, count, expressions, duration):
+                writer.append(d, timestamp)
+            return writer.count
+
+
+class _Segment(object):
+    def __init__(self, data_path, index_path):
+        with open(index_path, 'rb') as f:
+            index = f.read()
+        size = os.path.getsize(data_path)
+        self.timestamps = []
+        self.offsets = []
+        self.lengths = []
+        # Ignore a partially written record and tuples not written yet,
+        # which happens when the recording is still in progress.
+        for i in range(len(index) // _INDEX_RECORD.size):
+            (timestamp, offset, length) = _INDEX_RECORD.unpack_from(index, i * _INDEX_RECORD.size)
+            if size < offset + length:
+                break
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+        self._file = open(data_path, 'rb')
+        self._mmap = None
+        self._view = None
+        if size:
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                self._view = memoryview(self._mmap)
+            except TypeError:
+                # Python 2: mmap does not support the new buffer protocol.
+                self._view = self._mmap
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, i):
+        offset = self.offsets[i]
+        return self._view[offset:offset + self.lengths[i]]
+
+    def close(self):
+        view = self._view
+        if view is not None and hasattr(view, 'release'):
+            view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views are still referenced; the mapping is released when
+                # they are garbage collected.
+                pass
+        self._file.close()
+
+
+class Recording(object):
+    def __init__(self, path, codec=None):
+        """
+        Reads a recording written by ``SegmentWriter``.
+
+        Segments are memory-mapped; tuples are referred to by their position
+        in the recording (0 to ``len(recording) - 1``).  Raw tuples returned
+        by ``iter_batches`` are views of the mapped files, which are only
+        valid until the recording is closed.
+        """
+        self.path = path
+        self._codec = get_codec(codec)
+        self._segments = []
+        self._starts = []  # position of the first tuple of each segment
+        n = 0
+        for (data_path, index_path) in self._list_segments(path):
+            segment = _Segment(data_path, index_path)
+            if len(segment) == 0:
+                segment.close()
+                continue
+            self._segments.append(segment)
+            self._starts.append(n)
+            n += len(segment)
+        self._count = n
+
+    @staticmethod
+    def _list_segments(path):
+        if not os.path.isdir(path):
+            return []
+        names = sorted([x for x in os.listdir(path) if re.match(r'^\d{8}\.data$', x)])
+        return [_segment_paths(path, int(x[:8])) for x in names]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for batch in self.iter_batches(1024):
+            for data in batch:
+                yield self._codec.loads(data)
+
+    def _locate(self, pos):
+        i = bisect.bisect_right(self._starts, pos) - 1
+        return (self._segments[i], pos - self._starts[i])
+
+    def timestamp(self, pos):
+        """
+        Returns the arrival timestamp of the tuple at ``pos``.
+        """
+        (segment, i) = self._locate(pos)
+        return segment.timestamps[i]
+
+    def start_time(self):
+        """
+        Returns the timestamp of the first tuple, or None if empty.
+        """
+        return self.timestamp(0) if self._count else None
+
+    def end_time(self):
+        """
+        Returns the timestamp of the last tuple, or None if empty.
+        """
+        return self.timestamp(self._count - 1) if self._count else None
+
+    def seek(self, timestamp):
+        """
+        Returns the position of the first tuple received at or after
+        ``timestamp`` (``len(recording)`` if there is no such tuple).
+        """
+        for (segment, start) in zip(self._segments, self._starts):
+            if timestamp <= segment.timestamps[-1]:
+                return start + bisect.bisect_left(segment.timestamps, timestamp)
+        return self._count
+
+    def get(self, pos):
+        """
+        Returns the decoded tuple at ``pos``.
+        """
+        (segment, i) = self._locate(pos)
+        return self._codec.loads(segment.get(i))
+
+    def iter_batches(self, size, start=None, end=None, timestamps=False):
+        """
+        Iterates over raw tuples (``memoryview`` of encoded JSON) received
+        between ``start`` (inclusive) and ``end`` (exclusive) timestamps in
+        batches of up to ``size`` tuples.  Batches do not span segments.
+        When ``timestamps`` is True, each batch is a pair of lists of
+        timestamps and raw tuples.
+        """
+        if size < 1:
+            raise ValueError('batch size must be positive: {0}'.format(size))
+        pos = 0 if start is None else self.seek(start)
+        stop = self._count if end is None else self.seek(end)
+        while pos < stop:
+            (segment, i) = self._locate(pos)
+            j = min(len(segment), i + size, i + stop - pos)
+            batch = [segment.get(k) for k in range(i, j)]
+            if timestamps:
+                yield (segment.timestamps[i:j], batch)
+            else:
+                yield batch
+            pos += j - i
+
+    def close(self):
+        """
+        Unmaps the segments.
+        """
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        self._starts = []
+        self._count = 0
+
+
+class _ReplayHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    BOUNDARY = 'sensorbee-replay'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, code, obj):
+        body = self.server.replay._codec.dumps(obj)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write('{0:x}\r\n'.format(len(data)).encode() + data + b'\r\n')
+
+    def do_GET(self):
+        replay = self.server.replay
+        path = self.path.split('?')[0].strip('/').split('/')
+        if path == ['api', 'v1', 'topologies']:
+            return self._send_json(200, {'topologies': [{'name': replay.topology}]})
+        if path == ['api', 'v1', 'topologies', replay.topology, 'streams']:
+            return self._send_json(200, {'topology': replay.topology, 'count': 1,
+                                         'streams': [{'name': replay.stream}]})
+        self._send_json(404, {'error': {'code': 'E0001', 'message': 'not found', 'meta': {}}})
+
+    def do_POST(self):
+        replay = self.server.replay
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?')[0].strip('/').split('/')
+        if path != ['api', 'v1', 'topologies', replay.topology, 'queries']:
+            return self._send_json(404, {'error': {'code': 'E0001', 'message': 'not found', 'meta': {}}})
+        query = replay._codec.loads(body)['queries']
+        if not query.strip().upper().startswith('SELECT'):
+            return self._send_json(400, {'error': {
+                'code': 'E0002', 'message': 'only SELECT queries can be replayed', 'meta': {}}})
+        m = re.search(r'\[\s*LIMIT\s+(\d+)\s*\]', query, re.IGNORECASE)
+        limit = int(m.group(1)) if m else None
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/mixed; boundary={0}'.format(self.BOUNDARY))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            replay._stream(self, limit)
+            self._send_chunk('--{0}--\r\n'.format(self.BOUNDARY).encode())
+            self.wfile.write(b'0\r\n\r\n')
+        except EnvironmentError:
+            pass  # the client went away
+
+class ReplayServer(object):
+    def __init__(self, recording, host='127.0.0.1', port=0, topology='replay', stream='replay',
+                 speed=None, loop=False, batch=256):
+        """
+        Stand-in HTTP endpoint that serves a ``Recording`` to ``SELECT``
+        queries in the same ``multipart/mixed`` format as the SensorBee
+        server, so that ``SensorBeeAPI.query`` and ``sbpeek`` can consume it.
+
+        The server has a single ``topology`` with a single ``stream``; any
+        ``SELECT`` query sent to the topology receives the whole recording,
+        honoring ``[LIMIT n]``.  When ``speed`` is given, tuples are sent at
+        their recorded pace scaled by ``speed`` (e.g., 2.0 for twice as
+        fast); otherwise they are sent as fast as possible.  When ``loop`` is
+        True, the recording is repeated endlessly.  Port 0 selects a free
+        port; see ``port`` for the actual one.
+        """
+        self.recording = recording
+        self.topology = topology
+        self.stream = stream
+        self.speed = speed
+        self.loop = loop
+        self.batch = batch
+        self._codec = recording._codec
+        self._server = _ReplayHTTPServer((host, port), _ReplayHandler)
+        self._server.replay = self
+        self._thread = None
+        (self.host, self.port) = self._server.server_address[:2]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def _parts(self, batch):
+        head = '--{0}\r\nContent-Type: application/json\r\nContent-Length: '.format(
+            _ReplayHandler.BOUNDARY).encode()
+        return b''.join([b''.join([head, str(len(d)).encode(), b'\r\n\r\n', d, b'\r\n']) for d in batch])
+
+    def _stream(self, handler, limit):
+        sent = 0
+        while True:
+            origin = None
+            for (timestamps, batch) in self.recording.iter_batches(self.batch, timestamps=True):
+                if limit is not None:
+                    batch = batch[:limit - sent]
+                if self.speed is not None:
+                    if origin is None:
+                        origin = (time.time(), timestamps[0])
+                    self._pace(handler, origin, timestamps, batch)
+                else:
+                    handler._send_chunk(self._parts(batch))
+                sent += len(batch)
+                if limit is not None and limit <= sent:
+                    return
+            if not self.loop or len(self.recording) == 0:
+                return
+
+    def _pace(self, handler, origin, timestamps, batch):
+        (started, first) = origin
+        for (timestamp, d) in zip(timestamps, batch):
+            wait = started + (timestamp - first) / self.speed - time.time()
+            if 0 < wait:
+                time.sleep(wait)
+            handler._send_chunk(self._parts([d]))
+            handler.wfile.flush()
+
+    def start(self):
+        """
+        Starts serving in a background thread and returns self.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serves in the current thread until ``shutdown`` is called.
+        """
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops the server.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import multiprocessing
+import pickle
+import re
+import threading
+
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from ..api import SensorBeeAPI
+
+
+# Partition predicate of integer keys; negative keys are folded by abs.
+PREDICATE = 'abs({key}) % {shards} = {shard}'
+
+_WORD = re.compile(r'[A-Za-z_]\w*')
+
+
+def _keywords(query):
+    # Returns the list of (start, end, upper-cased word) of words and
+    # semicolons outside of quotes and brackets.
+    (result, depth, i) = ([], 0, 0)
+    while i < len(query):
+        c = query[i]
+        if c in '"\'':
+            # A quote in a string is escaped by doubling it, which reads as
+            # two adjacent strings here.
+            end = query.find(c, i + 1)
+            i = len(query) if end < 0 else end + 1
+            continue
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif depth == 0:
+            if c == ';':
+                result.append((i, i + 1, ';'))
+            else:
+                m = _WORD.match(query, i)
+                if m is not None:
+                    result.append((m.start(), m.end(), m.group().upper()))
+                    i = m.end()
+                    continue
+        i += 1
+    return result
+
+
+def partition_query(query, key, shards, shard, predicate=PREDICATE):
+    """
+    Rewrites a ``SELECT`` statement to select only the ``shard``-th of
+    ``shards`` partitions (from 0): the ``predicate`` template, formatted
+    with ``key``, ``shards`` and ``shard``, is added to the ``WHERE``
+    clause with ``AND`` (or as the ``WHERE`` clause).  A ``ValueError`` is
+    raised if the query is not a single ``SELECT`` statement.
+    """
+    words = _keywords(query)
+    if not words or words[0][2] != 'SELECT':
+        raise ValueError('not a SELECT statement: {0}'.format(query))
+    semicolons = [start for (start, _, w) in words if w == ';']
+    end = len(query)
+    if semicolons:
+        if query[semicolons[0] + 1:].strip():
+            raise ValueError('more than one statement: {0}'.format(query))
+        end = semicolons[0]
+    names = [w for (_, _, w) in words]
+    if 'FROM' not in names:
+        raise ValueError('no FROM clause: {0}'.format(query))
+    (where, clause_end) = (None, end)
+    for i in range(names.index('FROM') + 1, len(words)):
+        (start, stop, w) = words[i]
+        if w == 'WHERE' and where is None:
+            where = stop
+        elif w == 'HAVING' or (w == 'GROUP' and names[i + 1:i + 2] == ['BY']):
+            clause_end = start
+            break
+    condition = predicate.format(key=key, shards=shards, shard=shard)
+    rest = query[clause_end:].strip()
+    if rest and not rest.startswith(';'):
+        rest = ' ' + rest
+    if where is None:
+        return '{0} WHERE {1}{2}'.format(query[:clause_end].rstrip(), condition, rest)
+    return '{0} ({1}) AND {2}{3}'.format(query[:where], query[where:clause_end].strip(), condition, rest)
+
+
+class ShardedQuery(object):
+    def __init__(self, api, topology, query, key, shards, predicate=PREDICATE):
+        """
+        Splits a ``SELECT`` query on the topology into ``shards`` queries,
+        each selecting the tuples whose ``key`` falls in one partition (see
+        ``partition_query``), so that a stream too fast for one consumer is
+        read over several connections at once.
+
+        The default predicate partitions integer keys by modulo; give a
+        ``predicate`` template (e.g., using a hash UDF of the server) to
+        partition other keys.  Every tuple is in exactly one shard as long
+        as the predicate is; ``[LIMIT n]`` applies to each shard.  Tuples of
+        different shards are not ordered with each other.
+        """
+        if shards < 1:
+            raise ValueError('shards must be positive: {0}'.format(shards))
+        self._api = api
+        self.topology = topology
+        self.shards = shards
+        self.queries = [partition_query(query, key, shards, i, predicate) for i in range(shards)]
+
+    def open(self):
+        """
+        Runs the queries and returns the list of ``ResultSet`` of each
+        shard, each reading its own connection.  Iterate over them in
+        separate threads (or use ``merge``) so that no shard stalls.
+        """
+        results = []
+        try:
+            for q in self.queries:
+                results.append(self._api.query(self.topology, q))
+        except Exception:
+            for rs in results:
+                rs.close()
+            raise
+        return results
+
+    def __iter__(self):
+        return self.merge()
+
+    def merge(self, maxsize=1024, tagged=False, reader=iter):
+        """
+        Reads the shards in threads, one per shard, and yields tuples in the
+        order they arrived, or ``(shard, tuple)`` if ``tagged`` is True.
+        ``reader`` is called with the ``ResultSet`` of each shard to get its
+        iterator (e.g., ``ResultSet.raw``).
+
+        Up to ``maxsize`` tuples read but not consumed yet are buffered;
+        readers wait while the buffer is full.  If a shard fails, the others
+        are stopped and the error is raised.
+        """
+        q = queue.Queue(maxsize)
+        stopped = threading.Event()
+        lock = threading.Lock()
+        results = []
+        end = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read(shard, query):
+            try:
+                rs = self._api.query(self.topology, query)
+                with lock:
+                    results.append(rs)
+                    if stopped.is_set():
+                        rs.close()
+                for d in reader(rs):
+                    if not put((shard, d)):
+                        return
+                item = (end, None)
+            except Exception as e:
+                item = (end, e)
+            put(item)
+
+        for (i, query) in enumerate(self.queries):
+            t = threading.Thread(target=read, args=(i, query))
+            t.daemon = True
+            t.start()
+
+        running = self.shards
+        try:
+            while running:
+                (shard, d) = q.get()
+                if shard is end:
+                    running -= 1
+                    if d is not None:
+                        raise d
+                    continue
+                yield (shard, d) if tagged else d
+        finally:
+            with lock:
+                stopped.set()
+                for rs in results:
+                    rs.close()
+
+    def map(self, func, chunksize=64, timeout=None, maxsize=None, tagged=False):
+        """
+        Reads the shards in processes, one per shard, each with its own
+        connection, applies ``func`` to each tuple there and yields the
+        results in the order their chunks arrived, or ``(shard, result)``
+        if ``tagged`` is True.  Decoding and ``func`` thus run in parallel;
+        ``func`` must be picklable (e.g., a module-level function).
+
+        Results are sent from the processes in chunks of up to
+        ``chunksize`` results; when ``timeout`` is specified, a chunk is
+        sent once ``timeout`` seconds have passed since its first tuple
+        arrived (see ``ResultSet.iter_batches``).  Up to ``maxsize`` chunks
+        (twice the number of shards by default) are buffered; processes
+        wait while the buffer is full.  If a shard fails (including an
+        exception raised by ``func`` and a result that cannot be pickled),
+        the others are stopped and the error is raised; a ``RuntimeError``
+        is raised if a process exits without reporting its end.
+        """
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive: {0}'.format(chunksize))
+        api = self._api
+        address = (api.host, api.port, api.timeout, api.codec.name)
+        q = multiprocessing.Queue(maxsize or 2 * self.shards)
+        stopped = multiprocessing.Event()
+        processes = []
+        try:
+            for (i, query) in enumerate(self.queries):
+                p = multiprocessing.Process(target=_map_shard, args=(
+                    i, address, self.topology, query, func, chunksize, timeout, q, stopped))
+                p.daemon = True
+                p.start()
+                processes.append(p)
+            running = set(range(self.shards))
+            exited = set()
+            while running:
+                try:
+                    (shard, results, error) = pickle.loads(q.get(timeout=0.1))
+                except queue.Empty:
+                    # A process killed never reports its end.  Items are
+                    # flushed before a process exits, so one found exited
+                    # twice in a row is gone.
+                    for i in exited & running:
+                        raise RuntimeError('shard {0} exited without reporting its end (exit code: {1})'.format(
+                            i, processes[i].exitcode))
+                    exited = set([i for i in running if not processes[i].is_alive()])
+                    continue
+                if results is None:
+                    running.discard(shard)
+                    if error is not None:
+                        raise error
+                    continue
+                for r in results:
+                    yield (shard, r) if tagged else r
+        finally:
+            stopped.set()
+            # Processes may be blocked reading their streams.
+            for p in processes:
+                p.terminate()
+            for p in processes:
+                p.join()
+
+
+def _map_shard(shard, address, topology, query, func, chunksize, timeout, out, stopped):
+    def put(item):
+        # Pickled here so that a result which cannot be pickled fails the
+        # shard, instead of being dropped by the feeder thread of the queue.
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        while not stopped.is_set():
+            try:
+                out.put(data, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    (host, port, api_timeout, codec) = address
+    try:
+        rs = SensorBeeAPI(host, port, timeout=api_timeout, codec=codec).query(topology, query)
+        batches = rs._batches(chunksize) if timeout is None else rs._batches_with_timeout(chunksize, timeout)
+        for batch in batches:
+            if not put((shard, [func(d) for d in batch], None)):
+                return
+        item = (shard, None, None)
+    except Exception as e:
+        item = (shard, None, _picklable(e))
+    put(item)
+    # Wait until the item is sent to the parent.
+    out.close()
+    out.join_thread()
+
+
+def _picklable(e):
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError('{0}: {1}'.format(type(e).__name__, e))
@@ -2,33 +2,83 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Python 3
+    from http.client import HTTPException
+except ImportError:
+    # Python 2
+    from httplib import HTTPException
+
+from ..api import SensorBeeAPIError
+
 
 class Spider(object):
-    def __init__(self, api):
+    KINDS = ('sources', 'streams', 'sinks')
+
+    # Errors of individual requests tolerated during the crawl; e.g., a node
+    # deleted after listing it, or a request timed out.
+    ERRORS = (SensorBeeAPIError, EnvironmentError, HTTPException)
+
+    def __init__(self, api, workers=8):
+        """
+        Crawls the status of all nodes through the API.
+
+        Statuses are fetched concurrently by up to ``workers`` threads.  The
+        timeout of each request is the one configured in ``api``.  Requests
+        failed during the crawl do not abort it; the affected nodes are left
+        out of the result and the failures are recorded in ``errors`` as
+        tuples of (topology, kind, name, exception).  ``name`` is None when
+        listing the nodes failed.
+        """
         self._api = api
+        self.workers = workers
+        self.errors = []
 
     def get(self):
-        status = {
-            'runtime_status': self.get_runtime_status(),
-            'topologies': {},
-        }
-        for t in [x['name'] for x in self._api.topologies()['topologies']]:
-            status['topologies'][t] = self.get_topology_status(t)
+        self.errors = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            rs = executor.submit(self.get_runtime_status)
+            topologies = [x['name'] for x in self._api.topologies()['topologies']]
+            status = {
+                'runtime_status': rs.result(),
+                'topologies': self._crawl(executor, topologies),
+            }
         return status
 
     def get_runtime_status(self):
         return self._api.runtime_status()
 
     def get_topology_status(self, t):
-        status = {
-            'sources': {},
-            'streams': {},
-            'sinks': {},
-        }
-        for s in [x['name'] for x in self._api.sources(t)['sources']]:
-            status['sources'][s] = self._api.source(t, s)['source']
-        for s in [x['name'] for x in self._api.streams(t)['streams']]:
-            status['streams'][s] = self._api.stream(t, s)['stream']
-        for s in [x['name'] for x in self._api.sinks(t)['sinks']]:
-            status['sinks'][s] = self._api.sink(t, s)['sink']
+        self.errors = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            return self._crawl(executor, [t])[t]
+
+    def _crawl(self, executor, topologies):
+        api = self._api
+        listers = {'sources': api.sources, 'streams': api.streams, 'sinks': api.sinks}
+        getters = {'sources': api.source, 'streams': api.stream, 'sinks': api.sink}
+
+        # List nodes of all topologies, then fetch statuses of all nodes.
+        lists = [(t, kind, executor.submit(listers[kind], t)) for t in topologies for kind in self.KINDS]
+        nodes = []
+        for (t, kind, future) in lists:
+            result = self._result(future, t, kind, None)
+            if result is not None:
+                for s in [x['name'] for x in result[kind]]:
+                    nodes.append((t, kind, s, executor.submit(getters[kind], t, s)))
+
+        status = dict((t, dict((kind, {}) for kind in self.KINDS)) for t in topologies)
+        for (t, kind, s, future) in nodes:
+            result = self._result(future, t, kind, s)
+            if result is not None:
+                status[t][kind][s] = result[kind[:-1]]
         return status
+
+    def _result(self, future, t, kind, name):
+        try:
+            return future.result()
+        except self.ERRORS as e:
+            self.errors.append((t, kind, name, e))
+            return None
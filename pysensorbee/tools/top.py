@@ -2,51 +2,92 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from .graph import TopologyGraph
+from .history import SPARKS, sparkline
 from .spider import Spider
 
 
+# For Python 3 compatibility
+unicode = type('')
+
+
 class TopView(object):
     FLAGS = {'source': '->', 'box': '::', 'sink': '<-'}
+    RATE_COLUMNS = ['Recv/s', 'Err/s', 'Sent/s', 'Queue +/-', 'Drop/s']
 
-    def __init__(self, api):
+    def __init__(self, api, spider=None, threshold=0.9, trend_points=20, sparks=SPARKS):
+        """
+        Renders the status of a topology as a table.  Bottlenecks found by
+        ``TopologyGraph.backpressure`` with ``threshold`` are listed below it.
+        With a history, the rates of the last ``trend_points`` samples are
+        rendered as sparklines of the characters ``sparks`` (see
+        ``sparkline``).
+        """
         self._api = api
+        self._spider = spider if spider is not None else Spider(api)
+        self.threshold = threshold
+        self.trend_points = trend_points
+        self.sparks = sparks
 
     def render(self, t):
-        spider = Spider(self._api)
-
-        # Get runtime status values.
+        spider = self._spider
         rs = spider.get_runtime_status()
+        ts = spider.get_topology_status(t)
+        return self.render_status(t, rs, ts)
+
+    def render_status(self, t, rs, ts, rates=None, history=None):
+        """
+        Renders the runtime status ``rs`` and the topology status ``ts``.
+        When ``rates`` computed by ``RateCalculator`` is given, per-second
+        rates are rendered as well.  When ``history`` (``HistoryStore``) is
+        given, trends of tuples sent (received for sinks) are rendered.
+        """
+        # Render runtime status values.
+        goroutine = rs['num_goroutine']
+        cgo_call = rs['num_cgo_call']
+        if rates is not None:
+            r = rates['runtime']
+            goroutine = '{0} ({1:+d}, min {2}, max {3})'.format(
+                goroutine, r['num_goroutine_delta'], r['num_goroutine_min'], r['num_goroutine_max'])
+            cgo_call = '{0} ({1}/s)'.format(cgo_call, self._format_rate(r['num_cgo_call_rate']))
         header = '''SensorBee: {0} @ {1}:{2} [Host: {3}] [PID: {4}]
 GOMAXPROCS: {5} (NumCPU: {6})
 NumGoroutine: {7}
 NumCgoCall: {8}\n\n'''.format(
             t, self._api.host, self._api.port, rs['hostname'], rs['pid'],
             rs['gomaxprocs'], rs['num_cpu'],
-            rs['num_goroutine'],
-            rs['num_cgo_call'],
+            goroutine,
+            cgo_call,
         )
 
-        # Get topology status values.
-        ts = spider.get_topology_status(t)
-        allstats = {}
-        allstats.update(ts['sources'])
-        allstats.update(ts['streams'])
-        allstats.update(ts['sinks'])
-
         # Determine the order of nodes to display.
-        names = self._ordered_names(allstats)
+        graph = TopologyGraph(ts)
+        allstats = graph.nodes
+        names = graph.order()
 
         # Generate a table of status values.
         columns  = ['', 'Node', 'Status', 'Received', 'Error', 'Output', 'Sent', 'Queued', 'Dropped']
+        if rates is not None:
+            columns += self.RATE_COLUMNS
+        if history is not None:
+            columns += ['Trend']
         lines = [columns]
         for s in [allstats[n] for n in names]:
-            lines += self._generate_status_lines(s['node_type'], s['name'], s['state'], s['status'])
+            node_lines = self._generate_status_lines(s['node_type'], s['name'], s['state'], s['status'])
+            if rates is not None:
+                self._append_rates(node_lines, s['status'], rates['nodes'].get(s['name']))
+            if history is not None:
+                metric = 'received' if s['node_type'] == 'sink' else 'sent'
+                for line in node_lines:
+                    line.append('')
+                node_lines[0][-1] = sparkline(history.trend(t, s['name'], metric, self.trend_points), self.sparks)
+            lines += node_lines
 
         # Adjust the column size nicely.
         colsize = [0] * len(columns)
         for line in lines:
             for (i, v) in enumerate(line):
-                colsize[i] = max(colsize[i], len(str(v)))
+                colsize[i] = max(colsize[i], len(unicode(v)))
         fmt = ''.join([
             '{0:<' + str(colsize[0] + 1) + '}',
             '{1:<' + str(colsize[1] + 3) + '}',
@@ -57,10 +98,25 @@ NumCgoCall: {8}\n\n'''.format(
             '{6:>' + str(colsize[6] + 0) + '}',
             '{7:>' + str(colsize[7] + 3) + '}',
             '{8:>' + str(colsize[8] + 3) + '}',
+        ] + [
+            '{' + str(i) + ':>' + str(colsize[i] + 3) + '}' for i in range(9, len(columns))
         ])
 
         # Returns the rendered the table.
-        return header + '\n'.join([fmt.format(*map(str, line)) for line in lines])
+        return header + '\n'.join([fmt.format(*map(unicode, line)) for line in lines] + self._bottleneck_lines(graph))
+
+    def _bottleneck_lines(self, graph):
+        lines = []
+        for b in graph.backpressure(self.threshold):
+            line = '!! Bottleneck: {0} (input queue {1:3.1f}% full'.format(b['node'], b['fill'] * 100)
+            if b['upstream']:
+                line += '; backpressure on {0}'.format(', '.join(b['upstream']))
+            if b['dropped']:
+                line += '; {0} dropped'.format(b['dropped'])
+            lines.append(line + ')')
+        if lines:
+            lines.insert(0, '')
+        return lines
 
     def _generate_status_lines(self, nodetype, name, state, status):
         # Flag, Node, Status, Received, Error, Output, Sent, Queued, Dropped
@@ -81,37 +137,24 @@ NumCgoCall: {8}\n\n'''.format(
                 lines.append(line)
         return lines
 
-    def _ordered_names(self, stats):
-        """
-        Determine the order of sources/streams/sinks to display:
+    def _append_rates(self, lines, status, r):
+        # Recv/s, Err/s, Sent/s, Queue +/-, Drop/s
+        for line in lines:
+            line += [''] * len(self.RATE_COLUMNS)
+        if r is None:
+            return
+        fmt = self._format_rate
+        if 'input_stats' in status:  # Stream or Sink
+            lines[0][9:11] = (fmt(r['received']), fmt(r['errors']))
+        if 'output_stats' in status:  # Stream or Source
+            lines[0][11:14] = (fmt(r['sent']), self._format_delta(r['queued']), fmt(r['dropped']))
+            for (line, k) in zip(lines[1:], sorted(status['output_stats']['outputs'].keys())):
+                out = r['outputs'].get(k)
+                if out is not None:
+                    line[11:13] = (fmt(out['sent']), self._format_delta(out['queued']))
 
-        1. Sources
-        2. Connected Streams
-        3. Dangling Streams
-        4. Connected Sinks
-        5. Dangling Sinks
-        """
-        sources = sorted([x for x in stats if stats[x]['node_type'] == 'source'])
-        streams = sorted([x for x in stats if stats[x]['node_type'] == 'box'])
-        sinks = sorted([x for x in stats if stats[x]['node_type'] == 'sink'])
-
-        # List streams/sinks connected from sources.
-        # They are not "dangling".
-        connected = []
-        targets = list(sources)
-        while True:
-            targets2 = []
-            for t in targets:
-                if t in sinks: continue
-                outs = sorted([out for out in stats[t]['status']['output_stats']['outputs'].keys() if out not in connected])
-                connected += outs
-                targets2 += outs
-            if len(targets2) == 0: break
-            targets = targets2
-
-        return \
-            sources + \
-            [s for s in connected if s in streams] + \
-            [s for s in streams   if s not in connected] + \
-            [s for s in connected if s in sinks] + \
-            [s for s in sinks     if s not in connected]
+    def _format_rate(self, v):
+        return '-' if v is None else '{0:.1f}'.format(v)
+
+    def _format_delta(self, v):
+        return '-' if v is None else '{0:+d}'.format(v)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import csv
+import gzip
+import io
+import json
+import os
+import time
+
+try:
+    import msgpack
+    _MSGPACK_AVAILABLE = True
+except ImportError:
+    _MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    _ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_AVAILABLE = False
+
+from ..codec import get_codec
+
+
+# For Python 3 compatibility
+unicode = type('')
+
+class TupleWriter(object):
+    FORMATS = ('jsonl', 'csv', 'msgpack')
+    COMPRESSIONS = ('none', 'gzip', 'zstd')
+
+    def __init__(self, path, format='jsonl', compress='none', rotate_size=0,
+                 flush_size=1024 * 1024, flush_interval=1.0, csv_header_tuples=100, codec=None):
+        """
+        Writes tuples to files in the specified ``format``, optionally
+        compressed by ``gzip`` or ``zstd``.
+
+        Encoded tuples are buffered and written once ``flush_size`` bytes
+        are buffered or ``flush_interval`` seconds have passed since the last
+        write (checked when a tuple is written).  When ``rotate_size`` is
+        positive, a new file is started once the current one (after
+        compression) reaches that size; files are then named by inserting a
+        sequence number before the extension (e.g., ``out.0001.jsonl.gz``).
+
+        In ``csv`` format, columns are the top-level keys found in the first
+        ``csv_header_tuples`` tuples; keys appearing later are ignored and
+        non-string values are written in JSON.
+        """
+        if format not in self.FORMATS:
+            raise ValueError('unknown format: {0}'.format(format))
+        if compress not in self.COMPRESSIONS:
+            raise ValueError('unknown compression: {0}'.format(compress))
+        if format == 'msgpack' and not _MSGPACK_AVAILABLE:
+            raise RuntimeError('msgpack module is unavailable')
+        if compress == 'zstd' and not _ZSTD_AVAILABLE:
+            raise RuntimeError('zstandard module is unavailable')
+        self.path = path
+        self.format = format
+        self.compress = compress
+        self.rotate_size = rotate_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.csv_header_tuples = csv_header_tuples
+        self.files = []
+        self.count = 0
+        self._codec = get_codec(codec)
+        self._raw = None
+        self._out = None
+        self._pending = []
+        self._pending_size = 0
+        self._last_flush = time.time()
+        self._columns = None
+        self._header_tuples = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _segment_path(self):
+        if self.rotate_size <= 0:
+            return self.path
+        (head, tail) = os.path.split(self.path)
+        (root, dot, ext) = tail.partition('.')
+        name = '{0}.{1:04d}{2}{3}'.format(root, len(self.files) + 1, dot, ext)
+        return os.path.join(head, name)
+
+    def _open(self):
+        path = self._segment_path()
+        self._raw = open(path, 'wb')
+        if self.compress == 'gzip':
+            self._out = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif self.compress == 'zstd':
+            self._out = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._out = self._raw
+        self.files.append(path)
+        if self._columns is not None:
+            self._out.write(self._csv_row(self._columns))
+
+    def _close_file(self):
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.close()
+        (self._raw, self._out) = (None, None)
+
+    def write(self, d):
+        """
+        Writes a tuple.
+        """
+        self.count += 1
+        if self.format == 'csv' and self._columns is None:
+            self._header_tuples.append(d)
+            if len(self._header_tuples) < self.csv_header_tuples:
+                return
+            self._start_csv()
+        else:
+            self._append(self._encode(d))
+        if self.flush_size <= self._pending_size or self.flush_interval <= time.time() - self._last_flush:
+            self.flush()
+
+    def _append(self, data):
+        self._pending.append(data)
+        self._pending_size += len(data)
+
+    def _encode(self, d):
+        if self.format == 'jsonl':
+            return self._codec.dumps(d) + b'\n'
+        if self.format == 'msgpack':
+            return msgpack.packb(d, use_bin_type=True)
+        return self._csv_row([self._csv_value(d.get(k)) for k in self._columns])
+
+    def _start_csv(self):
+        columns = []
+        seen = set()
+        for d in self._header_tuples:
+            for k in d:
+                if k not in seen:
+                    seen.add(k)
+                    columns.append(k)
+        # The header is written when a file is opened.
+        self._columns = columns
+        for d in self._header_tuples:
+            self._append(self._encode(d))
+        self._header_tuples = []
+
+    def _csv_value(self, v):
+        if v is None:
+            return ''
+        if isinstance(v, unicode):
+            return v
+        return json.dumps(v, ensure_ascii=False)
+
+    def _csv_row(self, values):
+        if bytes is str:
+            # Python 2; the csv module only handles byte strings.
+            buf = io.BytesIO()
+            csv.writer(buf, lineterminator=str('\n')).writerow(
+                [v if isinstance(v, bytes) else v.encode('utf-8') for v in values])
+            return buf.getvalue()
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerow(values)
+        return buf.getvalue().encode('utf-8')
+
+    def flush(self):
+        """
+        Writes buffered tuples to the file.
+        """
+        if self.format == 'csv' and self._columns is None and self._header_tuples:
+            self._start_csv()
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        if self._out is None:
+            self._open()
+        self._out.write(b''.join(self._pending))
+        (self._pending, self._pending_size) = ([], 0)
+        if self._out is not self._raw:
+            self._out.flush()
+        self._raw.flush()
+        if 0 < self.rotate_size and self.rotate_size <= self._raw.tell():
+            self._close_file()
+
+    def close(self):
+        """
+        Flushes buffered tuples and closes the file.
+        """
+        self.flush()
+        if self._out is not None:
+            self._close_file()
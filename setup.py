@@ -34,9 +34,19 @@ setup(name='sensorbee-python',
           'console_scripts': [
               'sbstat=pysensorbee.cli:sbstat',
               'sbpeek=pysensorbee.cli:sbpeek',
+              'sbbench=pysensorbee.cli:sbbench',
+              'sbexporter=pysensorbee.cli:sbexporter',
           ],
       },
+      install_requires=[
+          'futures; python_version < "3.2"',
+      ],
       extras_require={
           'websocket': ['websocket-client'],
+          'numpy': ['numpy'],
+          'asyncio': ['aiohttp'],
+          'orjson': ['orjson'],
+          'msgpack': ['msgpack'],
+          'zstd': ['zstandard'],
       },
 )